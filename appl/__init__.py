@@ -1,11 +1,13 @@
 import os
+import threading
 
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, url_for, abort
 from flask_sqlalchemy import SQLAlchemy
 # from wtforms import Form
 import appl.adaptors.repository as repo
 from appl.adaptors import memory_repository, database_repository
-from appl.adaptors.orm import metadata, map_model_to_tables
+from appl.adaptors.orm import map_model_to_tables
+from appl.adaptors.thread_safe_repository import ThreadSafeMemoryRepository
 
 
 
@@ -13,42 +15,87 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
 from sqlalchemy.pool import NullPool
 
+HOME_PAGE_SIZE = 50
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object('config.Config')
-    data_path = os.path.join('appl', 'adaptors', 'datafiles')
-    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
-    database_echo = app.config['SQLALCHEMY_ECHO']
-    database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=NullPool,
-                                    echo=database_echo)
-
-    if app.config['TESTING'] == 'True' or len(database_engine.table_names()) == 0:
-        print("REPOPULATING DATABASE")
-        # For testing, or first-time use of the web application, reinitialise the database.
-        clear_mappers()
-        metadata.create_all(database_engine)  # Conditionally create database tables.
-        for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
-            database_engine.execute(table.delete())
-
-        # Generate mappings that map domain model classes to the database tables.
-        map_model_to_tables()
-
-        database_repository.populate(database_engine, data_path)
+    data_path = os.path.join('appl', 'datafiles')
+    if app.config['REPOSITORY'] == 'memory':
+        # Flask serves each request on its own thread, so the shared in-memory repository is the locked variant.
+        repo.repo_instance = ThreadSafeMemoryRepository()
+        # Maps the binary snapshot when it matches the csv, and otherwise parses the csv and writes the snapshot for
+        # the next start.
+        memory_repository.read_and_load_movie_snapshot(os.path.join(data_path, 'Data1000Movies.csv'),
+                                                       repo.repo_instance)
     else:
-        # Solely generate mappings that map domain model classes to the database tables.
-        map_model_to_tables()
+        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        database_echo = app.config['SQLALCHEMY_ECHO']
+        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False},
+                                        poolclass=NullPool, echo=database_echo)
 
-    @app.route("/", methods=["POST", "GET"])
-    def home():
-        movie_list = repo.repo_instance.get_movies()
-        actor_list = repo.repo_instance.get_actors()
-        director_list = repo.repo_instance.get_directors()
-        genre_list = repo.repo_instance.get_genres()
-        review_list = repo.repo_instance.get_reviews()
-        watchlist_list = repo.repo_instance.get_watchlists()
-        return render_template("home.html", movies=movie_list, actors=actor_list, directors=director_list, genres=genre_list, reviews=review_list, watchlists=watchlist_list)
+        # The stored fingerprint is a two-row lookup, so a database that already matches the current schema and csv
+        # is reused as is instead of being repopulated on every start.
+        fingerprint = database_repository.catalog_fingerprint(data_path)
+        policy = app.config['STALE_DATABASE_POLICY']
+        if policy not in database_repository.STALE_DATABASE_POLICIES:
+            raise repo.RepositoryException(f"Unknown STALE_DATABASE_POLICY {policy!r}")
+
+        if app.config['TESTING'] == 'True' or \
+                not database_repository.database_is_current(database_engine, fingerprint):
+            if policy == 'fail' and app.config['TESTING'] != 'True':
+                raise repo.RepositoryException("The database does not match the current schema and movie data; "
+                                               "repopulate it or change STALE_DATABASE_POLICY")
+            print("REPOPULATING DATABASE")
+            # For testing, or first-time use of the web application, reinitialise the database.
+            clear_mappers()
 
+            # Generate mappings that map domain model classes to the database tables.
+            map_model_to_tables()
 
+            def repopulate():
+                populate_stats = database_repository.repopulate(database_engine, data_path, fingerprint,
+                                                                batch_size=app.config['POPULATE_BATCH_SIZE'],
+                                                                fast_load=app.config['SQLITE_FAST_LOAD'])
+                print(f"LOADED {populate_stats['movies']} MOVIES ({populate_stats['rows_per_second']:.0f} ROWS/S)")
+
+            if policy == 'background':
+                # Requests are served from the partially loaded database until the load completes.
+                threading.Thread(target=repopulate, name='repopulate', daemon=True).start()
+            else:
+                repopulate()
+        else:
+            # Solely generate mappings that map domain model classes to the database tables.
+            map_model_to_tables()
+
+    @app.route("/", methods=["POST", "GET"])
+    def home():
+        # Every list is one page long whatever the catalog size; "More" links carry the cursor of the next page.
+        search = request.args.get('search', '').strip()
+        lists, next_pages = dict(), dict()
+        if search:
+            page = request.args.get('page', 1, type=int)
+            results = repo.repo_instance.search_movies(search, page, HOME_PAGE_SIZE)
+            lists['movies'] = results['movies']
+            if page * HOME_PAGE_SIZE < results['total']:
+                next_pages['movies'] = url_for('home', search=search, page=page + 1)
+        # Every list comes from one pinned catalog version, so a reload halfway through cannot mix old and new
+        # state on the page, and no list waits for a writer.
+        with repo.repo_instance.pinned_snapshot() as catalog:
+            for name, get_page in (('movies', catalog.get_movies_page), ('actors', catalog.get_actors_page),
+                                   ('directors', catalog.get_directors_page), ('genres', catalog.get_genres_page),
+                                   ('reviews', catalog.get_reviews_page),
+                                   ('watchlists', catalog.get_watchlists_page)):
+                if name in lists:
+                    continue
+                try:
+                    lists[name], cursor = get_page(HOME_PAGE_SIZE, request.args.get(f'{name}_cursor'))
+                except repo.RepositoryException:
+                    abort(400)
+                if cursor is not None:
+                    next_pages[name] = url_for('home', **{f'{name}_cursor': cursor})
+        return render_template("home.html", search=search, next_pages=next_pages, **lists)
 
     @app.route("/login")
     def login():
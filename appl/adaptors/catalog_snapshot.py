@@ -0,0 +1,228 @@
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+from appl.domainmodel.movie import Movie
+from appl.datafilereaders.entity_registry import EntityRegistry
+
+SNAPSHOT_MAGIC = b'CS235CAT'
+SNAPSHOT_VERSION = 2
+
+# Every section is stored as a flat typed array. The header lists (offset, byte length) for each, in this order.
+SECTIONS = (
+    ('string_offsets', 'Q'),
+    ('string_data', 'B'),
+    ('rank', 'i'),
+    ('release_year', 'i'),
+    ('runtime_minutes', 'i'),
+    ('rating', 'd'),
+    ('votes', 'q'),
+    ('revenue_millions', 'd'),
+    ('metascore', 'i'),
+    ('title', 'I'),
+    ('description', 'I'),
+    ('director', 'I'),
+    ('cast_offsets', 'I'),
+    ('cast', 'I'),
+    ('genre_offsets', 'I'),
+    ('genres', 'I'),
+)
+HEADER = struct.Struct('<8sHH32sI')
+SECTION_ENTRY = struct.Struct('<QQ')
+ALIGNMENT = 8
+MISSING = -1
+MISSING_FLOAT = float('nan')
+NO_STRING = 0xFFFFFFFF
+
+
+def source_checksum(file_name: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(file_name, mode='rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+class StringTable:
+    def __init__(self):
+        self.__index = dict()
+        self.__offsets = array('Q', [0])
+        self.__data = bytearray()
+
+    def add(self, value) -> int:
+        if value is None:
+            return NO_STRING
+        position = self.__index.get(value)
+        if position is None:
+            position = len(self.__offsets) - 1
+            self.__data += value.encode('utf-8')
+            self.__offsets.append(len(self.__data))
+            self.__index[value] = position
+        return position
+
+    @property
+    def offsets(self):
+        return self.__offsets
+
+    @property
+    def data(self):
+        return self.__data
+
+
+def write_snapshot(snapshot_path: str, movies, checksum: bytes):
+    """Writes the movies to a versioned binary snapshot tagged with the checksum of their source file"""
+    strings = StringTable()
+    columns = {name: array(typecode) for name, typecode in SECTIONS[2:]}
+    columns['cast_offsets'].append(0)
+    columns['genre_offsets'].append(0)
+    movie_count = 0
+    for movie in movies:
+        columns['rank'].append(movie.rank if isinstance(movie.rank, int) else MISSING)
+        columns['release_year'].append(movie.release_year if movie.release_year is not None else MISSING)
+        columns['runtime_minutes'].append(movie.runtime_minutes if movie.runtime_minutes is not None else MISSING)
+        columns['rating'].append(movie.rating if movie.rating is not None else MISSING_FLOAT)
+        columns['votes'].append(movie.votes if movie.votes is not None else MISSING)
+        columns['revenue_millions'].append(movie.revenue_millions if movie.revenue_millions is not None
+                                           else MISSING_FLOAT)
+        columns['metascore'].append(movie.metascore if movie.metascore is not None else MISSING)
+        columns['title'].append(strings.add(movie.title))
+        columns['description'].append(strings.add(movie.description))
+        director = movie.get_director()
+        columns['director'].append(strings.add(director.director_full_name if director is not None else None))
+        columns['cast'].extend(strings.add(actor.actor_full_name) for actor in movie.actors or [])
+        columns['cast_offsets'].append(len(columns['cast']))
+        columns['genres'].extend(strings.add(genre.genre_name) for genre in movie.genres or [])
+        columns['genre_offsets'].append(len(columns['genres']))
+        movie_count += 1
+    sections = [strings.offsets, array('B', strings.data)] + [columns[name] for name, typecode in SECTIONS[2:]]
+
+    # The file is written next to its final location and swapped in, so a reader never maps a half-written file.
+    # Workers starting together may each write one, so the temporary name is per process.
+    temporary_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temporary_path, mode='wb') as snapshot_file:
+        position = HEADER.size + SECTION_ENTRY.size * len(SECTIONS)
+        entries = []
+        for section in sections:
+            position += -position % ALIGNMENT
+            length = len(section) * section.itemsize
+            entries.append((position, length))
+            position += length
+        snapshot_file.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, checksum, movie_count))
+        for entry in entries:
+            snapshot_file.write(SECTION_ENTRY.pack(*entry))
+        for section, (offset, length) in zip(sections, entries):
+            snapshot_file.write(b'\0' * (offset - snapshot_file.tell()))
+            section.tofile(snapshot_file)
+    os.replace(temporary_path, snapshot_path)
+
+
+class CatalogSnapshot:
+    """A memory-mapped, read-only view over a snapshot file"""
+
+    def __init__(self, snapshot_path: str):
+        with open(snapshot_path, mode='rb') as snapshot_file:
+            self.__map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.__version, _, self.__checksum, self.__movie_count = HEADER.unpack_from(self.__map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.__map.close()
+            raise ValueError(f"{snapshot_path} is not a catalog snapshot")
+        self.__sections = dict()
+        if self.__version != SNAPSHOT_VERSION:
+            return
+        view = memoryview(self.__map)
+        for index, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION_ENTRY.unpack_from(self.__map, HEADER.size + index * SECTION_ENTRY.size)
+            self.__sections[name] = view[offset:offset + length].cast(typecode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for section in self.__sections.values():
+            section.release()
+        self.__sections = dict()
+        self.__map.close()
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def checksum(self):
+        return self.__checksum
+
+    @property
+    def movie_count(self):
+        return self.__movie_count
+
+    def column(self, name):
+        return self.__sections[name]
+
+    def string(self, position):
+        if position == NO_STRING:
+            return None
+        offsets = self.__sections['string_offsets']
+        return bytes(self.__sections['string_data'][offsets[position]:offsets[position + 1]]).decode('utf-8')
+
+    def iter_movies(self, registry: EntityRegistry = None):
+        """Rebuilds the movies from the mapped columns without touching the source csv"""
+        if registry is None:
+            registry = EntityRegistry()
+        # Names repeat across movies, so each string is decoded once and reused.
+        decoded = dict()
+
+        def string(position):
+            value = decoded.get(position)
+            if value is None:
+                value = decoded[position] = self.string(position)
+            return value
+
+        rank, release_year, runtime_minutes = self.column('rank'), self.column('release_year'), \
+            self.column('runtime_minutes')
+        rating, votes, revenue_millions, metascore = self.column('rating'), self.column('votes'), \
+            self.column('revenue_millions'), self.column('metascore')
+        title, description, director = self.column('title'), self.column('description'), self.column('director')
+        cast_offsets, cast = self.column('cast_offsets'), self.column('cast')
+        genre_offsets, genres = self.column('genre_offsets'), self.column('genres')
+        for index in range(self.__movie_count):
+            movie_object = Movie(self.string(title[index]), release_year[index])
+            if rank[index] != MISSING:
+                movie_object.rank = rank[index]
+            movie_object.description = self.string(description[index])
+            if runtime_minutes[index] != MISSING:
+                movie_object.runtime_minutes = runtime_minutes[index]
+            # NaN never equals itself, which is how a missing float is recognised.
+            if rating[index] == rating[index]:
+                movie_object.rating = rating[index]
+            if votes[index] != MISSING:
+                movie_object.votes = votes[index]
+            if revenue_millions[index] == revenue_millions[index]:
+                movie_object.revenue_millions = revenue_millions[index]
+            if metascore[index] != MISSING:
+                movie_object.metascore = metascore[index]
+            if director[index] != NO_STRING:
+                movie_object.director = registry.director(string(director[index]))
+            for position in genres[genre_offsets[index]:genre_offsets[index + 1]]:
+                movie_object.add_genre(registry.genre(string(position)))
+            for position in cast[cast_offsets[index]:cast_offsets[index + 1]]:
+                movie_object.add_actor(registry.actor(string(position)))
+            yield movie_object
+
+
+def load_snapshot(snapshot_path: str, checksum: bytes):
+    """Returns the mapped snapshot, or None when it is missing, from another format version or stale"""
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        snapshot = CatalogSnapshot(snapshot_path)
+    except (ValueError, struct.error):
+        return None
+    if snapshot.version != SNAPSHOT_VERSION or snapshot.checksum != checksum:
+        snapshot.close()
+        return None
+    return snapshot
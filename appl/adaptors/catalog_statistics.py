@@ -0,0 +1,158 @@
+from appl.domainmodel.movie import Movie
+from appl.domainmodel.review import Review
+from appl.datafilereaders.entity_registry import normalize_name
+
+STATISTIC_FIELDS = ('runtime_minutes', 'rating', 'votes', 'revenue_millions', 'metascore')
+GROUPINGS = ('genre', 'year', 'director')
+
+
+class RunningStatistic:
+    """Count, sum, minimum and maximum of a stream of values, each updated in O(1) per value"""
+
+    def __init__(self):
+        self.__count = 0
+        self.__total = 0
+        self.__minimum = None
+        self.__maximum = None
+
+    def __repr__(self):
+        return f"<RunningStatistic count={self.__count} mean={self.mean} min={self.__minimum} max={self.__maximum}>"
+
+    def add(self, value):
+        if value is None:
+            return
+        self.__count += 1
+        self.__total += value
+        if self.__minimum is None or value < self.__minimum:
+            self.__minimum = value
+        if self.__maximum is None or value > self.__maximum:
+            self.__maximum = value
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def total(self):
+        return self.__total
+
+    @property
+    def minimum(self):
+        return self.__minimum
+
+    @property
+    def maximum(self):
+        return self.__maximum
+
+    @property
+    def mean(self):
+        return self.__total / self.__count if self.__count else None
+
+    def as_dict(self) -> dict:
+        return {'count': self.__count, 'total': self.__total, 'mean': self.mean, 'min': self.__minimum,
+                'max': self.__maximum}
+
+
+class CatalogStatistics:
+    """Aggregates over the whole catalog and per genre, release year and director, kept current by the add_* calls
+
+    Adding a movie or review touches a fixed number of counters, so a dashboard reads e.g. the mean runtime of
+    every genre without walking the movies. Min and max cannot be taken back one value at a time, so removals are
+    handled by rebuilding (see MemoryRepository.apply_movie_changes).
+    """
+
+    def __init__(self):
+        self.__overall = {field: RunningStatistic() for field in STATISTIC_FIELDS}
+        # grouping -> group key -> field -> RunningStatistic
+        self.__groups = {grouping: dict() for grouping in GROUPINGS}
+        # grouping -> group key -> number of movies
+        self.__histograms = {grouping: dict() for grouping in GROUPINGS}
+        self.__reviews_per_movie = dict()
+        self.__review_ratings_per_movie = dict()
+        self.__review_ratings = RunningStatistic()
+        self.__movie_count = 0
+        self.__review_count = 0
+
+    @property
+    def movie_count(self) -> int:
+        return self.__movie_count
+
+    @property
+    def review_count(self) -> int:
+        return self.__review_count
+
+    def add_movie(self, movie: Movie):
+        self.__movie_count += 1
+        values = [(field, getattr(movie, field)) for field in STATISTIC_FIELDS]
+        for field, value in values:
+            self.__overall[field].add(value)
+        for grouping, key in movie_group_keys(movie):
+            self.__histograms[grouping][key] = self.__histograms[grouping].get(key, 0) + 1
+            statistics = self.__groups[grouping].get(key)
+            if statistics is None:
+                statistics = self.__groups[grouping][key] = {field: RunningStatistic() for field in STATISTIC_FIELDS}
+            for field, value in values:
+                statistics[field].add(value)
+
+    def add_review(self, review: Review):
+        self.__review_count += 1
+        movie_id = review.movie.movie_id if review.movie is not None else None
+        self.__reviews_per_movie[movie_id] = self.__reviews_per_movie.get(movie_id, 0) + 1
+        if review.rating is not None:
+            self.__review_ratings.add(review.rating)
+            statistic = self.__review_ratings_per_movie.get(movie_id)
+            if statistic is None:
+                statistic = self.__review_ratings_per_movie[movie_id] = RunningStatistic()
+            statistic.add(review.rating)
+
+    def overall(self, field: str) -> RunningStatistic:
+        return self.__overall[field]
+
+    def group(self, grouping: str, key, field: str) -> RunningStatistic:
+        """Returns the statistic of field over the movies in one genre, year or director"""
+        statistics = self.__groups[grouping].get(group_key(grouping, key))
+        return RunningStatistic() if statistics is None else statistics[field]
+
+    def by_group(self, grouping: str, field: str) -> dict:
+        """Returns {group key: RunningStatistic}, e.g. by_group('genre', 'runtime_minutes') for runtime per genre"""
+        return {key: statistics[field] for key, statistics in self.__groups[grouping].items()}
+
+    def histogram(self, grouping: str) -> dict:
+        """Returns {group key: number of movies}, e.g. histogram('year') for movies per year"""
+        return dict(self.__histograms[grouping])
+
+    def reviews_per_movie(self, movie_id=None):
+        if movie_id is None:
+            return dict(self.__reviews_per_movie)
+        return self.__reviews_per_movie.get(movie_id, 0)
+
+    def review_rating(self, movie_id=None) -> RunningStatistic:
+        if movie_id is None:
+            return self.__review_ratings
+        return self.__review_ratings_per_movie.get(movie_id, RunningStatistic())
+
+
+def group_key(grouping: str, key):
+    if grouping == 'year':
+        return int(key)
+    return normalize_name(key) if isinstance(key, str) else key
+
+
+def movie_group_keys(movie: Movie):
+    keys = set()
+    for genre in movie.genres or []:
+        keys.add(('genre', group_key('genre', genre.genre_name)))
+    if movie.release_year is not None:
+        keys.add(('year', movie.release_year))
+    if movie.get_director() is not None and movie.get_director().director_full_name:
+        keys.add(('director', group_key('director', movie.get_director().director_full_name)))
+    return keys
+
+
+def build_catalog_statistics(movies, reviews=()) -> CatalogStatistics:
+    statistics = CatalogStatistics()
+    for movie in movies:
+        statistics.add_movie(movie)
+    for review in reviews:
+        statistics.add_review(review)
+    return statistics
@@ -0,0 +1,142 @@
+import numpy as np
+
+from appl.domainmodel.movie import Movie
+
+# Integer columns use -1 for a missing value; columns that are sometimes missing in the csv are floats so they can
+# hold NaN, which drops out of every comparison.
+COLUMNS = {
+    'rank': np.int32,
+    'release_year': np.int16,
+    'runtime_minutes': np.int16,
+    'rating': np.float32,
+    'votes': np.int64,
+    'revenue_millions': np.float64,
+    'metascore': np.float32,
+}
+INITIAL_CAPACITY = 1024
+
+
+class CatalogStore:
+    """Keeps the numeric movie fields as typed NumPy columns indexed by a dense movie id
+
+    Dense ids are assigned in insertion order, so row i of every column belongs to the i-th movie added. Filters,
+    sorts and aggregates run over whole columns instead of looping over Movie objects, e.g.
+
+        store.select((store['release_year'] > 2010) & (store['metascore'] > 70),
+                     order_by='revenue_millions', descending=True)
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.__size = 0
+        self.__columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.__movies = []
+        self.__dense_ids = dict()
+
+    def __len__(self):
+        return self.__size
+
+    def __getitem__(self, column_name) -> np.ndarray:
+        return self.__columns[column_name][:self.__size]
+
+    def __contains__(self, movie_id):
+        return movie_id in self.__dense_ids
+
+    def add_movie(self, movie: Movie) -> int:
+        dense_id = self.__dense_ids.get(movie.movie_id)
+        if dense_id is not None:
+            return dense_id
+        if self.__size == len(self.__columns['rank']):
+            self.__grow()
+        dense_id = self.__size
+        for name, dtype in COLUMNS.items():
+            value = getattr(movie, name)
+            if value is None:
+                value = np.nan if np.issubdtype(dtype, np.floating) else -1
+            self.__columns[name][dense_id] = value
+        self.__movies.append(movie)
+        self.__dense_ids[movie.movie_id] = dense_id
+        self.__size += 1
+        return dense_id
+
+    def __grow(self):
+        # Doubling keeps appends amortised O(1).
+        for name, column in self.__columns.items():
+            grown = np.empty(len(column) * 2, dtype=column.dtype)
+            grown[:self.__size] = column[:self.__size]
+            self.__columns[name] = grown
+
+    def dense_id(self, movie_id):
+        return self.__dense_ids.get(movie_id)
+
+    def movie(self, dense_id) -> Movie:
+        return self.__movies[dense_id]
+
+    def movies(self, dense_ids) -> list:
+        return [self.__movies[dense_id] for dense_id in dense_ids]
+
+    def select(self, mask=None, order_by: str = None, descending: bool = False, limit: int = None) -> np.ndarray:
+        """Returns the dense ids matching the boolean mask, optionally sorted by a column and truncated"""
+        if mask is None:
+            dense_ids = np.arange(self.__size)
+        else:
+            dense_ids = np.flatnonzero(mask)
+        if order_by is not None:
+            values = self[order_by][dense_ids]
+            missing = np.isnan(values) if np.issubdtype(values.dtype, np.floating) else values < 0
+            if descending:
+                values = -values.astype(np.float64)
+            # Missing values (NaN, or -1 in an integer column) sort last in both directions: lexsort orders by its
+            # last key first, so the missing flag comes before the values.
+            dense_ids = dense_ids[np.lexsort((values, missing))]
+        if limit is not None:
+            dense_ids = dense_ids[:limit]
+        return dense_ids
+
+    def aggregate(self, column_name: str, how: str = 'mean', mask=None):
+        values = self[column_name]
+        if mask is not None:
+            values = values[mask]
+        if np.issubdtype(values.dtype, np.floating):
+            functions = {'mean': np.nanmean, 'sum': np.nansum, 'min': np.nanmin, 'max': np.nanmax,
+                         'count': lambda column: int(np.count_nonzero(~np.isnan(column)))}
+        else:
+            values = values[values >= 0]
+            functions = {'mean': np.mean, 'sum': np.sum, 'min': np.min, 'max': np.max, 'count': len}
+        if len(values) == 0:
+            return None
+        result = functions[how](values)
+        return result.item() if isinstance(result, np.generic) else result
+
+
+def build_catalog_store(movies) -> CatalogStore:
+    movies = list(movies)
+    store = CatalogStore(max(len(movies), INITIAL_CAPACITY))
+    for movie in movies:
+        store.add_movie(movie)
+    return store
+
+
+class TestCatalogStore:
+
+    @staticmethod
+    def store_of(runtimes) -> CatalogStore:
+        movies = []
+        for number, runtime in enumerate(runtimes):
+            movie = Movie(f"Movie {number}", 2000)
+            if runtime is not None:
+                movie.runtime_minutes = runtime
+                movie.metascore = runtime
+            movies.append(movie)
+        return build_catalog_store(movies)
+
+    def test_missing_values_sort_last(self):
+        store = self.store_of([120, None, 90, None, 150])
+        for column in ('runtime_minutes', 'metascore'):
+            assert list(store.select(order_by=column)) == [2, 0, 4, 1, 3]
+            assert list(store.select(order_by=column, descending=True)) == [4, 0, 2, 1, 3]
+        assert list(store.select(store['runtime_minutes'] > 100, order_by='runtime_minutes', limit=1)) == [0]
+
+    def test_aggregates_skip_missing_values(self):
+        store = self.store_of([120, None, 90])
+        assert store.aggregate('runtime_minutes', 'mean') == 105
+        assert store.aggregate('metascore', 'count') == 2
@@ -0,0 +1,308 @@
+import threading
+import weakref
+from contextlib import contextmanager
+from itertools import chain
+
+from appl.adaptors.range_index import CURSOR_TYPES, RANGE_FIELDS
+from appl.adaptors.repository import RepositoryException, encode_cursor, decode_cursor, sequence_page
+
+CHUNK_SIZE = 1024
+COLLECTIONS = ('movies', 'actors', 'directors', 'genres', 'reviews', 'watchlists')
+
+
+class ChunkedSequence:
+    """Immutable sequence stored as a tuple of fixed-size chunks
+
+    Appending returns a new sequence that shares every full chunk with the old one and copies only the partly
+    filled last chunk, so a new version costs O(CHUNK_SIZE + chunks) however long the sequence is.
+    """
+
+    def __init__(self, chunks: tuple = (), length: int = 0):
+        self.__chunks = chunks
+        self.__length = length
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self):
+        return chain.from_iterable(self.__chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.__length)
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            items = []
+            while start < stop:
+                chunk, offset = divmod(start, CHUNK_SIZE)
+                items.extend(self.__chunks[chunk][offset:offset + stop - start])
+                start += CHUNK_SIZE - offset
+            return items
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError("ChunkedSequence index out of range")
+        chunk, offset = divmod(index, CHUNK_SIZE)
+        return self.__chunks[chunk][offset]
+
+    @property
+    def chunks(self) -> tuple:
+        return self.__chunks
+
+    def starts_with(self, other: 'ChunkedSequence') -> bool:
+        """True if other is an earlier state of this sequence, i.e. this one was made from it by extended"""
+        if len(other) > self.__length:
+            return False
+        full = len(other) // CHUNK_SIZE
+        # extended shares every full chunk, so comparing identities is enough for those.
+        if any(mine is not theirs for mine, theirs in zip(self.__chunks[:full], other.chunks[:full])):
+            return False
+        return full == len(other.chunks) or self.__chunks[full][:len(other) % CHUNK_SIZE] == other.chunks[full]
+
+    def extended(self, items) -> 'ChunkedSequence':
+        items = list(items)
+        if not items:
+            return self
+        chunks = list(self.__chunks)
+        tail = list(chunks.pop()) if chunks and len(chunks[-1]) < CHUNK_SIZE else []
+        tail.extend(items)
+        for start in range(0, len(tail), CHUNK_SIZE):
+            chunks.append(tuple(tail[start:start + CHUNK_SIZE]))
+        return ChunkedSequence(tuple(chunks), self.__length + len(items))
+
+
+def chunked(items) -> ChunkedSequence:
+    return ChunkedSequence().extended(items)
+
+
+class SortedViews:
+    """Builds the sorted indexes that versions page through, deriving each from the last one built
+
+    orderings maps a collection to a factory(ordering, items) returning a SortedIndex, e.g. MovieRangeIndex for
+    movies. A version whose collection only grew since the last index was built extends a copy of that index with
+    the new items instead of sorting the whole collection again; versions sharing the collection share the index.
+    """
+
+    def __init__(self, orderings: dict):
+        self.__orderings = orderings
+        # (collection, ordering) -> (items, index) of the newest index built
+        self.__latest = dict()
+        self.__lock = threading.Lock()
+
+    def index(self, name: str, ordering: str, items: ChunkedSequence):
+        if name not in self.__orderings:
+            raise RepositoryException(f"The {name} collection has no sorted views")
+        with self.__lock:
+            latest = self.__latest.get((name, ordering))
+            if latest is not None and latest[0] is items:
+                return latest[1]
+            if latest is not None and items.starts_with(latest[0]):
+                index = latest[1].extended(items[len(latest[0]):])
+            else:
+                index = self.__orderings[name](ordering, items)
+                if latest is not None and latest[0].starts_with(items):
+                    # An older version pinned for a long time; its index is not worth keeping for newer ones.
+                    return index
+            self.__latest[(name, ordering)] = items, index
+            return index
+
+
+class CatalogVersion:
+    """One published state of the catalog; nothing reachable from it changes after it is published
+
+    The get_*_page methods answer like the repository's, but from this version alone, so a page rendered from
+    one version never mixes states from before and after a write.
+    """
+
+    def __init__(self, version: int, collections: dict, views: SortedViews = None):
+        self.__version = version
+        self.__collections = collections
+        self.__views = views
+        # (collection, ordering) -> the sorted index of this version's items, built on the first page request
+        self.__indexes = dict()
+
+    def __repr__(self):
+        return f"<CatalogVersion {self.__version}: {len(self.movies)} movies>"
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def movies(self) -> ChunkedSequence:
+        return self.__collections['movies']
+
+    @property
+    def actors(self) -> ChunkedSequence:
+        return self.__collections['actors']
+
+    @property
+    def directors(self) -> ChunkedSequence:
+        return self.__collections['directors']
+
+    @property
+    def genres(self) -> ChunkedSequence:
+        return self.__collections['genres']
+
+    @property
+    def reviews(self) -> ChunkedSequence:
+        return self.__collections['reviews']
+
+    @property
+    def watchlists(self) -> ChunkedSequence:
+        return self.__collections['watchlists']
+
+    def collection(self, name: str) -> ChunkedSequence:
+        return self.__collections[name]
+
+    def sorted_index(self, name: str, ordering: str):
+        index = self.__indexes.get((name, ordering))
+        if index is None:
+            if self.__views is None:
+                raise RepositoryException(f"The {name} collection has no sorted views")
+            index = self.__indexes[(name, ordering)] = self.__views.index(name, ordering, self.__collections[name])
+        return index
+
+    def get_movies_page(self, limit: int = 20, cursor: str = None, order_by: str = 'title',
+                        descending: bool = False) -> tuple:
+        if order_by not in RANGE_FIELDS:
+            raise RepositoryException(f"Unknown sort field {order_by!r}, expected one of {RANGE_FIELDS}")
+        after_key = decode_cursor(cursor, CURSOR_TYPES.get(order_by))
+        movies, key = self.sorted_index('movies', order_by).page(after_key=after_key, limit=limit,
+                                                                 descending=descending)
+        return movies, encode_cursor(key)
+
+    def get_actors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__name_page('actors', limit, cursor, descending)
+
+    def get_directors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__name_page('directors', limit, cursor, descending)
+
+    def get_genres_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__name_page('genres', limit, cursor, descending)
+
+    def __name_page(self, name: str, limit, cursor, descending) -> tuple:
+        items, key = self.sorted_index(name, 'name').page(after_key=decode_cursor(cursor, (str,)), limit=limit,
+                                                          descending=descending)
+        return items, encode_cursor(key)
+
+    def get_reviews_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return sequence_page(self.reviews, limit, cursor, descending)
+
+    def get_watchlists_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return sequence_page(self.watchlists, limit, cursor, descending)
+
+
+class CatalogVersions:
+    """Publishes copy-on-write versions of the catalog for readers to pin
+
+    Readers take the current version with a single attribute read and keep it for as long as they need; they
+    never wait on a writer. Writers queue their appends and publish the next version with one reference swap.
+    Outside bulk_update every write publishes at once. A version nobody holds any more is freed by reference
+    counting; live_versions reports which ones are still pinned.
+    """
+
+    def __init__(self, orderings: dict = None):
+        self.__views = SortedViews(orderings or dict())
+        self.__current = CatalogVersion(0, {name: ChunkedSequence() for name in COLLECTIONS}, self.__views)
+        self.__pending = {name: [] for name in COLLECTIONS}
+        self.__bulk_depth = 0
+        self.__write_lock = threading.RLock()
+        self.__live = weakref.WeakValueDictionary()
+
+    @property
+    def current(self) -> CatalogVersion:
+        return self.__current
+
+    def pin(self) -> CatalogVersion:
+        version = self.__current
+        self.__live[version.version] = version
+        return version
+
+    @contextmanager
+    def pinned(self):
+        """Yields the current version; the caller keeps seeing it even if newer versions are published meanwhile"""
+        yield self.pin()
+
+    def live_versions(self) -> list:
+        return sorted(self.__live.keys())
+
+    def append(self, name: str, item):
+        with self.__write_lock:
+            self.__pending[name].append(item)
+            if not self.__bulk_depth:
+                self.__publish()
+
+    @contextmanager
+    def bulk_update(self):
+        """Queues every write made inside the block and publishes them together as one version"""
+        with self.__write_lock:
+            self.__bulk_depth += 1
+            try:
+                yield self
+            finally:
+                self.__bulk_depth -= 1
+                if not self.__bulk_depth:
+                    self.__publish()
+
+    def replace(self, **collections):
+        """Publishes a version with the given collections rebuilt from scratch, e.g. after movies were deleted"""
+        with self.__write_lock:
+            self.__publish({name: chunked(items) for name, items in collections.items()})
+
+    def __publish(self, replaced: dict = None):
+        replaced = replaced or dict()
+        if not replaced and not any(self.__pending.values()):
+            return
+        previous = self.__current
+        collections = dict()
+        for name in COLLECTIONS:
+            if name in replaced:
+                # A rebuilt collection already holds whatever was queued for it.
+                collections[name] = replaced[name]
+            else:
+                collections[name] = previous.collection(name).extended(self.__pending[name])
+            self.__pending[name] = []
+        # A single reference assignment, so a reader sees either the old version or the new one, never a mix.
+        self.__current = CatalogVersion(previous.version + 1, collections, self.__views)
+
+
+class TestCatalogVersions:
+
+    def test_chunked_slices_and_prefixes(self):
+        first = chunked(range(CHUNK_SIZE + 10))
+        second = first.extended(range(5))
+        assert second[CHUNK_SIZE - 2:CHUNK_SIZE + 2] == [CHUNK_SIZE - 2, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1]
+        assert second[-5:] == list(range(5)) and second[::CHUNK_SIZE] == [0, CHUNK_SIZE]
+        assert second.starts_with(first) and not first.starts_with(second)
+        assert not chunked(range(CHUNK_SIZE + 10)).extended(range(5)).starts_with(first)
+        assert second.starts_with(ChunkedSequence())
+
+    def test_pinned_version_pages_ignore_later_writes(self):
+        from appl.adaptors.range_index import MovieRangeIndex
+        from appl.domainmodel.movie import Movie
+
+        versions = CatalogVersions(orderings={'movies': MovieRangeIndex})
+        for title in ("B", "D"):
+            versions.append('movies', Movie(title, 2000))
+        with versions.pinned() as catalog:
+            movies, cursor = catalog.get_movies_page(1)
+            versions.append('movies', Movie("C", 2000))
+            versions.append('reviews', "A review")
+            assert [movie.title for movie in catalog.get_movies_page(1, cursor)[0]] == ["D"]
+            assert catalog.get_reviews_page() == ([], None)
+        latest = versions.current
+        assert [movie.title for movie in latest.get_movies_page()[0]] == ["B", "C", "D"]
+        assert latest.get_reviews_page() == (["A review"], None)
+        # The newest version's index extends the one built before it; the pinned version keeps its own.
+        assert catalog.sorted_index('movies', 'title') is not latest.sorted_index('movies', 'title')
+        assert len(catalog.sorted_index('movies', 'title')) == 2
+
+    def test_unknown_orderings_are_repository_errors(self):
+        catalog = CatalogVersions().current
+        for read in (lambda: catalog.get_movies_page(order_by='budget'), lambda: catalog.get_actors_page()):
+            try:
+                read()
+            except RepositoryException:
+                continue
+            raise AssertionError("accepted an unknown ordering")
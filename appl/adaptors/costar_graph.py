@@ -0,0 +1,123 @@
+from array import array
+
+from appl.datafilereaders.entity_registry import normalize_name
+
+
+class CoStarGraph:
+    """Undirected graph of actors who appeared in the same movie, in compressed sparse row form
+
+    Actor i's co-stars are neighbours[offsets[i]:offsets[i + 1]], two flat arrays of 4-byte ids instead of a
+    Python list per actor. Every edge is also kept as one integer in a set, so "worked with" is a single lookup.
+    """
+
+    def __init__(self, casts=()):
+        self.__ids = dict()
+        self.__names = []
+        adjacency = []
+        for cast in casts:
+            cast_ids = []
+            for name in cast:
+                if not name:
+                    continue
+                key = normalize_name(name)
+                actor_id = self.__ids.get(key)
+                if actor_id is None:
+                    actor_id = self.__ids[key] = len(self.__names)
+                    self.__names.append(key)
+                    adjacency.append(set())
+                cast_ids.append(actor_id)
+            for actor_id in cast_ids:
+                adjacency[actor_id].update(cast_ids)
+        self.__offsets = array('I', [0])
+        self.__neighbours = array('I')
+        self.__edges = set()
+        for actor_id, costars in enumerate(adjacency):
+            costars.discard(actor_id)
+            self.__neighbours.extend(sorted(costars))
+            self.__offsets.append(len(self.__neighbours))
+            self.__edges.update(edge_key(actor_id, costar) for costar in costars if actor_id < costar)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __contains__(self, actor_name):
+        return normalize_name(actor_name) in self.__ids
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.__edges)
+
+    def costars(self, actor_name: str) -> list:
+        actor_id = self.__ids.get(normalize_name(actor_name))
+        if actor_id is None:
+            return []
+        return [self.__names[costar] for costar in self.__neighbours_of(actor_id)]
+
+    def __neighbours_of(self, actor_id: int):
+        return self.__neighbours[self.__offsets[actor_id]:self.__offsets[actor_id + 1]]
+
+    def worked_with(self, actor_name: str, colleague_name: str) -> bool:
+        actor_id = self.__ids.get(normalize_name(actor_name))
+        colleague_id = self.__ids.get(normalize_name(colleague_name))
+        if actor_id is None or colleague_id is None or actor_id == colleague_id:
+            return False
+        return edge_key(actor_id, colleague_id) in self.__edges
+
+    def shortest_path(self, actor_name: str, colleague_name: str, max_depth: int = None) -> list:
+        """Returns the actor names on a shortest chain of co-stars from one actor to the other, or None"""
+        source = self.__ids.get(normalize_name(actor_name))
+        target = self.__ids.get(normalize_name(colleague_name))
+        if source is None or target is None:
+            return None
+        if source == target:
+            return [self.__names[source]]
+        # Searches from both ends and always grows the smaller frontier, so a path of length d visits roughly
+        # twice b^(d/2) actors rather than b^d.
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        depth = 0
+        while frontiers[0] and frontiers[1]:
+            if max_depth is not None and depth >= max_depth:
+                return None
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], parents[1 - side]
+            next_frontier = []
+            meetings = []
+            for actor_id in frontiers[side]:
+                for costar in self.__neighbours_of(actor_id):
+                    if costar in seen:
+                        continue
+                    seen[costar] = actor_id
+                    if costar in other:
+                        meetings.append(costar)
+                    else:
+                        next_frontier.append(costar)
+            if meetings:
+                # The first meeting is not necessarily on a shortest path; the whole level is, so take the best.
+                return min((self.__join_path(meeting, parents) for meeting in meetings), key=len)
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+            depth += 1
+        return None
+
+    def __join_path(self, meeting: int, parents: tuple) -> list:
+        path = []
+        actor_id = meeting
+        while actor_id is not None:
+            path.append(actor_id)
+            actor_id = parents[0][actor_id]
+        path.reverse()
+        actor_id = parents[1][meeting]
+        while actor_id is not None:
+            path.append(actor_id)
+            actor_id = parents[1][actor_id]
+        return [self.__names[actor_id] for actor_id in path]
+
+
+def edge_key(actor_id: int, colleague_id: int) -> int:
+    if actor_id > colleague_id:
+        actor_id, colleague_id = colleague_id, actor_id
+    return actor_id << 32 | colleague_id
+
+
+def build_costar_graph(movies) -> CoStarGraph:
+    return CoStarGraph([actor.actor_full_name for actor in movie.actors or []] for movie in movies)
@@ -1,18 +1,23 @@
 import csv
+import hashlib
 import os
+import time
 
 from datetime import date
 from typing import List
 
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, or_, and_, select, func, create_engine, String
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from werkzeug.security import generate_password_hash
 
-from sqlalchemy.orm import scoped_session
+from sqlalchemy.orm import scoped_session, sessionmaker, clear_mappers
 from flask import _app_ctx_stack
 
-from appl.adaptors.repository import AbstractRepository
+from appl.adaptors.repository import AbstractRepository, RepositoryException, encode_cursor, decode_cursor
+from appl.adaptors.catalog_snapshot import source_checksum
+from appl.adaptors.top_movies import top_key
+from appl.adaptors import orm
 from appl.domainmodel.actor import Actor
 from appl.domainmodel.director import Director
 from appl.domainmodel.genre import Genre
@@ -71,18 +76,18 @@ class SqlAlchemyRepository(AbstractRepository):
         self._session_cm.reset_session()
 
     def get_movies(self):
-        movies = self._session_cm.session.query(Movie).all()
+        movies = self._session_cm.session.query(orm.MappedMovie).all()
         return movies
 
     def add_user(self, user: User):
         with self._session_cm as scm:
-            scm.session.add(user)
+            scm.session.add(orm.mapped(user))
             scm.commit()
 
     def get_user(self, username):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -91,7 +96,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_firstname(self, user_id):
         user_firstname = None
         try:
-            user_firstname = self._session_cm.session.query(User).filter_by(__user_id=user_id).one()
+            user_firstname = self._session_cm.session.query(orm.MappedUser).filter_by(__user_id=user_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -100,7 +105,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_lastname(self, user_id):
         user_lastname = None
         try:
-            user_lastname = self._session_cm.session.query(User).filter_by(user_id=user_id).one()
+            user_lastname = self._session_cm.session.query(orm.MappedUser).filter_by(user_id=user_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -109,7 +114,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_password(self, username):
         user_password = None
         try:
-            user_password = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user_password = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -118,7 +123,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_watched_movies(self, username) -> List[Movie]:
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -127,7 +132,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_reviews(self, username):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -136,7 +141,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_id(self, username):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -145,7 +150,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_age(self, username):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -154,7 +159,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_email(self, username):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -163,7 +168,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_consent(self, username):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__username=username).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__username=username).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -171,13 +176,132 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_movie(self, movie: Movie):
         with self._session_cm as scm:
-            scm.session.add(movie)
+            save_movie(scm.session, movie, dict())
             scm.commit()
 
+    def apply_movie_changes(self, inserted: list, updated: list, deleted_ids: list):
+        # Everything goes through one transaction, so other sessions keep reading the previous catalog until the
+        # commit.
+        with self._session_cm as scm:
+            # One memo for the whole batch, so a person or genre shared by several movies is copied once.
+            memo = dict()
+            # The bulk delete does not cascade, and an updated movie's cast and genres are written again in full, so
+            # the association rows of both go first.
+            delete_associations(scm.session, list(deleted_ids) + [movie.movie_id for movie in updated])
+            for movie_id in deleted_ids:
+                scm.session.query(orm.MappedMovie).filter_by(_Movie__id=movie_id).delete()
+            for movie in updated:
+                save_movie(scm.session, movie, memo, merge=True)
+            for movie in inserted:
+                save_movie(scm.session, movie, memo)
+            scm.commit()
+
+    def search_movies(self, query: str, page: int = 1, page_size: int = 10) -> dict:
+        # Without a full-text index the database can only match substrings of the title and description.
+        pattern = f"%{query.strip()}%"
+        matches = self._session_cm.session.query(orm.MappedMovie).filter(
+            or_(orm.movie.c.movie_title.ilike(pattern), orm.movie.c.description.ilike(pattern)))
+        page = max(page, 1)
+        movies = matches.order_by(orm.movie.c.rank).offset((page - 1) * page_size).limit(page_size).all()
+        return {'movies': movies, 'total': matches.count(), 'page': page, 'page_size': page_size}
+
+    def find_movies(self, genre=None, director=None, actor=None, year=None) -> list:
+        # Each facet becomes an IN (subquery) over its join table, so the database intersects them with its own
+        # indexes. Directors and actors are stored as first and last name, matched on the first and last word.
+        matches = self._session_cm.session.query(orm.MappedMovie)
+        if genre is not None:
+            matches = matches.filter(orm.movie.c.movie_id.in_(
+                select([orm.movie_genre.c.movie_id])
+                .select_from(orm.movie_genre.join(orm.genre, orm.genre.c.genre_id == orm.movie_genre.c.genre_id))
+                .where(orm.genre.c.genre_name.in_(facet_values(genre)))))
+        if director is not None:
+            matches = matches.filter(orm.movie.c.director_id.in_(
+                select([orm.director.c.director_id]).where(or_(*(
+                    and_(orm.director.c.firstname == first, orm.director.c.lastname == last)
+                    for first, last in map(first_and_last_name, facet_values(director)))))))
+        if actor is not None:
+            matches = matches.filter(orm.movie.c.movie_id.in_(
+                select([orm.movie_actor.c.movie_id])
+                .select_from(orm.movie_actor.join(orm.actor, orm.actor.c.actor_id == orm.movie_actor.c.actor_id))
+                .where(or_(*(and_(orm.actor.c.firstname == first, orm.actor.c.lastname == last)
+                             for first, last in map(first_and_last_name, facet_values(actor)))))))
+        if year is not None:
+            matches = matches.filter(orm.movie.c.release_year.in_([int(value) for value in facet_values(year)]))
+        return matches.order_by(orm.movie.c.rank).all()
+
+    def get_movies_between(self, field: str, lo=None, hi=None, after_key=None, limit: int = None,
+                           descending: bool = False) -> tuple:
+        column = RANGE_COLUMNS[field]
+        matches = self._session_cm.session.query(orm.MappedMovie).filter(column.isnot(None))
+        if lo is not None:
+            matches = matches.filter(column >= lo)
+        if hi is not None:
+            matches = matches.filter(column <= hi)
+        return keyset_page(matches, [column, orm.movie.c.movie_id], after_key, limit, descending)
+
+    def get_movies_page(self, limit: int = 20, cursor: str = None, order_by: str = 'title',
+                        descending: bool = False) -> tuple:
+        if order_by not in RANGE_COLUMNS:
+            raise RepositoryException(f"Unknown sort field {order_by!r}, expected one of {tuple(RANGE_COLUMNS)}")
+        after_key = decode_cursor(cursor, RANGE_CURSOR_TYPES.get(order_by))
+        movies, key = self.get_movies_between(order_by, after_key=after_key, limit=limit, descending=descending)
+        return movies, encode_cursor(key)
+
+    def get_actors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        columns = [orm.actor.c.firstname, orm.actor.c.lastname, orm.actor.c.actor_id]
+        actors, key = keyset_page(self._session_cm.session.query(orm.MappedActor), columns,
+                                  decode_cursor(cursor, (str, str, int)), limit, descending)
+        return actors, encode_cursor(key)
+
+    def get_directors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        columns = [orm.director.c.firstname, orm.director.c.lastname, orm.director.c.director_id]
+        directors, key = keyset_page(self._session_cm.session.query(orm.MappedDirector), columns,
+                                     decode_cursor(cursor, (str, str, int)), limit, descending)
+        return directors, encode_cursor(key)
+
+    def get_genres_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        columns = [orm.genre.c.genre_name, orm.genre.c.genre_id]
+        genres, key = keyset_page(self._session_cm.session.query(orm.MappedGenre), columns,
+                                  decode_cursor(cursor, (str, int)), limit, descending)
+        return genres, encode_cursor(key)
+
+    def get_reviews_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        reviews, key = keyset_page(self._session_cm.session.query(orm.MappedReview), [orm.review.c.review_id],
+                                   decode_cursor(cursor, (int,)), limit, descending)
+        return reviews, encode_cursor(key)
+
+    def get_watchlists_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        watchlists, key = keyset_page(self._session_cm.session.query(orm.MappedWatchlist),
+                                      [orm.watchlist.c.watch_list_id], decode_cursor(cursor, (int,)), limit,
+                                      descending)
+        return watchlists, encode_cursor(key)
+
+    def get_top_movies(self, metric: str, k: int = 10, genre=None, year_from=None, year_to=None) -> list:
+        # ORDER BY ... LIMIT lets the database keep a bounded top-k instead of sorting every row.
+        top_key(metric)
+        if metric == 'review_rating':
+            # Joined on the movie id, as MemoryRepository keys its ratings, so remakes sharing a title keep apart.
+            score = func.avg(orm.review.c.rating)
+            matches = self._session_cm.session.query(orm.MappedMovie).join(
+                orm.review, orm.review.c.movie_id == orm.movie.c.movie_id).group_by(orm.movie.c.movie_id)
+        else:
+            score = orm.movie.c[metric]
+            matches = self._session_cm.session.query(orm.MappedMovie).filter(score.isnot(None))
+        if genre is not None:
+            matches = matches.filter(orm.movie.c.movie_id.in_(
+                select([orm.movie_genre.c.movie_id])
+                .select_from(orm.movie_genre.join(orm.genre, orm.genre.c.genre_id == orm.movie_genre.c.genre_id))
+                .where(orm.genre.c.genre_name == genre)))
+        if year_from is not None:
+            matches = matches.filter(orm.movie.c.release_year >= year_from)
+        if year_to is not None:
+            matches = matches.filter(orm.movie.c.release_year <= year_to)
+        return matches.order_by(desc(score), orm.movie.c.rank).limit(k).all()
+
     def get_movie_title(self, movie_id):
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -186,7 +310,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_movie_director(self, movie_id):
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -195,7 +319,7 @@ class SqlAlchemyRepository(AbstractRepository):
     # def get_movie_director_by_title(self, movie_title):
     #     movie = None
     #     try:
-    #         movie = self._session_cm.session.query(Movie).filter_by(__title=movie_title).one()
+    #         movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__title=movie_title).one()
     #     except NoResultFound:
     #         # Ignore any exception and return None.
     #         pass
@@ -204,7 +328,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_movie_runtime(self, movie_id) -> Movie:
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -213,7 +337,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_movie_genres(self, movie_id) -> Movie:
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -222,7 +346,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_movie_description(self, movie_id):
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -231,7 +355,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_movie_rank(self, movie_id):
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -239,14 +363,20 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_review(self, review: Review):
         with self._session_cm as scm:
-            scm.session.add(review)
+            scm.session.add(orm.mapped(review))
             scm.commit()
 
+    def get_review(self, review) -> Review:
+        # Looked up by text, as MemoryRepository.get_review does.
+        if isinstance(review, Review):
+            review = review.review_text
+        return self._session_cm.session.query(orm.MappedReview).filter(orm.review.c.review_text == review).first()
+
 
     def get_review_text(self, review_id):
         review = None
         try:
-            review = self._session_cm.session.query(Review).filter_by(__review_id=review_id).one()
+            review = self._session_cm.session.query(orm.MappedReview).filter_by(__review_id=review_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -255,7 +385,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_review_rating(self, review_id):
         review = None
         try:
-            review = self._session_cm.session.query(Review).filter_by(__review_id=review_id).one()
+            review = self._session_cm.session.query(orm.MappedReview).filter_by(__review_id=review_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -264,7 +394,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_review_movie_title(self, review_id):
         review = None
         try:
-            review = self._session_cm.session.query(Review).filter_by(__review_id=review_id).one()
+            review = self._session_cm.session.query(orm.MappedReview).filter_by(__review_id=review_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -273,7 +403,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_review_timestamp(self, review_id):
         review = None
         try:
-            review = self._session_cm.session.query(Review).filter_by(__review_id=review_id).one()
+            review = self._session_cm.session.query(orm.MappedReview).filter_by(__review_id=review_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -282,13 +412,13 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_genre(self, genre: Genre):
         with self._session_cm as scm:
-            scm.session.add(genre)
+            scm.session.add(orm.mapped(genre))
             scm.commit()
 
     def get_genre(self, genre_id):
         genre = None
         try:
-            genre = self._session_cm.session.query(Genre).filter_by(_genre_id=genre_id).one()
+            genre = self._session_cm.session.query(orm.MappedGenre).filter_by(_genre_id=genre_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -297,7 +427,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_movie_genre(self, movie_id):
         movie = None
         try:
-            movie = self._session_cm.session.query(Movie).filter_by(__id=movie_id).one()
+            movie = self._session_cm.session.query(orm.MappedMovie).filter_by(__id=movie_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -305,13 +435,13 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_actor(self, actor: Actor):
         with self._session_cm as scm:
-            scm.session.add(actor)
+            scm.session.add(orm.mapped(actor))
             scm.commit()
 
     def get_actor(self, actor_id):
         actor = None
         try:
-            actor = self._session_cm.session.query(Actor).filter_by(__=actor).one()
+            actor = self._session_cm.session.query(orm.MappedActor).filter_by(__=actor).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -319,7 +449,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_actor_firstname(self, actor_id):
         actor = None
         try:
-            actor = self._session_cm.session.query(Actor).filter_by(__actor_id=actor_id).one()
+            actor = self._session_cm.session.query(orm.MappedActor).filter_by(__actor_id=actor_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -328,7 +458,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_actor_lastname(self, actor_id):
         actor = None
         try:
-            actor = self._session_cm.session.query(Actor).filter_by(__actor_id=actor_id).one()
+            actor = self._session_cm.session.query(orm.MappedActor).filter_by(__actor_id=actor_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -337,7 +467,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_actor_middlenames(self, actor_id):
         actor = None
         try:
-            actor = self._session_cm.session.query(Actor).filter_by(__actor_id=actor_id).one()
+            actor = self._session_cm.session.query(orm.MappedActor).filter_by(__actor_id=actor_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -345,13 +475,13 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_director(self, director: Director):
         with self._session_cm as scm:
-            scm.session.add(director)
+            scm.session.add(orm.mapped(director))
             scm.commit()
 
     def get_director(self, director_id):
         director = None
         try:
-            director = self._session_cm.session.query(Director).filter_by(__id=director_id).one()
+            director = self._session_cm.session.query(orm.MappedDirector).filter_by(__id=director_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -361,7 +491,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_director_firstname(self, director_id):
         director = None
         try:
-            director = self._session_cm.session.query(Director).filter_by(__id=director_id).one()
+            director = self._session_cm.session.query(orm.MappedDirector).filter_by(__id=director_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -370,7 +500,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_director_lastname(self, director_id):
         director = None
         try:
-            director = self._session_cm.session.query(Director).filter_by(__id=director_id).one()
+            director = self._session_cm.session.query(orm.MappedDirector).filter_by(__id=director_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -378,27 +508,392 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_watchlist(self, watchlist: Watchlist):
         with self._session_cm as scm:
-            scm.session.add(watchlist)
+            scm.session.add(orm.mapped(watchlist))
             scm.commit()
 
+    def get_watchlists(self):
+        return self._session_cm.session.query(orm.MappedWatchlist).all()
+
     def get_watchlist(self, user_id):
         user = None
         try:
-            user = self._session_cm.session.query(User).filter_by(__user_id=user_id).one()
+            user = self._session_cm.session.query(orm.MappedUser).filter_by(__user_id=user_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
         return user.watchlist
 
-    def populate(session_factory, data_path, data_filename):
-        filename = os.path.join(data_path, data_filename)
-        movie_file_reader = MovieFileCSVReader(filename)
-        movie_file_reader.read_csv_file()
-        session = session_factory()
-        # This takes all movies from the csv file (represented as domain model objects) and adds them to the
-        # database. If the uniqueness of directors, actors, genres is correctly
-        # handled, and the relationships# are correctly set up in the ORM mapper,
-        # then all associations will be dealt with as well!
-        for movie in movie_file_reader.dataset_of_movies:
-            session.add(movie)
-            session.commit()
\ No newline at end of file
+
+# Journal and sync settings that trade crash safety during the load for speed. The previous values are restored
+# once the load finishes.
+SQLITE_FAST_LOAD_PRAGMAS = (('journal_mode', 'MEMORY'), ('synchronous', 'OFF'))
+
+
+RANGE_COLUMNS = {'release_year': orm.movie.c.release_year, 'runtime_minutes': orm.movie.c.runtime,
+                 'rank': orm.movie.c.rank, 'rating': orm.movie.c.rating, 'title': orm.movie.c.movie_title}
+# The element types of a movie page cursor, (value, movie id), for each field.
+RANGE_CURSOR_TYPES = {'release_year': (int, str), 'runtime_minutes': (int, str), 'rank': (int, str),
+                      'rating': ((int, float), str), 'title': (str, str)}
+
+
+def sort_column(column):
+    # NULL compares as unknown, so a keyset predicate would drop every row with a NULL sort column from the pages
+    # after the first; optional names sort as '' instead, in the ORDER BY and the predicate alike.
+    if column.nullable and isinstance(column.type, String):
+        return func.coalesce(column, '')
+    return column
+
+
+def keyset_predicate(columns: list, values, descending: bool = False):
+    # (c1, c2, ...) > (v1, v2, ...) spelled out as c1 > v1 OR (c1 = v1 AND c2 > v2) OR ..., which every database
+    # can answer from an index on the columns.
+    clauses = []
+    for position, column in enumerate(columns):
+        beyond = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*(earlier == value for earlier, value in zip(columns[:position], values)), beyond))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns: list, after_key=None, limit: int = None, descending: bool = False) -> tuple:
+    """Returns (one page of the query's entities ordered by columns after after_key, key of the last one or None)
+
+    The next page starts strictly after the sort key of the last row, so the database seeks straight to it where
+    OFFSET would have to count past every earlier row.
+    """
+    columns = [sort_column(column) for column in columns]
+    if after_key is not None:
+        query = query.filter(keyset_predicate(columns, after_key, descending))
+    query = query.add_columns(*columns).order_by(*(desc(column) if descending else column for column in columns))
+    if limit is None:
+        return [row[0] for row in query.all()], None
+    # One extra row tells whether another page follows.
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return [row[0] for row in rows], None
+    rows = rows[:limit]
+    return [row[0] for row in rows], tuple(rows[-1][1:])
+
+
+def save_movie(session, movie: Movie, memo: dict, merge: bool = False):
+    """Saves a mapped copy of movie along with its movie_actor and movie_genre rows; merge updates a stored movie
+
+    The association rows are inserted here rather than by the ORM, which cannot fill in the billing order, once a
+    flush has given every new genre its id. An updated movie's old rows are removed first (see delete_associations).
+    """
+    copy = with_stored_rows(session, orm.mapped(movie, memo))
+    if merge:
+        session.merge(copy)
+    else:
+        session.add(copy)
+    session.flush()
+    actors = getattr(copy, '_Movie__actors', None) or ()
+    if actors:
+        session.execute(orm.movie_actor.insert(), [{'movie_id': copy.movie_id, 'actor_id': actor._Actor__actor_id,
+                                                    'billing': billing} for billing, actor in enumerate(actors)])
+    genres = getattr(copy, '_Movie__genres', None) or ()
+    if genres:
+        session.execute(orm.movie_genre.insert(), [{'movie_id': copy.movie_id, 'genre_id': genre._Genre__genre_id}
+                                                   for genre in genres])
+
+
+def delete_associations(session, movie_ids: list):
+    if movie_ids:
+        for table in (orm.movie_actor, orm.movie_genre):
+            session.execute(table.delete().where(table.c.movie_id.in_(movie_ids)))
+
+
+def with_stored_rows(session, movie):
+    """Points a mapped movie's director, actors and genres at the rows already stored for them, and returns it
+
+    orm.mapped copies them with ids of their own (a hash for people, none for a genre) where populate numbered the
+    rows, so saving the copies as they are would store every person again and clash on the unique genre name. The
+    actors and genres that are not stored yet are added to the session, since their relationships do not cascade.
+    """
+    director = getattr(movie, '_Movie__director', None)
+    if director is not None:
+        movie._Movie__director = stored_row(session, director)
+    for name in ('_Movie__actors', '_Movie__genres'):
+        members = getattr(movie, name, None)
+        if members:
+            members = orm.MappedOrderedSet(stored_row(session, member) for member in members)
+            session.add_all(member for member in members if member not in session)
+            setattr(movie, name, members)
+    return movie
+
+
+def stored_row(session, entity):
+    """Returns the stored genre, actor or director with the name of entity, or entity itself if there is none"""
+    if isinstance(entity, orm.MappedGenre):
+        criteria = [orm.genre.c.genre_name == entity.genre_name]
+    elif isinstance(entity, orm.MappedActor):
+        criteria = [orm.actor.c.firstname == entity.firstname, orm.actor.c.lastname == entity.lastname,
+                    orm.actor.c.middlenames == getattr(entity, '_Actor__middlenames', None)]
+    else:
+        criteria = [orm.director.c.firstname == entity.firstname, orm.director.c.lastname == entity.lastname]
+    # The query autoflushes, so it also finds a row added by an earlier movie of the same batch.
+    stored = session.query(type(entity)).filter(*criteria).first()
+    return entity if stored is None else stored
+
+
+def facet_values(values) -> list:
+    return [values] if isinstance(values, (str, int)) else list(values)
+
+
+def first_and_last_name(full_name: str) -> tuple:
+    # Mirrors how Actor and Director split a name; a single name is both first and last name.
+    words = " ".join(full_name.split()).split(" ")
+    return words[0], words[-1]
+
+
+def populate(engine: Engine, data_path, data_filename='Data1000Movies.csv', batch_size=1000, fast_load=False):
+    """Bulk-loads the movie csv through Core executemany inserts, one transaction per batch of movies
+
+    Directors, actors and genres are given dense ids the first time they are seen, and the movie_actor and
+    movie_genre association rows are written alongside their movies. Returns the row counts and rows per second.
+    """
+    filename = os.path.join(data_path, data_filename)
+    movie_file_reader = MovieFileCSVReader(filename)
+    director_ids, actor_ids, genre_ids = dict(), dict(), dict()
+    # Parents come before the rows that reference them, so every flush inserts in this order.
+    tables = (orm.director, orm.actor, orm.genre, orm.movie, orm.movie_actor, orm.movie_genre)
+    pending = {table: [] for table in tables}
+    row_counts = {table.name: 0 for table in tables}
+    started = time.perf_counter()
+
+    def flush(connection):
+        with connection.begin():
+            for table in tables:
+                if pending[table]:
+                    connection.execute(table.insert(), pending[table])
+                    row_counts[table.name] += len(pending[table])
+                    pending[table] = []
+
+    with engine.connect() as connection:
+        previous_pragmas = None
+        if fast_load and engine.dialect.name == 'sqlite':
+            previous_pragmas = apply_sqlite_pragmas(connection, SQLITE_FAST_LOAD_PRAGMAS)
+        try:
+            for movie in movie_file_reader.iter_movies():
+                director = movie.get_director()
+                director_id = None
+                if director is not None:
+                    director_id = director_ids.get(director.director_full_name)
+                    if director_id is None:
+                        director_id = director_ids[director.director_full_name] = len(director_ids) + 1
+                        pending[orm.director].append({'director_id': director_id, 'firstname': director.firstname,
+                                                      'lastname': director.lastname})
+
+                pending[orm.movie].append({
+                    'movie_id': movie.movie_id, 'movie_title': movie.title, 'release_year': movie.release_year,
+                    'runtime': movie.runtime_minutes, 'cast_id': row_counts['movie'] + len(pending[orm.movie]),
+                    'director_id': director_id, 'description': movie.description, 'rank': movie.rank,
+                    'rating': movie.rating, 'votes': movie.votes, 'revenue_millions': movie.revenue_millions,
+                    'metascore': movie.metascore})
+
+                for billing, actor in enumerate(movie.actors or []):
+                    actor_id = actor_ids.get(actor.actor_full_name)
+                    if actor_id is None:
+                        actor_id = actor_ids[actor.actor_full_name] = len(actor_ids) + 1
+                        pending[orm.actor].append({'actor_id': actor_id, 'firstname': actor.firstname,
+                                                   'middlenames': getattr(actor, 'middlenames', None),
+                                                   'lastname': actor.lastname})
+                    pending[orm.movie_actor].append({'movie_id': movie.movie_id, 'actor_id': actor_id,
+                                                     'billing': billing})
+
+                for genre in movie.genres or []:
+                    genre_id = genre_ids.get(genre.genre_name)
+                    if genre_id is None:
+                        genre_id = genre_ids[genre.genre_name] = len(genre_ids) + 1
+                        pending[orm.genre].append({'genre_id': genre_id, 'genre_name': genre.genre_name})
+                    pending[orm.movie_genre].append({'movie_id': movie.movie_id, 'genre_id': genre_id})
+
+                if len(pending[orm.movie]) >= batch_size:
+                    flush(connection)
+            flush(connection)
+        finally:
+            if previous_pragmas is not None:
+                apply_sqlite_pragmas(connection, previous_pragmas)
+
+    seconds = time.perf_counter() - started
+    rows = sum(row_counts.values())
+    return {'movies': row_counts['movie'], 'rows': rows, 'row_counts': row_counts, 'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds > 0 else float('inf')}
+
+
+def apply_sqlite_pragmas(connection, pragmas):
+    """Sets the given pragmas and returns their previous values, so they can be put back the same way"""
+    previous = []
+    for name, value in pragmas:
+        previous.append((name, connection.execute(f"PRAGMA {name}").scalar()))
+        connection.execute(f"PRAGMA {name}={value}")
+    return tuple(previous)
+
+
+# What create_app does with a database whose fingerprint does not match the current schema and csv.
+STALE_DATABASE_POLICIES = ('repopulate', 'background', 'fail')
+
+
+def schema_fingerprint() -> str:
+    # Derived from the table definitions themselves, so any column added to orm.py changes it without a manual bump.
+    digest = hashlib.sha256()
+    for table in orm.metadata.sorted_tables:
+        digest.update(table.name.encode('utf-8'))
+        for column in table.columns:
+            digest.update(f"{column.name}:{column.type}:{column.primary_key}:{column.nullable}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def catalog_fingerprint(data_path, data_filename='Data1000Movies.csv') -> dict:
+    return {'schema_fingerprint': schema_fingerprint(),
+            'source_fingerprint': source_checksum(os.path.join(data_path, data_filename)).hex()}
+
+
+def read_catalog_fingerprint(engine: Engine) -> dict:
+    """Returns the stored fingerprint, or an empty dict for a database that has never been fully populated"""
+    if not engine.has_table(orm.catalog_metadata.name):
+        return dict()
+    rows = engine.execute(orm.catalog_metadata.select()).fetchall()
+    return {row['key']: row['value'] for row in rows}
+
+
+def write_catalog_fingerprint(engine: Engine, fingerprint: dict):
+    with engine.begin() as connection:
+        connection.execute(orm.catalog_metadata.delete())
+        connection.execute(orm.catalog_metadata.insert(),
+                           [{'key': key, 'value': value} for key, value in fingerprint.items()])
+
+
+def database_is_current(engine: Engine, fingerprint: dict) -> bool:
+    return read_catalog_fingerprint(engine) == fingerprint
+
+
+def repopulate(engine: Engine, data_path, fingerprint: dict, data_filename='Data1000Movies.csv', batch_size=1000,
+               fast_load=False):
+    """Clears every table, populates them again and only then records the fingerprint
+
+    Tables written under a different schema fingerprint are dropped and created again, since create_all leaves an
+    existing table with its old columns. A repopulation that dies half way leaves no fingerprint behind, and the
+    next start repopulates again.
+    """
+    if read_catalog_fingerprint(engine).get('schema_fingerprint') != fingerprint['schema_fingerprint']:
+        orm.metadata.drop_all(engine)
+    orm.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in reversed(orm.metadata.sorted_tables):
+            connection.execute(table.delete())
+    populate_stats = populate(engine, data_path, data_filename, batch_size, fast_load)
+    write_catalog_fingerprint(engine, fingerprint)
+    return populate_stats
+
+
+class TestSqlAlchemyRepository:
+
+    def setup_method(self):
+        clear_mappers()
+        orm.map_model_to_tables()
+        engine = create_engine('sqlite://')
+        orm.metadata.create_all(engine)
+        self.repository = SqlAlchemyRepository(sessionmaker(bind=engine))
+
+    def teardown_method(self):
+        self.repository.close_session()
+        clear_mappers()
+
+    @staticmethod
+    def movie(title: str, year: int, genres: list) -> Movie:
+        movie = Movie(title, year)
+        movie.runtime_minutes = 100
+        movie.rating = 7.5
+        movie.director = Director("Ron Clements")
+        for genre in genres:
+            movie.add_genre(Genre(genre))
+        return movie
+
+    def test_movie_round_trip(self):
+        self.repository.add_movie(self.movie("Moana", 2016, ["Animation", "Comedy"]))
+        self.repository.add_actor(Actor("Dwayne Douglas Johnson"))
+        self.repository.reset_session()
+        [movie] = self.repository.get_movies()
+        assert isinstance(movie, Movie) and movie == Movie("Moana", 2016) and movie.movie_id == "Moana2016"
+        assert movie.runtime_minutes == 100 and movie.rating == 7.5
+        assert movie.genres == [Genre("Animation"), Genre("Comedy")]
+        assert movie.get_director().director_full_name == "Ron Clements"
+        assert movie.sort_key == Movie("Moana", 2016).sort_key
+        actor = self.repository._session_cm.session.query(orm.MappedActor).one()
+        assert actor.actor_full_name == "Dwayne Douglas Johnson"
+        assert actor.sort_key == Actor("Dwayne Douglas Johnson").sort_key
+
+    def test_changes_reuse_stored_rows(self):
+        self.repository.add_movie(self.movie("Moana", 2016, ["Animation"]))
+        updated = self.movie("Moana", 2016, ["Animation", "Comedy"])
+        updated.description = "Sails beyond the reef"
+        self.repository.apply_movie_changes([self.movie("Hercules", 1997, ["Comedy"])], [updated], [])
+        self.repository.reset_session()
+        movies = {movie.title: movie for movie in self.repository.get_movies()}
+        assert movies["Moana"].description == "Sails beyond the reef"
+        assert movies["Moana"].genres == [Genre("Animation"), Genre("Comedy")]
+        assert movies["Hercules"].genres == [Genre("Comedy")]
+        session = self.repository._session_cm.session
+        assert session.query(orm.MappedGenre).count() == 2 and session.query(orm.MappedDirector).count() == 1
+
+    def test_association_rows_follow_updates_and_deletes(self):
+        moana = self.movie("Moana", 2016, ["Animation", "Comedy"])
+        for name in ("Auli'i Cravalho", "Dwayne Johnson", "Rachel House"):
+            moana.add_actor(Actor(name))
+        hercules = self.movie("Hercules", 1997, ["Comedy"])
+        hercules.add_actor(Actor("Tate Donovan"))
+        self.repository.apply_movie_changes([moana, hercules], [], [])
+        recast = self.movie("Moana", 2016, ["Animation"])
+        for name in ("Rachel House", "Auli'i Cravalho"):
+            recast.add_actor(Actor(name))
+        self.repository.apply_movie_changes([], [recast], ["Hercules1997"])
+        self.repository.reset_session()
+        [movie] = self.repository.get_movies()
+        assert [actor.actor_full_name for actor in movie.actors] == ["Rachel House", "Auli'i Cravalho"]
+        assert movie.genres == [Genre("Animation")]
+        session = self.repository._session_cm.session
+        assert session.execute(select([func.count()]).select_from(orm.movie_actor)).scalar() == 2
+        assert session.execute(select([func.count()]).select_from(orm.movie_genre)).scalar() == 1
+
+
+    def test_pages_include_null_names(self):
+        # Rows written outside the ORM may leave the optional last name NULL.
+        rows = [("Cher", None), ("Cher", "Lloyd"), ("Alan", "Tudyk"), ("Alan", None), ("Zendaya", None)]
+        self.repository._session_cm.session.execute(orm.actor.insert(), [
+            {'actor_id': actor_id, 'firstname': first, 'lastname': last}
+            for actor_id, (first, last) in enumerate(rows)])
+        names, cursor = [], None
+        while True:
+            actors, cursor = self.repository.get_actors_page(limit=1, cursor=cursor)
+            names += [actor.actor_full_name for actor in actors]
+            if cursor is None:
+                break
+        assert names == ["Alan", "Alan Tudyk", "Cher", "Cher Lloyd", "Zendaya"]
+
+
+    def test_review_ratings_are_kept_per_movie(self):
+        old, new = self.movie("Dune", 1984, ["Sci-Fi"]), self.movie("Dune", 2021, ["Sci-Fi"])
+        self.repository.add_movie(old)
+        self.repository.add_movie(new)
+        self.repository.add_review(Review(old, "Baffling", 3))
+        self.repository.add_review(Review(new, "Vast", 9))
+        self.repository.reset_session()
+        ranked = self.repository.get_top_movies('review_rating', 2)
+        assert [movie.movie_id for movie in ranked] == ["Dune2021", "Dune1984"]
+        assert self.repository.get_review("Vast").movie.movie_id == "Dune2021"
+
+
+class TestRepopulate:
+
+    def test_stale_schema_is_recreated(self):
+        engine = create_engine('sqlite://')
+        data_path = os.path.join('appl', 'datafiles')
+        # A movie table from before the metascore column, with the fingerprint that schema had.
+        engine.execute("CREATE TABLE movie (movie_id VARCHAR PRIMARY KEY, movie_title VARCHAR NOT NULL)")
+        orm.catalog_metadata.create(engine)
+        write_catalog_fingerprint(engine, {'schema_fingerprint': 'old', 'source_fingerprint': 'old'})
+        fingerprint = catalog_fingerprint(data_path, 'Data10Movies.csv')
+        stats = repopulate(engine, data_path, fingerprint, 'Data10Movies.csv')
+        assert stats['movies'] == 21 and database_is_current(engine, fingerprint)
+        assert engine.execute(select([func.count(orm.movie.c.metascore)])).scalar() > 0
+
@@ -1,4 +1,11 @@
 import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from werkzeug.security import generate_password_hash
 
 from appl.adaptors.repository import AbstractRepository
 from appl.domainmodel.actor import Actor
@@ -8,6 +15,17 @@ from appl.domainmodel.review import Review
 from appl.domainmodel.movie import Movie
 from appl.domainmodel.user import User
 from appl.domainmodel.watchlist import Watchlist
+from appl.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from appl.datafilereaders.entity_registry import EntityRegistry, normalize_name
+from appl.datafilereaders.parallel_movie_file_csv_reader import ParallelMovieFileCSVReader
+from appl.adaptors.search_index import MovieSearchIndex
+from appl.adaptors.posting_index import MoviePostingIndex, build_posting_index
+from appl.adaptors.range_index import MovieRangeIndex, SortedIndex
+from appl.adaptors.top_movies import TopMoviesCache, top_k, top_key
+from appl.adaptors.costar_graph import CoStarGraph, build_costar_graph
+from appl.adaptors.catalog_versions import CatalogVersions, CatalogVersion
+from appl.adaptors.catalog_statistics import CatalogStatistics, build_catalog_statistics
+from appl.adaptors.catalog_snapshot import source_checksum, load_snapshot, write_snapshot
 
 
 class MemoryRepository(AbstractRepository):
@@ -15,52 +33,283 @@ class MemoryRepository(AbstractRepository):
     def __init__(self):
         self.__dataset_of_users = list()
         self.__dataset_of_movies = list()
-        self.__dataset_of_directors = set()
-        self.__dataset_of_actors = set()
-        self.__dataset_of_genres = set()
         self.__dataset_of_reviews = list()
         self.__dataset_of_watchlists = list()
         self.__ranklist = list()
+        self.__entity_registry = EntityRegistry()
+        self.__catalog_store = None
+        self.__search_index = None
+        self.__posting_index = MoviePostingIndex()
+        self.__range_indexes = dict()
+        self.__top_movies = TopMoviesCache()
+        self.__costar_graph = None
+        # Pages are read from catalog versions; movies in any range field's order, the others in name order.
+        self.__versions = CatalogVersions(orderings={
+            'movies': MovieRangeIndex, 'actors': name_ordering(lambda actor: actor.actor_full_name),
+            'directors': name_ordering(lambda director: director.director_full_name),
+            'genres': name_ordering(lambda genre: genre.genre_name)})
+        self.__statistics = CatalogStatistics()
+        # movie id -> [sum, count] of the review ratings, for the review_rating metric.
+        self.__review_ratings = dict()
+        # Primary indexes on normalized keys. Directors, actors and genres live only in their index, which also
+        # provides the de-duplication their sets used to.
+        self.__users_by_username = dict()
+        self.__movies_by_id = dict()
+        self.__directors_by_name = dict()
+        self.__actors_by_name = dict()
+        self.__genres_by_name = dict()
+        self.__reviews_by_text = dict()
+
+    @property
+    def entity_registry(self):
+        return self.__entity_registry
+
+    def snapshot(self) -> CatalogVersion:
+        """Returns the latest published catalog version; it never changes, whatever is added or reloaded later"""
+        return self.__versions.pin()
+
+    def pinned_snapshot(self):
+        return self.__versions.pinned()
+
+    def bulk_update(self):
+        """Context manager publishing every write made inside it as a single new catalog version"""
+        return self.__versions.bulk_update()
+
+    @property
+    def catalog_versions(self) -> CatalogVersions:
+        return self.__versions
 
     def add_user(self, user: User):
         self.__dataset_of_users.append(user)
+        self.__users_by_username.setdefault(username_key(user.username), user)
 
     def get_user(self, username) -> User:
-        return next((user for user in self.__dataset_of_users if user.username == username), None)
+        return self.__users_by_username.get(username_key(username))
 
     def add_movie(self, movie: Movie):
         self.__dataset_of_movies.append(movie)
+        self.__movies_by_id.setdefault(movie.movie_id, movie)
+        self.__versions.append('movies', movie)
+        self.__statistics.add_movie(movie)
+        self.__posting_index.add_movie(movie)
+        for range_index in self.__range_indexes.values():
+            range_index.add_movie(movie)
+        self.__top_movies.offer(movie, self.metric_value)
+        if movie.actors:
+            # The compact graph cannot grow in place; it is rebuilt on the next co-star query.
+            self.__costar_graph = None
+        if self.__catalog_store is not None:
+            self.__catalog_store.add_movie(movie)
+        if self.__search_index is not None:
+            self.__search_index.add_movie(movie)
+
+    def apply_movie_changes(self, inserted: list, updated: list, deleted_ids: list):
+        # The new movie list is built on the side and swapped in with a single assignment, so readers iterating
+        # the previous list carry on undisturbed while a reload runs.
+        replaced = {movie.movie_id: movie for movie in updated}
+        removed = set(deleted_ids)
+        movies = [replaced.get(movie.movie_id, movie) for movie in self.__dataset_of_movies
+                  if movie.movie_id not in removed]
+        movies.extend(inserted)
+        self.__costar_graph = None
+        if replaced or removed:
+            # Updated or deleted movies may leave actors, directors or genres unreferenced, so those indexes are
+            # rebuilt from the new movie list rather than patched.
+            actors, directors, genres = dict(), dict(), dict()
+            for movie in movies:
+                index_entities(movie, actors, directors, genres)
+            self.__movies_by_id = {movie.movie_id: movie for movie in reversed(movies)}
+            # Ratings of deleted movies would otherwise pile up over reloads and return if an id is reused.
+            for movie_id in removed:
+                self.__review_ratings.pop(movie_id, None)
+            self.__dataset_of_movies = movies
+            self.__actors_by_name, self.__directors_by_name, self.__genres_by_name = actors, directors, genres
+            self.__versions.replace(movies=movies, actors=actors.values(), directors=directors.values(),
+                                    genres=genres.values())
+            self.__catalog_store = None
+            self.__posting_index = build_posting_index(movies)
+            self.__range_indexes = dict()
+            self.__statistics = build_catalog_statistics(movies, self.__dataset_of_reviews)
+            self.__top_movies.clear()
+            if self.__search_index is not None:
+                for movie_id in removed:
+                    self.__search_index.remove_movie(movie_id)
+                for movie in updated + inserted:
+                    self.__search_index.add_movie(movie)
+        else:
+            with self.__versions.bulk_update():
+                for movie in inserted:
+                    for actor in movie.actors or []:
+                        self.add_actor(actor)
+                    for genre in movie.genres or []:
+                        self.add_genre(genre)
+                    if movie.get_director() is not None:
+                        self.add_director(movie.get_director())
+                    self.__movies_by_id.setdefault(movie.movie_id, movie)
+                    self.__versions.append('movies', movie)
+                    self.__statistics.add_movie(movie)
+                    self.__posting_index.add_movie(movie)
+                    for range_index in self.__range_indexes.values():
+                        range_index.add_movie(movie)
+                    self.__top_movies.offer(movie, self.metric_value)
+                    if self.__catalog_store is not None:
+                        self.__catalog_store.add_movie(movie)
+                    if self.__search_index is not None:
+                        self.__search_index.add_movie(movie)
+            self.__dataset_of_movies = movies
 
     def get_movie(self, movie) -> Movie:
-        return next((movie for movie in self.__dataset_of_movies if movie.movie_name == movie), None)
+        """Looks a movie up by its id (title followed by release year) or by an equal Movie"""
+        if isinstance(movie, Movie):
+            movie = movie.movie_id
+        return self.__movies_by_id.get(movie)
+
+    def search_movies(self, query: str, page: int = 1, page_size: int = 10) -> dict:
+        # The index is built on the first search, so loading the catalog does not pay for tokenizing every
+        # description. From then on add_movie keeps it up to date.
+        if self.__search_index is None:
+            search_index = MovieSearchIndex()
+            for movie in self.__dataset_of_movies:
+                search_index.add_movie(movie)
+            self.__search_index = search_index
+        return self.__search_index.search(query, page, page_size)
+
+    def find_movies(self, genre=None, director=None, actor=None, year=None) -> list:
+        """Returns the movies matching every given facet; a facet given a list matches any of its values"""
+        return self.__posting_index.find(genre=genre, director=director, actor=actor, year=year)
+
+    def get_movies_between(self, field: str, lo=None, hi=None, after_key=None, limit: int = None,
+                           descending: bool = False) -> tuple:
+        # Each field's index is sorted once on its first query; movies added afterwards are merged in by the next
+        # query (see SortedIndex), so bulk loading never pays for inserting into a sorted list.
+        range_index = self.__range_indexes.get(field)
+        if range_index is None:
+            range_index = self.__range_indexes[field] = MovieRangeIndex(field, self.__dataset_of_movies)
+        return range_index.between(lo, hi, after_key, limit, descending)
+
+    # Each page is read from the latest published catalog version (see CatalogVersion); render several lists
+    # from one pinned_snapshot() to keep them consistent with each other.
+    def get_movies_page(self, limit: int = 20, cursor: str = None, order_by: str = 'title',
+                        descending: bool = False) -> tuple:
+        return self.__versions.current.get_movies_page(limit, cursor, order_by, descending)
+
+    def get_actors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__versions.current.get_actors_page(limit, cursor, descending)
+
+    def get_directors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__versions.current.get_directors_page(limit, cursor, descending)
+
+    def get_genres_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__versions.current.get_genres_page(limit, cursor, descending)
+
+    def get_reviews_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__versions.current.get_reviews_page(limit, cursor, descending)
+
+    def get_watchlists_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        return self.__versions.current.get_watchlists_page(limit, cursor, descending)
+
+    def get_top_movies(self, metric: str, k: int = 10, genre=None, year_from=None, year_to=None) -> list:
+        """Returns the k movies with the highest metric, best first, e.g. get_top_movies('rating', 20, 'Drama')"""
+        key = top_key(metric, genre, year_from, year_to)
+        ranked = self.__top_movies.get(key, k)
+        if ranked is None:
+            ranked = top_k(self.top_candidates(genre, year_from, year_to), k,
+                           lambda movie: self.metric_value(metric, movie))
+            self.__top_movies.put(key, k, ranked)
+        return [movie for value, movie in ranked]
+
+    def top_candidates(self, genre=None, year_from=None, year_to=None):
+        if genre is None and year_from is None and year_to is None:
+            return self.__dataset_of_movies
+        years = None
+        if year_from is not None or year_to is not None:
+            years = [year for year in self.__posting_index.values('year')
+                     if (year_from is None or year >= year_from) and (year_to is None or year <= year_to)]
+        return self.__posting_index.find(genre=genre, year=years)
+
+    def metric_value(self, metric: str, movie: Movie):
+        if metric == 'review_rating':
+            total = self.__review_ratings.get(movie.movie_id)
+            return None if total is None else total[0] / total[1]
+        return getattr(movie, metric)
+
+    def get_costar_graph(self) -> CoStarGraph:
+        if self.__costar_graph is None:
+            self.__costar_graph = build_costar_graph(self.__dataset_of_movies)
+        return self.__costar_graph
+
+    def actors_worked_together(self, actor, colleague) -> bool:
+        if isinstance(actor, Actor):
+            actor = actor.actor_full_name
+        if isinstance(colleague, Actor):
+            colleague = colleague.actor_full_name
+        return self.get_costar_graph().worked_with(actor, colleague)
+
+    def get_collaboration_path(self, actor, colleague, max_depth: int = None) -> list:
+        """Returns the actors on a shortest chain of co-stars linking the two, both included, or None"""
+        if isinstance(actor, Actor):
+            actor = actor.actor_full_name
+        if isinstance(colleague, Actor):
+            colleague = colleague.actor_full_name
+        path = self.get_costar_graph().shortest_path(actor, colleague, max_depth)
+        return None if path is None else [self.get_actor(name) for name in path]
 
     def add_director(self, director: Director):
-        self.__dataset_of_directors.add(director)
+        key = name_key(director.director_full_name)
+        if key not in self.__directors_by_name:
+            self.__directors_by_name[key] = director
+            self.__versions.append('directors', director)
 
     def get_director(self, director) -> Director:
-        return next((director for director in self.__dataset_of_directors if director.director_full_name == director),
-                    None)
+        if isinstance(director, Director):
+            director = director.director_full_name
+        return self.__directors_by_name.get(name_key(director))
 
     def add_actor(self, actor: Actor):
-        self.__dataset_of_actors.add(actor)
+        key = name_key(actor.actor_full_name)
+        if key not in self.__actors_by_name:
+            self.__actors_by_name[key] = actor
+            self.__versions.append('actors', actor)
 
     def get_actor(self, actor) -> Actor:
-        return next((actor for actor in self.__dataset_of_actors if actor.actor_namec == actor), None)
+        if isinstance(actor, Actor):
+            actor = actor.actor_full_name
+        return self.__actors_by_name.get(name_key(actor))
 
     def add_genre(self, genre: Genre):
-        self.__dataset_of_genres.add(genre)
+        key = name_key(genre.genre_name)
+        if key not in self.__genres_by_name:
+            self.__genres_by_name[key] = genre
+            self.__versions.append('genres', genre)
 
     def get_genre(self, genre) -> Genre:
-        return next((genre for genre in self.__dataset_of_genres if genre.genre_name == genre), None)
+        if isinstance(genre, Genre):
+            genre = genre.genre_name
+        return self.__genres_by_name.get(name_key(genre))
 
     def add_review(self, review: Review):
         self.__dataset_of_reviews.append(review)
+        self.__reviews_by_text.setdefault(review.review_text, review)
+        self.__versions.append('reviews', review)
+        self.__statistics.add_review(review)
+        if review.rating is not None and review.movie is not None:
+            movie = self.__movies_by_id.get(review.movie.movie_id, review.movie)
+            total = self.__review_ratings.setdefault(movie.movie_id, [0, 0])
+            total[0] += review.rating
+            total[1] += 1
+            # The new review can lower the average, so cached lists holding the movie are recomputed; elsewhere
+            # it can only enter.
+            self.__top_movies.discard_containing(movie, 'review_rating')
+            self.__top_movies.offer(movie, self.metric_value, 'review_rating')
 
     def get_review(self, review) -> Review:
-        return next((review for review in self.__dataset_of_reviews if review.review_text == review), None)
+        if isinstance(review, Review):
+            review = review.review_text
+        return self.__reviews_by_text.get(review)
 
     def add_watchlist(self, watchlist: Watchlist):
         self.__dataset_of_watchlists.append(watchlist)
+        self.__versions.append('watchlists', watchlist)
 
     def get_watchlist(self, watchlist) -> list:
         return self.__dataset_of_watchlists
@@ -69,13 +318,13 @@ class MemoryRepository(AbstractRepository):
         return len(self.__dataset_of_movies)
 
     def get_number_of_directors(self):
-        return len(self.__dataset_of_directors)
+        return len(self.__directors_by_name)
 
     def get_number_of_actors(self):
-        return len(self.__dataset_of_movies)
+        return len(self.__actors_by_name)
 
     def get_number_of_genres(self):
-        return len(self.__dataset_of_genres)
+        return len(self.__genres_by_name)
 
     def get_number_of_reviews(self):
         return len(self.__dataset_of_reviews)
@@ -86,14 +335,24 @@ class MemoryRepository(AbstractRepository):
     def get_movies(self):
         return self.__dataset_of_movies
 
+    def get_statistics(self) -> CatalogStatistics:
+        return self.__statistics
+
+    def get_catalog_store(self):
+        # Built on first use and kept in step with add_movie afterwards. NumPy is only needed from this point on.
+        if self.__catalog_store is None:
+            from appl.adaptors.catalog_store import build_catalog_store
+            self.__catalog_store = build_catalog_store(self.__dataset_of_movies)
+        return self.__catalog_store
+
     def get_actors(self):
-        return self.__dataset_of_actors
+        return self.__actors_by_name.values()
 
     def get_directors(self):
-        return self.__dataset_of_directors
+        return self.__directors_by_name.values()
 
     def get_genres(self):
-        return self.__dataset_of_genres
+        return self.__genres_by_name.values()
 
     def get_reviews(self):
         return self.__dataset_of_reviews
@@ -102,62 +361,72 @@ class MemoryRepository(AbstractRepository):
         return self.__dataset_of_watchlists
 
 
-def read_and_load_movie_file(file_name: str, repo: MemoryRepository):
-    # noinspection SpellCheckingInspection
-    with open(file_name, mode='r', encoding='utf-8-sig') as movie_file:
-        movie_file_reader = csv.DictReader(movie_file)
-        index = 0
-        # noinspection DuplicatedCode
-        for row in movie_file_reader:
-            rank = row['Rank']
-            title = row['Title']
-            director = row['Director']
-            actor = row['Actors']
-            release_year = int(row['Year'])
-            genre = row['Genre']
-            description = row['Description']
-            runtime = int(row['Runtime (Minutes)'])
-            rating = row['Rating']
-            movie_object = Movie(title, release_year)
-            director_object = Director(director)
-            movie_object.description = description
-            movie_object.rank = rank
-            movie_object.director = director_object
-            movie_object.runtime_minutes = runtime
-            movie_object.title = title
-            movie_object.director = director
-            
+def username_key(username):
+    # User stores its username stripped and lower-cased, so lookups are normalized the same way.
+    return username.strip().lower() if isinstance(username, str) else username
 
 
+def name_key(name):
+    return normalize_name(name) if isinstance(name, str) else name
 
 
+def name_ordering(name):
+    # A CatalogVersions ordering factory sorting actors, directors or genres by their normalized name.
+    return lambda ordering, entities: SortedIndex(lambda entity: (name_key(name(entity)),), entities)
 
 
+def index_entities(movie: Movie, actors: dict, directors: dict, genres: dict):
+    for actor in movie.actors or []:
+        actors.setdefault(name_key(actor.actor_full_name), actor)
+    for genre in movie.genres or []:
+        genres.setdefault(name_key(genre.genre_name), genre)
+    if movie.get_director() is not None:
+        directors.setdefault(name_key(movie.get_director().director_full_name), movie.get_director())
 
 
-            genre_list = genre.split(",")
-            genre_list = [Genre(item.strip()) for item in genre_list]
+def read_and_load_movie_file(file_name: str, repo: MemoryRepository, workers: int = None):
+    # Movies are streamed from the reader one at a time, so the whole file is never held in memory at once.
+    # With more than one worker the csv parsing is sharded across a process pool.
+    if workers is not None and workers > 1:
+        movie_file_reader = ParallelMovieFileCSVReader(file_name, repo.entity_registry, workers)
+    else:
+        movie_file_reader = MovieFileCSVReader(file_name, repo.entity_registry)
+    load_movies(movie_file_reader.iter_movies(), repo)
 
-            for item in genre_list:
-                movie_object.add_genre(item)
-                repo.add_genre(item)
 
-            actor_list = actor.split(",")
-            actor_list = [Actor(item.strip()) for item in actor_list]
-
-            for actor in actor_list:
-                movie_object.add_actor(actor)
+def load_movies(movies, repo: MemoryRepository):
+    # The whole file is published to readers as one catalog version.
+    with repo.bulk_update():
+        for movie_object in movies:
+            for genre in movie_object.genres:
+                repo.add_genre(genre)
 
+            for actor in movie_object.actors:
                 repo.add_actor(actor)
 
-
             repo.add_movie(movie_object)
-
-
-            repo.add_director(director_object)
-
-
-            index += 1
+            repo.add_director(movie_object.get_director())
+    # The co-star graph is built once the whole catalog is in, rather than grown movie by movie.
+    repo.get_costar_graph()
+
+
+def read_and_load_movie_snapshot(file_name: str, repo: MemoryRepository, snapshot_path: str = None):
+    # Boots from the binary snapshot next to the csv file when it was built from the same csv contents; otherwise
+    # parses the csv as usual and (re)writes the snapshot for the next start.
+    if snapshot_path is None:
+        snapshot_path = os.path.splitext(file_name)[0] + '.snapshot'
+    checksum = source_checksum(file_name)
+    snapshot = load_snapshot(snapshot_path, checksum)
+    if snapshot is not None:
+        with snapshot:
+            load_movies(snapshot.iter_movies(repo.entity_registry), repo)
+    else:
+        read_and_load_movie_file(file_name, repo)
+        try:
+            write_snapshot(snapshot_path, repo.get_movies(), checksum)
+        except OSError:
+            # A read-only data directory, say; this start already has the movies and the next one parses again.
+            pass
 
 
 def read_and_load_user_file(file_name: str, repo: MemoryRepository):
@@ -179,3 +448,80 @@ def read_and_load_user_file(file_name: str, repo: MemoryRepository):
             user_list.append(user_object)
             repo.add_user(user_object)
     return user_list
+
+
+def hash_passwords(passwords: list) -> list:
+    return [generate_password_hash(password, method='pbkdf2:sha256', salt_length=16) for password in passwords]
+
+
+def bulk_import_users(file_name: str, repo: AbstractRepository, workers: int = None, chunk_size: int = 500):
+    """Streams users from the csv into the repository, hashing plain passwords on a process pool
+
+    Rows with a 'Password Hash' column are taken as already hashed and skip hashing entirely. Usernames already
+    imported, or already in the repository, are skipped. Returns counts and users per second.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    stats = {"imported": 0, "duplicates": 0, "hashed": 0, "prehashed": 0}
+    started = time.perf_counter()
+    seen_usernames = set()
+
+    def unique_rows(rows):
+        for row in rows:
+            # Same normalisation as User, so "Admin " and "admin" collide.
+            username = row['Username'].strip().lower()
+            if username in seen_usernames or repo.get_user(username) is not None:
+                stats["duplicates"] += 1
+                continue
+            seen_usernames.add(username)
+            yield row
+
+    def add_chunk(chunk, hashes):
+        hashes = iter(hashes)
+        for row in chunk:
+            password_hash = row.get('Password Hash')
+            if password_hash:
+                stats["prehashed"] += 1
+            else:
+                password_hash = next(hashes)
+                stats["hashed"] += 1
+            repo.add_user(User(row['Username'], password_hash, row['User ID'], row['First Name'], row['Last Name'],
+                               int(row['Age']), row['Email'], bool(row['Consent']), password_is_hashed=True))
+            stats["imported"] += 1
+
+    with open(file_name, mode='r', encoding='utf-8-sig') as users_file:
+        rows = unique_rows(csv.DictReader(users_file))
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+        if workers <= 1:
+            for chunk in chunks:
+                add_chunk(chunk, hash_passwords([row['Password'] for row in chunk if not row.get('Password Hash')]))
+        else:
+            # A bounded number of chunks are in flight, so hashing overlaps with reading without buffering the file.
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = deque()
+                for chunk in chunks:
+                    plain_passwords = [row['Password'] for row in chunk if not row.get('Password Hash')]
+                    in_flight.append((chunk, executor.submit(hash_passwords, plain_passwords)))
+                    if len(in_flight) >= workers * 2:
+                        chunk, future = in_flight.popleft()
+                        add_chunk(chunk, future.result())
+                while in_flight:
+                    chunk, future = in_flight.popleft()
+                    add_chunk(chunk, future.result())
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["users_per_second"] = stats["imported"] / stats["seconds"] if stats["seconds"] > 0 else float('inf')
+    return stats
+
+
+class TestMemoryRepository:
+
+    def test_deleted_movies_drop_their_review_ratings(self):
+        repo = MemoryRepository()
+        moana = Movie("Moana", 2016)
+        repo.add_movie(moana)
+        repo.add_review(Review(moana, "Sails beyond the reef", 9))
+        assert repo.metric_value('review_rating', moana) == 9
+        repo.apply_movie_changes([], [], [moana.movie_id])
+        repo.apply_movie_changes([Movie("Moana", 2016)], [], [])
+        assert repo.metric_value('review_rating', moana) is None
@@ -1,8 +1,9 @@
 from sqlalchemy import (
-    Table, MetaData, Column, Integer, String, Date, DateTime, Boolean,
-    ForeignKey
+    Table, MetaData, Column, Integer, String, Date, DateTime, Boolean, Float,
+    ForeignKey, event
 )
-from sqlalchemy.orm import mapper, relationship
+from sqlalchemy.orm import mapper, relationship, foreign
+from sqlalchemy.orm.attributes import manager_of_class
 from lazy import *
 
 metadata = MetaData()
@@ -13,6 +14,7 @@ from appl.domainmodel.director import Director
 from appl.domainmodel.genre import Genre
 from appl.domainmodel.review import Review
 from appl.domainmodel.movie import Movie
+from appl.domainmodel.ordered_set import OrderedSet
 from appl.domainmodel.user import User
 from appl.domainmodel.watchlist import Watchlist
 
@@ -45,7 +47,7 @@ director = Table("director", metadata,
 
 genre = Table("genre", metadata,
               Column('genre_id', Integer, primary_key=True, autoincrement=True, nullable=False),
-              Column('genre_name', String, primary_key=True, nullable=False)
+              Column('genre_name', String, unique=True, nullable=False)
               )
 
 movie = Table("movie", metadata,
@@ -53,10 +55,28 @@ movie = Table("movie", metadata,
               Column('movie_title', String, unique=False, nullable=False),
               Column('release_year', Integer, unique=False, nullable=False),
               Column('runtime', Integer, unique=False, nullable=False),
-              Column("cast_id", Integer, unique=True, nullable=False),
-              Column("director_id", Integer, ForeignKey('director.director_id'))
+              # Numbered by database_repository.populate; a movie saved through the ORM leaves it empty.
+              Column("cast_id", Integer, unique=True, nullable=True),
+              Column("director_id", Integer, ForeignKey('director.director_id')),
+              Column('description', String, nullable=True),
+              Column('rank', Integer, nullable=True),
+              Column('rating', Float, nullable=True),
+              Column('votes', Integer, nullable=True),
+              Column('revenue_millions', Float, nullable=True),
+              Column('metascore', Integer, nullable=True)
               )
 
+movie_actor = Table("movie_actor", metadata,
+                    Column('movie_id', String, ForeignKey('movie.movie_id'), primary_key=True),
+                    Column('actor_id', Integer, ForeignKey('actor.actor_id'), primary_key=True),
+                    Column('billing', Integer, nullable=False)
+                    )
+
+movie_genre = Table("movie_genre", metadata,
+                    Column('movie_id', String, ForeignKey('movie.movie_id'), primary_key=True),
+                    Column('genre_id', Integer, ForeignKey('genre.genre_id'), primary_key=True)
+                    )
+
 #   Composite primary key with the two IDs
 # movie_cast = Table("movie_cast", metadata,
 #                    Column('cast_id', String, primary_key=True, nullable=False),
@@ -91,6 +111,8 @@ review = Table("review", metadata,
                Column('rating', Integer),
                Column('timestamp', DateTime),
                Column('movie_title', String),
+               # The title alone is shared by remakes; the id tells them apart (see store_review_movie_id).
+               Column('movie_id', String, ForeignKey('movie.movie_id'), nullable=True),
                Column('user_id', Integer, ForeignKey('user.user_id'))
                )
 
@@ -121,60 +143,212 @@ watchlist = Table("watchlist", metadata,
                    Column('user_id', Integer, ForeignKey('user.user_id')),
                    )
 
+# Key/value rows describing what the database was populated from; see database_repository.catalog_fingerprint.
+catalog_metadata = Table("catalog_metadata", metadata,
+                         Column('key', String, primary_key=True, nullable=False),
+                         Column('value', String, nullable=False)
+                         )
+
+
+class MappedActor(Actor):
+    pass
+
+
+class MappedDirector(Director):
+    pass
+
+
+class MappedGenre(Genre):
+    pass
+
+
+class MappedMovie(Movie):
+    pass
+
+
+class MappedReview(Review):
+    pass
+
+
+class MappedUser(User):
+    pass
+
+
+class MappedWatchlist(Watchlist):
+    pass
+
+
+class MappedOrderedSet(OrderedSet):
+    # Instrumented by the ORM as a set, so add, remove and discard are what it tracks. Like the mapped entities it
+    # gets a __dict__, where the ORM keeps the collection's adapter.
+    __emulates__ = set
+
+
+# The domain classes keep their attributes in __slots__ and have no instance __dict__, which is where the ORM keeps
+# its state. The tables are mapped to these subclasses instead; declaring no slots of their own, they get a __dict__
+# back and keep every property and method of the domain class, so a loaded row is still e.g. a Movie.
+MAPPED_CLASSES = {Actor: MappedActor, Director: MappedDirector, Genre: MappedGenre, Movie: MappedMovie,
+                  Review: MappedReview, User: MappedUser, Watchlist: MappedWatchlist}
+
+
+def slot_attribute_names(cls) -> list:
+    """Returns the attributes the slots of cls and its bases hold, with private names mangled as on an instance"""
+    names = []
+    for klass in cls.__mro__:
+        for name in klass.__dict__.get('__slots__', ()):
+            names.append(f"_{klass.__name__.lstrip('_')}{name}" if name.startswith('__') else name)
+    return names
+
+
+def mapped(entity, memo: dict = None):
+    """Returns a mapped copy of a domain entity to hand to a session, copying the entities and lists it refers to
+
+    Mapped instances and anything that is not an entity are returned as they are. An entity reached twice (an
+    actor in two movies, say) is copied once, so the session sees a single instance for it.
+    """
+    memo = dict() if memo is None else memo
+    if isinstance(entity, list):
+        return [mapped(item, memo) for item in entity]
+    if isinstance(entity, OrderedSet):
+        return MappedOrderedSet(mapped(item, memo) for item in entity)
+    mapped_class = MAPPED_CLASSES.get(type(entity))
+    if mapped_class is None:
+        return entity
+    if id(entity) not in memo:
+        manager = manager_of_class(mapped_class)
+        # new_instance gives the copy its ORM state without running __init__ again.
+        copy = memo[id(entity)] = manager.new_instance()
+        for name in slot_attribute_names(type(entity)):
+            if not hasattr(entity, name):
+                continue
+            value = getattr(entity, name)
+            if value is None and name in manager and manager[name].impl.collection:
+                # The domain classes use None for "no actors yet"; a mapped collection has to stay a list.
+                continue
+            setattr(copy, name, mapped(value, memo))
+    return memo[id(entity)]
+
+
+def full_name(firstname, middlenames, lastname) -> str:
+    """Rebuilds a full name from the parts Actor and Director split it into, for people loaded from the database"""
+    # Past two words, middlenames runs from the second word to the end of the name; a single name is stored as both
+    # first and last name.
+    if middlenames:
+        return f"{firstname} {middlenames}"
+    if lastname is None or lastname == firstname:
+        return firstname
+    return f"{firstname} {lastname}"
+
+
+def restore_actor(actor, context):
+    if actor.lastname is None:
+        # A single name, from a row written outside the ORM.
+        actor._Actor__lastname = actor.firstname
+    actor._Actor__actor_full_name = full_name(actor.firstname, getattr(actor, '_Actor__middlenames', None),
+                                              actor.lastname)
+    actor._Actor__colleagues = None
+    actor.update_keys()
+
+
+def restore_director(director, context):
+    # Only the first and last name are stored, so a director's middle names do not survive the round trip.
+    director._Director__director_full_name = full_name(director.firstname, None, director.lastname)
+    if director.lastname is None:
+        director._Director__lastname = director.firstname
+    director._Director__director_url = director.director_full_name.replace(" ", "_")
+    director.update_keys()
+
+
+def store_review_movie_id(mapper, connection, review):
+    movie = getattr(review, '_Review__movie', None)
+    review.movie_id = None if movie is None else movie.movie_id
+
+
+def restore_watchlist(watchlist, context):
+    # Only the id is stored, so a loaded watchlist starts out empty.
+    Watchlist.__init__(watchlist, watchlist.watchlist_id)
+
 
 def map_model_to_tables():
-    mapper(Actor, actor, properties={
-        '_Actor__actor_id': actor.column.actor_id,
-        '_Actor__firstname': actor.column.firstname,
-        '_Actor__middlenames': actor.column.middlename,
-        '_Actor__lastname': actor.column.lastname
+    mapper(MappedActor, actor, properties={
+        '_Actor__actor_id': actor.c.actor_id,
+        '_Actor__firstname': actor.c.firstname,
+        '_Actor__middlenames': actor.c.middlenames,
+        '_Actor__lastname': actor.c.lastname
     })
 
-    mapper(Director, director, properties={
-        '_Director__director_id': director.column.director_id,
-        '_Director__director_firstname': director.column.firstname,
-        '_Director__director_lastname': director.column.lastname
+    mapper(MappedDirector, director, properties={
+        '_Director__director_id': director.c.director_id,
+        '_Director__firstname': director.c.firstname,
+        '_Director__lastname': director.c.lastname
     })
 
-    mapper(Movie, movie, properties={
-        '_Movie__id': movie.column.movie_id,
-        '_Movie__title': movie.column.movie_title,
-        '_Movie__release_year': movie.column.release_year,
-        '_Movie__runtime_minutes': movie.column.runtime,
-        '_Movie__description': movie.column.description,
-        '_Movie__director': relationship(Director, backref='_movie', lazy='select'),
-        '_Movie__rank': movie.column.rank,
-        '_Movie__genres': relationship(Genre, backref='_movie', lazy='select')
+    mapper(MappedMovie, movie, properties={
+        '_Movie__id': movie.c.movie_id,
+        '_Movie__title': movie.c.movie_title,
+        '_Movie__release_year': movie.c.release_year,
+        '_Movie__runtime_minutes': movie.c.runtime,
+        '_Movie__description': movie.c.description,
+        # No backref: saving a movie points it at the director already stored (see
+        # database_repository.with_stored_rows), and a backref would pull the unsaved copy into the session.
+        '_Movie__director': relationship(MappedDirector, lazy='select'),
+        '_Movie__rank': movie.c.rank,
+        '_Movie__rating': movie.c.rating,
+        '_Movie__votes': movie.c.votes,
+        '_Movie__revenue_millions': movie.c.revenue_millions,
+        '_Movie__metascore': movie.c.metascore,
+        # The ORM cannot fill in movie_actor.billing, so the repository writes both association tables itself (see
+        # database_repository.save_movie) and these only read them.
+        '_Movie__genres': relationship(MappedGenre, secondary=movie_genre, lazy='select', viewonly=True,
+                                       collection_class=MappedOrderedSet),
+        '_Movie__actors': relationship(MappedActor, secondary=movie_actor, lazy='select', viewonly=True,
+                                       order_by=movie_actor.c.billing, collection_class=MappedOrderedSet)
     })
 
-    mapper(Review, review, properties={
-        '_Review__review_id': review.column.review_id,
-        '_Review__review_text': review.column.review_text,
-        '_Review__rating': review.column.rating,
-        '_Review__movie_title': relationship(Movie, backref='_review', lazy='select'),
-        '_Review__timestamp': review.column.timestamp,
-
+    mapper(MappedReview, review, properties={
+        '_Review__review_id': review.c.review_id,
+        '_Review__review_text': review.c.review_text,
+        '_Review__rating': review.c.rating,
+        '_Review__timestamp': review.c.timestamp,
+        '_Review__movie_title': review.c.movie_title,
+        'movie_id': review.c.movie_id,
+        # The movie is looked up but never written through the review, which would add a copy of it to the session;
+        # store_review_movie_id fills in the id instead.
+        '_Review__movie': relationship(MappedMovie, primaryjoin=foreign(review.c.movie_id) == movie.c.movie_id,
+                                       uselist=False, viewonly=True, cascade='', lazy='select'),
     })
 
-    mapper(Genre, genre, properties={
-        '_Genre__genre_id': genre.column.genre_id,
-        '_Genre__genre_name': genre.column.genre_name
+    mapper(MappedGenre, genre, properties={
+        '_Genre__genre_id': genre.c.genre_id,
+        '_Genre__genre_name': genre.c.genre_name
+    })
 
+    mapper(MappedWatchlist, watchlist, properties={
+        '_Watchlist__watchlist_id': watchlist.c.watch_list_id
     })
 
-    mapper(User, user, properties={
-        '_User__username': user.column.username,
-        '_User__password': user.column.password,
-        '_User__watchlist': relationship(Watchlist, backref='_user'),
-        '_User__reviews': relationship(Review, backref='_user'),
-        '_User__user_id': user.column.user_id,
-        '_User__user_first_name': user.column.firstname,
-        '_User__user_last_name': user.column.lastname,
-        '_User__user_age': user.column.age,
-        '_User__user_email': user.column.email,
-        '_User__user_consent': user.column.consent
+    # The user table has no age column, so a user's age is not stored.
+    mapper(MappedUser, user, properties={
+        '_User__username': user.c.name,
+        '_User__password': user.c.password,
+        '_User__watchlist': relationship(MappedWatchlist, backref='_user'),
+        '_User__reviews': relationship(MappedReview, backref='_user'),
+        '_User__user_id': user.c.user_id,
+        '_User__user_first_name': user.c.firstname,
+        '_User__user_last_name': user.c.lastname,
+        '_User__user_email': user.c.email,
+        '_User__user_consent': user.c.consent
     })
 
+    # A loaded row never runs __init__, so the keys Movie and Genre cache there are computed as each row loads, and
+    # the attributes that are not stored are rebuilt from the ones that are.
+    for mapped_class in (MappedMovie, MappedGenre):
+        event.listen(mapped_class, 'load', lambda entity, context: entity.update_keys())
+    event.listen(MappedActor, 'load', restore_actor)
+    event.listen(MappedDirector, 'load', restore_director)
+    event.listen(MappedWatchlist, 'load', restore_watchlist)
+    event.listen(MappedReview, 'before_insert', store_review_movie_id)
+
     # mapper(Director, movie_director, properties={
     #     '_Director__director_id': relationship(Director, backref='__director_id', lazy='select'),
     #     '_Movie__movie_id': relationship(Movie, backref='__movie_id', lazy='select'),
@@ -0,0 +1,127 @@
+from bisect import bisect_left
+from heapq import merge
+
+from appl.domainmodel.movie import Movie
+from appl.datafilereaders.entity_registry import normalize_name
+
+FACETS = ('genre', 'director', 'actor', 'year')
+
+
+def gallop(postings: list, target: int, low: int) -> int:
+    # Doubles the step from low until it passes target, then bisects the last step, so a skip costs O(log d) in the
+    # distance d jumped rather than O(log n) in the length of the list.
+    step = 1
+    high = low
+    while high < len(postings) and postings[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(postings, target, low, min(high, len(postings)))
+
+
+def intersect_postings(posting_lists) -> list:
+    """Returns the ids in every list; each list must be sorted"""
+    posting_lists = sorted(posting_lists, key=len)
+    if not posting_lists:
+        return []
+    result = posting_lists[0]
+    for postings in posting_lists[1:]:
+        if not result:
+            break
+        # Walk the shorter list and gallop through the longer one, so the cost follows the smaller side.
+        matches = []
+        position = 0
+        for dense_id in result:
+            position = gallop(postings, dense_id, position)
+            if position == len(postings):
+                break
+            if postings[position] == dense_id:
+                matches.append(dense_id)
+        result = matches
+    return list(result)
+
+
+def union_postings(posting_lists) -> list:
+    """Returns the ids in any list, sorted and without repeats; each list must be sorted"""
+    posting_lists = [postings for postings in posting_lists if postings]
+    if len(posting_lists) == 1:
+        return list(posting_lists[0])
+    result = []
+    for dense_id in merge(*posting_lists):
+        if not result or result[-1] != dense_id:
+            result.append(dense_id)
+    return result
+
+
+class MoviePostingIndex:
+    """Sorted posting lists of dense movie ids per genre, director, actor and release year
+
+    Movies get dense ids in the order they are added, so appending keeps every posting list sorted without ever
+    re-sorting. Within a facet the requested values are unioned and across facets the results are intersected, so
+    find(genre='Drama', director='Ridley Scott') costs time in the length of the shorter list, not the catalog.
+    """
+
+    def __init__(self):
+        self.__movies = []
+        self.__postings = {facet: dict() for facet in FACETS}
+
+    def __len__(self):
+        return len(self.__movies)
+
+    def add_movie(self, movie: Movie) -> int:
+        dense_id = len(self.__movies)
+        self.__movies.append(movie)
+        for facet, key in movie_facet_keys(movie):
+            self.__postings[facet].setdefault(key, []).append(dense_id)
+        return dense_id
+
+    def postings(self, facet: str, value) -> list:
+        return self.__postings[facet].get(facet_key(facet, value), [])
+
+    def values(self, facet: str) -> dict:
+        """Returns {key: number of movies} for one facet, e.g. to show counts next to each genre"""
+        return {key: len(postings) for key, postings in self.__postings[facet].items()}
+
+    def find_ids(self, **facets) -> list:
+        posting_lists = []
+        for facet, values in facets.items():
+            if facet not in self.__postings:
+                raise ValueError(f"Unknown facet {facet!r}, expected one of {FACETS}")
+            if values is None:
+                continue
+            if isinstance(values, (str, int)):
+                values = [values]
+            posting_lists.append(union_postings(self.postings(facet, value) for value in values))
+        if not posting_lists:
+            return list(range(len(self.__movies)))
+        return intersect_postings(posting_lists)
+
+    def find(self, **facets) -> list:
+        return [self.__movies[dense_id] for dense_id in self.find_ids(**facets)]
+
+
+def facet_key(facet: str, value):
+    if facet == 'year':
+        return int(value)
+    return normalize_name(value) if isinstance(value, str) else value
+
+
+def movie_facet_keys(movie: Movie):
+    # A movie repeating a genre or actor is listed once, or the posting list would stop being strictly increasing.
+    keys = set()
+    for genre in movie.genres or []:
+        keys.add(('genre', facet_key('genre', genre.genre_name)))
+    for actor in movie.actors or []:
+        keys.add(('actor', facet_key('actor', actor.actor_full_name)))
+    if movie.get_director() is not None:
+        keys.add(('director', facet_key('director', movie.get_director().director_full_name)))
+    if movie.release_year is not None:
+        keys.add(('year', movie.release_year))
+    return keys
+
+
+def build_posting_index(movies) -> MoviePostingIndex:
+    posting_index = MoviePostingIndex()
+    for movie in movies:
+        posting_index.add_movie(movie)
+    return posting_index
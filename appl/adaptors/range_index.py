@@ -0,0 +1,171 @@
+import copy
+import threading
+from bisect import bisect_left, bisect_right
+from functools import partial
+from operator import itemgetter
+
+from appl.domainmodel.collation import fold
+from appl.domainmodel.movie import Movie
+
+RANGE_FIELDS = ('release_year', 'runtime_minutes', 'rank', 'rating', 'title')
+# The element types of each field's keys, which a page cursor must match: (value, movie id), or for titles
+# (folded title, title, year, movie id).
+CURSOR_TYPES = {'release_year': (int, str), 'runtime_minutes': (int, str), 'rank': (int, str),
+                'rating': ((int, float), str), 'title': (str, str, int, str)}
+# Up to this many items added since the last query are inserted one at a time, each a bisect and a list insert; a
+# larger batch is sorted once and merged in, O(n + k log k) instead of k inserts of O(n) each.
+INSERT_BATCH = 32
+
+
+class SortedIndex:
+    """Items kept sorted by a unique key tuple, answering range and keyset-page queries with bisect
+
+    key(item) returns the sort key, or None to leave the item out. The key of the last item on a page is an exact
+    cursor for the next one, in either direction. Added items wait in a pending list and are sorted in by the next
+    query, so a burst of adds is merged in one pass.
+    """
+
+    def __init__(self, key, items=()):
+        self.__key = key
+        self.__keys, self.__values, self.__items = [], [], []
+        self.__pending = []
+        # Queries run concurrently under the repository's read lock; the first one merges the pending items.
+        self.__merge_lock = threading.Lock()
+        for item in items:
+            self.add(item)
+        self.__merge_pending()
+
+    def __len__(self):
+        return len(self.__keys) + len(self.__pending)
+
+    def add(self, item):
+        key = self.__key(item)
+        if key is not None:
+            self.__pending.append((key, item))
+
+    def __merge_pending(self):
+        with self.__merge_lock:
+            pending = self.__pending
+            if not pending:
+                return
+            self.__pending = []
+            if len(pending) <= INSERT_BATCH:
+                for key, item in pending:
+                    position = bisect_right(self.__keys, key)
+                    self.__keys.insert(position, key)
+                    self.__values.insert(position, key[0])
+                    self.__items.insert(position, item)
+                return
+            # The stored entries are one sorted run and the sorted batch another, which the stable sort merges in
+            # linear time; the extraction below stays in C.
+            pending.sort(key=itemgetter(0))
+            entries = list(zip(self.__keys, self.__items))
+            entries.extend(pending)
+            entries.sort(key=itemgetter(0))
+            self.__keys = list(map(itemgetter(0), entries))
+            self.__values = list(map(itemgetter(0), self.__keys))
+            self.__items = list(map(itemgetter(1), entries))
+
+    def extended(self, items) -> 'SortedIndex':
+        """Returns a copy of this index that also holds items; this index is left as it is"""
+        self.__merge_pending()
+        index = copy.copy(self)
+        index.__keys, index.__values, index.__items = list(self.__keys), list(self.__values), list(self.__items)
+        index.__pending = []
+        index.__merge_lock = threading.Lock()
+        for item in items:
+            index.add(item)
+        index.__merge_pending()
+        return index
+
+    def page(self, lo=None, hi=None, after_key=None, limit: int = None, descending: bool = False) -> tuple:
+        """Returns (items with lo <= key[0] <= hi following after_key, key to pass for the next page or None)
+
+        Either bound may be None for an open range. The page starts with a bisect, so a deep page costs the same
+        as the first one.
+        """
+        self.__merge_pending()
+        start = 0 if lo is None else bisect_left(self.__values, lo)
+        end = len(self.__values) if hi is None else bisect_right(self.__values, hi)
+        if not descending:
+            if after_key is not None:
+                start = max(start, bisect_right(self.__keys, tuple(after_key)))
+            if limit is not None and start + limit < end:
+                return self.__items[start:start + limit], self.__keys[start + limit - 1]
+            return self.__items[start:end], None
+        if after_key is not None:
+            end = min(end, bisect_left(self.__keys, tuple(after_key)))
+        if limit is not None and end - limit > start:
+            return self.__items[end - limit:end][::-1], self.__keys[end - limit]
+        return self.__items[start:end][::-1], None
+
+
+class MovieRangeIndex(SortedIndex):
+    """Movies sorted by one field; the movie id breaks ties, so every key is unique
+
+    Movies without a value for the field are left out. Titles are ordered by Movie.sort_key, so accents and case do
+    not split the alphabet, and title bounds are folded the same way.
+    """
+
+    def __init__(self, field: str, movies=()):
+        if field not in RANGE_FIELDS:
+            raise ValueError(f"Unknown range field {field!r}, expected one of {RANGE_FIELDS}")
+        self.__field = field
+        # A plain function rather than the bound key method, so a copy made by extended does not keep this index
+        # alive.
+        super().__init__(partial(movie_key, field), movies)
+
+    @property
+    def field(self) -> str:
+        return self.__field
+
+    def key(self, movie: Movie):
+        return movie_key(self.__field, movie)
+
+    def add_movie(self, movie: Movie):
+        self.add(movie)
+
+    def between(self, lo=None, hi=None, after_key=None, limit: int = None, descending: bool = False) -> tuple:
+        if self.__field == 'title':
+            lo = None if lo is None else fold(lo)
+            hi = None if hi is None else fold(hi)
+        return self.page(lo, hi, after_key, limit, descending)
+
+
+def movie_key(field: str, movie: Movie):
+    if field == 'title':
+        # (folded title, title, year, movie id): the folded title is what lo and hi are compared with.
+        return None if movie.title is None else movie.sort_key + (movie.movie_id,)
+    value = getattr(movie, field)
+    return None if value is None else (value, movie.movie_id)
+
+
+class TestMovieRangeIndex:
+
+    @staticmethod
+    def movies(titles) -> list:
+        return [Movie(title, 2000 + number) for number, title in enumerate(titles)]
+
+    def test_titles_follow_sort_key(self):
+        index = MovieRangeIndex('title', self.movies(["Zootopia", "Éclair", "amélie", "Apollo 13"]))
+        titles = [movie.title for movie in index.between()[0]]
+        assert titles == ["amélie", "Apollo 13", "Éclair", "Zootopia"]
+        assert [movie.title for movie in index.between(lo="E", hi="eclair")[0]] == ["Éclair"]
+
+    def test_adds_are_merged_in_order(self):
+        index = MovieRangeIndex('release_year', self.movies(["A", "B"]))
+        for count in (1, INSERT_BATCH + 5):
+            for movie in self.movies([f"Batch {count} {number}" for number in range(count)]):
+                index.add_movie(movie)
+        movies, key = index.between(limit=10)
+        keys = [index.key(movie) for movie in index.between()[0]]
+        assert len(index) == 2 + 1 + INSERT_BATCH + 5 and keys == sorted(keys)
+        assert index.between(after_key=key)[0] == index.between()[0][10:]
+
+
+    def test_extended_copy_leaves_original(self):
+        index = MovieRangeIndex('title', self.movies(["B", "D"]))
+        extended = index.extended(self.movies(["C", "A"]))
+        assert isinstance(extended, MovieRangeIndex) and extended.field == 'title'
+        assert [movie.title for movie in extended.between()[0]] == ["A", "B", "C", "D"]
+        assert [movie.title for movie in index.between()[0]] == ["B", "D"]
@@ -1,4 +1,9 @@
 import abc
+import base64
+import binascii
+import json
+from contextlib import nullcontext
+
 from appl.domainmodel.actor import Actor
 from appl.domainmodel.movie import Movie
 from appl.domainmodel.director import Director
@@ -13,10 +18,61 @@ repo_instance = None
 
 class RepositoryException(Exception):
     def __init__(self, message=None):
-        pass
+        super().__init__(message)
+
+
+def encode_cursor(key) -> str:
+    """Turns the sort key of the last item on a page into an opaque, URL-safe cursor string"""
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, types: tuple = None) -> tuple:
+    """Returns the sort key a cursor encodes; RepositoryException if it is malformed
+
+    types gives the type (or tuple of types) of each key element, e.g. (str, int) for a name and an id; a key of
+    any other length or element type is rejected as well, since it would only fail once compared with real keys.
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise RepositoryException(f"Invalid page cursor {cursor!r}")
+    if not isinstance(key, list) or types is not None and not key_matches(key, types):
+        raise RepositoryException(f"Invalid page cursor {cursor!r}")
+    return tuple(key)
+
+
+def key_matches(key: list, types: tuple) -> bool:
+    # JSON true and false decode to bool, which is a subclass of int but never a valid key element.
+    return len(key) == len(types) and all(isinstance(value, expected) and not isinstance(value, bool)
+                                          for value, expected in zip(key, types))
+
+
+def sequence_page(items: list, limit: int, cursor: str, descending: bool) -> tuple:
+    # Reviews and watchlists are only ever appended, so a position is a stable cursor into them.
+    after_key = decode_cursor(cursor, (int,))
+    if after_key is not None and not 0 <= after_key[0] < len(items):
+        raise RepositoryException(f"Invalid page cursor {cursor!r}")
+    if not descending:
+        start = 0 if after_key is None else after_key[0] + 1
+        end = min(start + limit, len(items))
+        return items[start:end], encode_cursor((end - 1,)) if end < len(items) else None
+    end = len(items) if after_key is None else after_key[0]
+    start = max(end - limit, 0)
+    return items[start:end][::-1], encode_cursor((start,)) if start > 0 else None
 
 
 class AbstractRepository(abc.ABC):
+    def pinned_snapshot(self):
+        """Context manager yielding an object with the get_*_page methods that reads one consistent catalog state
+
+        Repositories without catalog versions yield themselves, so each page is read as it stands at the time.
+        """
+        return nullcontext(self)
+
     @abc.abstractmethod
     def get_movies(self, movie_list: list):
         raise NotImplementedError
@@ -36,11 +92,68 @@ class AbstractRepository(abc.ABC):
         """Adds a movie to the repository"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def apply_movie_changes(self, inserted: list, updated: list, deleted_ids: list):
+        """Inserts, replaces (matched on movie id) and deletes movies as one change"""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_movie(self, movie) -> Movie:
         """Returns Watchlist"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def search_movies(self, query: str, page: int = 1, page_size: int = 10) -> dict:
+        """Returns {'movies', 'total', 'page', 'page_size'} for the best matches of a free-text query"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def find_movies(self, genre=None, director=None, actor=None, year=None) -> list:
+        """Returns movies matching every given facet, e.g. find_movies(genre='Drama', director='Ridley Scott')"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movies_between(self, field: str, lo=None, hi=None, after_key=None, limit: int = None,
+                           descending: bool = False) -> tuple:
+        """Returns (movies with lo <= field <= hi in field order after after_key, key to pass for the next page)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_top_movies(self, metric: str, k: int = 10, genre=None, year_from=None, year_to=None) -> list:
+        """Returns the k movies with the highest rating, votes, revenue_millions, metascore or review_rating"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movies_page(self, limit: int = 20, cursor: str = None, order_by: str = 'title',
+                        descending: bool = False) -> tuple:
+        """Returns (up to limit movies sorted by order_by following cursor, cursor for the next page or None)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_actors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        """Returns (up to limit actors in name order following cursor, cursor for the next page or None)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_directors_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        """Returns (up to limit directors in name order following cursor, cursor for the next page or None)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_genres_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        """Returns (up to limit genres in name order following cursor, cursor for the next page or None)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_reviews_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        """Returns (up to limit reviews in the order they were added, cursor for the next page or None)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_watchlists_page(self, limit: int = 20, cursor: str = None, descending: bool = False) -> tuple:
+        """Returns (up to limit watchlists in the order they were added, cursor for the next page or None)"""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_actor(self, actor: Actor):
         """Adds a actor to the repository"""
@@ -119,3 +232,33 @@ class AbstractRepository(abc.ABC):
     # def get_number_of_watchlists(self) -> int:
     #     """Returns the number of watchlists in the 'database/repo' """
     #     raise NotImplementedError
+
+
+class TestPageCursors:
+
+    def test_keys_round_trip(self):
+        assert decode_cursor(encode_cursor(("moana", 7)), (str, int)) == ("moana", 7)
+        assert decode_cursor(encode_cursor((7.5, "Moana2016")), ((int, float), str)) == (7.5, "Moana2016")
+        assert decode_cursor(None, (int,)) is None
+
+    def test_malformed_keys_are_rejected(self):
+        for cursor in ("not base64!", encode_cursor((1,)), encode_cursor(("x", "y")), encode_cursor((True, "y")),
+                       base64.urlsafe_b64encode(b'{"a": 1}').decode('ascii')):
+            try:
+                decode_cursor(cursor, (int, str))
+            except RepositoryException:
+                continue
+            raise AssertionError(f"accepted {cursor!r}")
+
+    def test_sequence_pages(self):
+        items = list(range(5))
+        page, cursor = sequence_page(items, 2, None, False)
+        assert page == [0, 1] and sequence_page(items, 2, cursor, False) == ([2, 3], encode_cursor((3,)))
+        page, cursor = sequence_page(items, 2, None, True)
+        assert page == [4, 3] and sequence_page(items, 2, cursor, True)[0] == [2, 1]
+        for cursor in (encode_cursor(("x",)), encode_cursor((5,)), encode_cursor((-1,))):
+            try:
+                sequence_page(items, 2, cursor, False)
+            except RepositoryException:
+                continue
+            raise AssertionError(f"accepted {cursor!r}")
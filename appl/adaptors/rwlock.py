@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Lets any number of readers in at once, or a single writer on its own
+
+    Writers take priority: once a writer is waiting, new readers queue behind it, so a steady stream of page views
+    cannot starve an add_review. The lock is not re-entrant; a thread holding it must not acquire it again.
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = False
+        self.__writers_waiting = 0
+
+    def acquire_read(self):
+        with self.__condition:
+            while self.__writer or self.__writers_waiting:
+                self.__condition.wait()
+            self.__readers += 1
+
+    def release_read(self):
+        with self.__condition:
+            self.__readers -= 1
+            if self.__readers == 0:
+                self.__condition.notify_all()
+
+    def acquire_write(self):
+        with self.__condition:
+            self.__writers_waiting += 1
+            try:
+                while self.__writer or self.__readers:
+                    self.__condition.wait()
+            finally:
+                self.__writers_waiting -= 1
+            self.__writer = True
+
+    def release_write(self):
+        with self.__condition:
+            self.__writer = False
+            self.__condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
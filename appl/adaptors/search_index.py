@@ -0,0 +1,121 @@
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+
+from appl.domainmodel.collation import fold
+from appl.domainmodel.movie import Movie
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOP_WORDS = frozenset({'a', 'an', 'and', 'as', 'at', 'by', 'for', 'from', 'in', 'into', 'is', 'it', 'of', 'on',
+                        'or', 'the', 'their', 'to', 'with'})
+# A term in the title counts three times, a name twice and a word of the description once.
+FIELD_WEIGHTS = (('title', 3), ('names', 2), ('description', 1))
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text) -> list:
+    # Folded as titles are for sorting, so "Adèle" and "adele" index to the same term.
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(fold(text)) if token not in STOP_WORDS]
+
+
+class MovieSearchIndex:
+    """Inverted index over movie titles, descriptions, actor and director names with BM25 ranking
+
+    Postings map each term to {movie id: weighted term frequency}. The last word of a query also matches as a
+    prefix, so "guard" finds "Guardians". Movies are added and removed one at a time.
+    """
+
+    def __init__(self):
+        self.__postings = dict()
+        self.__vocabulary = []
+        self.__document_lengths = dict()
+        self.__documents = dict()
+        self.__total_length = 0
+
+    def __len__(self):
+        return len(self.__documents)
+
+    def add_movie(self, movie: Movie):
+        if movie.movie_id in self.__documents:
+            self.remove_movie(movie.movie_id)
+        names = [actor.actor_full_name for actor in movie.actors or []]
+        if movie.get_director() is not None:
+            names.append(movie.get_director().director_full_name)
+        fields = {'title': movie.title, 'names': " ".join(name for name in names if name),
+                  'description': movie.description}
+        frequencies = dict()
+        length = 0
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields[field]):
+                frequencies[token] = frequencies.get(token, 0) + weight
+                length += weight
+        for token, frequency in frequencies.items():
+            postings = self.__postings.get(token)
+            if postings is None:
+                postings = self.__postings[token] = dict()
+                insort(self.__vocabulary, token)
+            postings[movie.movie_id] = frequency
+        self.__documents[movie.movie_id] = movie
+        self.__document_lengths[movie.movie_id] = length
+        self.__total_length += length
+
+    def remove_movie(self, movie_id):
+        movie = self.__documents.pop(movie_id, None)
+        if movie is None:
+            return
+        self.__total_length -= self.__document_lengths.pop(movie_id)
+        # Only the postings of this movie's own terms can hold it, so re-tokenizing it is cheaper than a sweep.
+        names = [actor.actor_full_name for actor in movie.actors or []]
+        if movie.get_director() is not None:
+            names.append(movie.get_director().director_full_name)
+        for token in set(tokenize(movie.title) + tokenize(" ".join(name for name in names if name))
+                         + tokenize(movie.description)):
+            postings = self.__postings.get(token)
+            if postings is not None:
+                postings.pop(movie_id, None)
+                if not postings:
+                    del self.__postings[token]
+                    del self.__vocabulary[bisect_left(self.__vocabulary, token)]
+
+    def expand_prefix(self, prefix: str) -> list:
+        start = bisect_left(self.__vocabulary, prefix)
+        expansions = []
+        for token in self.__vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(prefix):
+                break
+            expansions.append(token)
+        return expansions
+
+    def search(self, query: str, page: int = 1, page_size: int = 10) -> dict:
+        """Returns one page of movies ranked by BM25 score, plus the total number of matches"""
+        tokens = tokenize(query)
+        if not tokens or not self.__documents:
+            return {'movies': [], 'total': 0, 'page': page, 'page_size': page_size}
+        terms = [[token] for token in tokens[:-1]]
+        terms.append(self.expand_prefix(tokens[-1]) or [tokens[-1]])
+
+        document_count = len(self.__documents)
+        average_length = self.__total_length / document_count
+        scores = dict()
+        for alternatives in terms:
+            for token in alternatives:
+                postings = self.__postings.get(token)
+                if not postings:
+                    continue
+                inverse_frequency = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for movie_id, frequency in postings.items():
+                    normalization = BM25_K1 * (1 - BM25_B + BM25_B * self.__document_lengths[movie_id]
+                                               / average_length)
+                    scores[movie_id] = scores.get(movie_id, 0.0) + \
+                        inverse_frequency * frequency * (BM25_K1 + 1) / (frequency + normalization)
+
+        # Only the movies up to the end of the requested page are ever sorted.
+        page = max(page, 1)
+        ranked = heapq.nlargest(page * page_size, scores.items(), key=lambda item: (item[1], item[0]))
+        movies = [self.__documents[movie_id] for movie_id, score in ranked[(page - 1) * page_size:]]
+        return {'movies': movies, 'total': len(scores), 'page': page, 'page_size': page_size}
@@ -0,0 +1,183 @@
+import threading
+from functools import wraps
+
+from appl.adaptors.memory_repository import MemoryRepository
+from appl.adaptors.rwlock import ReadWriteLock
+
+
+def locked(method, write: bool = False, snapshot: bool = False):
+    @wraps(method)
+    def locked_method(self, *args, **kwargs):
+        held = self.lock_holder
+        if getattr(held, 'depth', 0):
+            # Already inside a locked call on this thread (add_review scoring its movie, say); the lock is not
+            # re-entrant, so nested calls go straight through.
+            result = method(self, *args, **kwargs)
+            return list(result) if snapshot else result
+        acquire, release = (self.lock.acquire_write, self.lock.release_write) if write else \
+            (self.lock.acquire_read, self.lock.release_read)
+        acquire()
+        held.depth = 1
+        try:
+            result = method(self, *args, **kwargs)
+            # Collections are copied while the lock is held, so callers can iterate them after it is released.
+            return list(result) if snapshot else result
+        finally:
+            held.depth = 0
+            release()
+    return locked_method
+
+
+class ThreadSafeMemoryRepository(MemoryRepository):
+    """MemoryRepository that can be shared by the threads of a threaded WSGI server
+
+    Lookups and queries run in parallel under the read side of a ReadWriteLock; every add_* and reload takes the
+    write side. Methods that return one of the repository's collections return a copy made under the lock, so a
+    template iterating get_movies() never sees the list change underneath it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__lock = ReadWriteLock()
+        self.__lock_holder = threading.local()
+
+    @property
+    def lock(self) -> ReadWriteLock:
+        return self.__lock
+
+    @property
+    def lock_holder(self):
+        return self.__lock_holder
+
+    add_user = locked(MemoryRepository.add_user, write=True)
+    add_movie = locked(MemoryRepository.add_movie, write=True)
+    apply_movie_changes = locked(MemoryRepository.apply_movie_changes, write=True)
+    add_director = locked(MemoryRepository.add_director, write=True)
+    add_actor = locked(MemoryRepository.add_actor, write=True)
+    add_genre = locked(MemoryRepository.add_genre, write=True)
+    add_review = locked(MemoryRepository.add_review, write=True)
+    add_watchlist = locked(MemoryRepository.add_watchlist, write=True)
+
+    # Lazily built indexes (search, range, co-star, catalog store) may be built by two readers at once; both
+    # build the same thing and the last assignment wins, which is wasted work but never wrong.
+    get_user = locked(MemoryRepository.get_user)
+    get_movie = locked(MemoryRepository.get_movie)
+    search_movies = locked(MemoryRepository.search_movies)
+    find_movies = locked(MemoryRepository.find_movies)
+    get_movies_between = locked(MemoryRepository.get_movies_between)
+    get_top_movies = locked(MemoryRepository.get_top_movies)
+    get_costar_graph = locked(MemoryRepository.get_costar_graph)
+    actors_worked_together = locked(MemoryRepository.actors_worked_together)
+    get_collaboration_path = locked(MemoryRepository.get_collaboration_path)
+    get_catalog_store = locked(MemoryRepository.get_catalog_store)
+    get_statistics = locked(MemoryRepository.get_statistics)
+    get_director = locked(MemoryRepository.get_director)
+    get_actor = locked(MemoryRepository.get_actor)
+    get_genre = locked(MemoryRepository.get_genre)
+    get_review = locked(MemoryRepository.get_review)
+    get_number_of_movies = locked(MemoryRepository.get_number_of_movies)
+    get_number_of_directors = locked(MemoryRepository.get_number_of_directors)
+    get_number_of_actors = locked(MemoryRepository.get_number_of_actors)
+    get_number_of_genres = locked(MemoryRepository.get_number_of_genres)
+    get_number_of_reviews = locked(MemoryRepository.get_number_of_reviews)
+    get_number_of_watchlists = locked(MemoryRepository.get_number_of_watchlists)
+
+    # The get_*_page methods and snapshot() read published catalog versions, which never change, so they take no
+    # lock and never wait for a writer.
+
+    get_watchlist = locked(MemoryRepository.get_watchlist, snapshot=True)
+    get_movies = locked(MemoryRepository.get_movies, snapshot=True)
+    get_actors = locked(MemoryRepository.get_actors, snapshot=True)
+    get_directors = locked(MemoryRepository.get_directors, snapshot=True)
+    get_genres = locked(MemoryRepository.get_genres, snapshot=True)
+    get_reviews = locked(MemoryRepository.get_reviews, snapshot=True)
+    get_watchlists = locked(MemoryRepository.get_watchlists, snapshot=True)
+
+
+class TestThreadSafeMemoryRepository:
+
+    def test_concurrent_readers_and_writers(self):
+        from appl.domainmodel.actor import Actor
+        from appl.domainmodel.genre import Genre
+        from appl.domainmodel.movie import Movie
+        from appl.domainmodel.review import Review
+
+        repo = ThreadSafeMemoryRepository()
+        writer_count, reader_count, movies_per_writer = 4, 8, 250
+        errors = []
+        start = threading.Barrier(writer_count + reader_count)
+
+        def write(writer):
+            try:
+                start.wait()
+                for number in range(movies_per_writer):
+                    movie = Movie(f"Movie {writer}-{number}", 2000 + number % 20)
+                    movie.add_genre(Genre(f"Genre {number % 7}"))
+                    movie.add_actor(Actor(f"Actor {writer} {number % 13}"))
+                    movie.rating = number % 10
+                    repo.add_genre(movie.genres[0])
+                    repo.add_actor(movie.actors[0])
+                    repo.add_movie(movie)
+                    repo.add_review(Review(movie, f"Review {writer}-{number}", number % 10 + 1))
+            except Exception as error:
+                errors.append(error)
+
+        def read():
+            try:
+                start.wait()
+                for number in range(movies_per_writer):
+                    # Walking every collection would raise "changed size during iteration" without the lock.
+                    movies = repo.get_movies()
+                    assert len(movies) == sum(1 for movie in movies)
+                    assert all(actor.actor_full_name for actor in repo.get_actors())
+                    assert all(genre.genre_name for genre in repo.get_genres())
+                    assert all(review.rating for review in repo.get_reviews())
+                    repo.find_movies(genre=f"Genre {number % 7}")
+                    repo.get_top_movies('rating', 5)
+                    repo.get_top_movies('review_rating', 5)
+                    repo.get_movies_between('release_year', 2005, 2010, limit=10)
+                    with repo.pinned_snapshot() as catalog:
+                        movies, cursor = catalog.get_movies_page(10, order_by='rating')
+                        assert len(catalog.get_movies_page(10, cursor, order_by='rating')[0]) <= 10
+                        assert len(catalog.get_actors_page(10)[0]) == min(10, len(catalog.actors))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(writer,)) for writer in range(writer_count)]
+        threads += [threading.Thread(target=read) for _ in range(reader_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert repo.get_number_of_movies() == writer_count * movies_per_writer
+        assert repo.get_number_of_reviews() == writer_count * movies_per_writer
+        assert repo.get_number_of_genres() == 7
+        assert len(repo.find_movies(genre="Genre 0")) == len([movie for movie in repo.get_movies()
+                                                               if movie.genres[0].genre_name == "Genre 0"])
+        assert repo.get_movies_between('release_year', 2000, 2019)[1] is None
+        assert len(repo.get_movies_between('release_year', 2000, 2019)[0]) == writer_count * movies_per_writer
+        assert [movie.rating for movie in repo.get_top_movies('rating', 3)] == [9, 9, 9]
+
+    def test_writer_is_not_starved(self):
+        lock = ReadWriteLock()
+        lock.acquire_read()
+        acquired = threading.Event()
+
+        def write():
+            with lock.write_locked():
+                acquired.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        # A reader arriving while the writer waits queues behind it rather than keeping the writer out.
+        late_reader = threading.Thread(target=lock.acquire_read)
+        late_reader.start()
+        late_reader.join(timeout=0.2)
+        assert late_reader.is_alive()
+        lock.release_read()
+        assert acquired.wait(timeout=5)
+        writer.join()
+        late_reader.join(timeout=5)
+        assert not late_reader.is_alive()
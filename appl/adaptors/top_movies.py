@@ -0,0 +1,87 @@
+import heapq
+
+from appl.domainmodel.movie import Movie
+from appl.datafilereaders.entity_registry import normalize_name
+
+TOP_METRICS = ('rating', 'votes', 'revenue_millions', 'metascore', 'review_rating')
+
+
+def top_key(metric: str, genre=None, year_from=None, year_to=None) -> tuple:
+    if metric not in TOP_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {TOP_METRICS}")
+    return metric, None if genre is None else normalize_name(genre), year_from, year_to
+
+
+def matches_filter(key: tuple, movie: Movie) -> bool:
+    metric, genre, year_from, year_to = key
+    if genre is not None and not any(normalize_name(movie_genre.genre_name) == genre
+                                     for movie_genre in movie.genres or []):
+        return False
+    if year_from is not None and (movie.release_year is None or movie.release_year < year_from):
+        return False
+    if year_to is not None and (movie.release_year is None or movie.release_year > year_to):
+        return False
+    return True
+
+
+def top_k(candidates, k: int, value_of) -> list:
+    """Returns the k (value, movie) pairs with the highest value, best first; movies without a value are skipped"""
+    # A bounded heap keeps k entries at a time instead of sorting every candidate. Ties keep candidate order.
+    scored = ((value_of(movie), movie) for movie in candidates)
+    return heapq.nlargest(k, ((value, movie) for value, movie in scored if value is not None),
+                          key=lambda entry: entry[0])
+
+
+class TopMoviesCache:
+    """Top-k results per (metric, genre, year range), kept current as movies and reviews arrive
+
+    Each entry remembers how many results were asked for. A new movie is offered to every entry whose filter it
+    passes and only displaces the last place if it beats it, so adding movies never forces a recomputation. A
+    movie whose value can fall (a new review lowers its average) drops the entries it already sits in instead.
+    """
+
+    def __init__(self):
+        self.__entries = dict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key: tuple, k: int):
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        size, ranked = entry
+        # An entry holding fewer results than it was asked for has every candidate, so it answers any k.
+        if k <= size or len(ranked) < size:
+            return ranked[:k]
+        return None
+
+    def put(self, key: tuple, k: int, ranked: list):
+        self.__entries[key] = (k, ranked)
+
+    def offer(self, movie: Movie, value_of, metric: str = None):
+        """Adds a new (or newly better) movie to the entries it belongs in; value_of(metric, movie) scores it"""
+        for key, (size, ranked) in self.__entries.items():
+            if metric is not None and key[0] != metric:
+                continue
+            if not matches_filter(key, movie):
+                continue
+            value = value_of(key[0], movie)
+            if value is None or (len(ranked) >= size and value <= ranked[-1][0]):
+                continue
+            # Goes after every equal value, as it would in a fresh nlargest over the catalog in insertion order.
+            position = len(ranked)
+            while position > 0 and ranked[position - 1][0] < value:
+                position -= 1
+            ranked.insert(position, (value, movie))
+            del ranked[size:]
+
+    def discard_containing(self, movie: Movie, metric: str):
+        """Drops the entries for metric that hold movie, so they are recomputed on their next request"""
+        stale = [key for key, (size, ranked) in self.__entries.items() if key[0] == metric
+                 and any(entry_movie.movie_id == movie.movie_id for value, entry_movie in ranked)]
+        for key in stale:
+            del self.__entries[key]
+
+    def clear(self):
+        self.__entries.clear()
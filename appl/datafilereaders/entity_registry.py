@@ -0,0 +1,56 @@
+from appl.domainmodel.actor import Actor
+from appl.domainmodel.director import Director
+from appl.domainmodel.genre import Genre
+
+
+def normalize_name(name: str) -> str:
+    # Collapses surrounding and repeated inner whitespace so "Chris  Pratt " and "Chris Pratt" share an entry.
+    return " ".join(name.split())
+
+
+class EntityRegistry:
+    """Hands back one canonical Actor, Director and Genre instance per normalized name"""
+
+    def __init__(self):
+        self.__actors = dict()
+        self.__directors = dict()
+        self.__genres = dict()
+
+    def actor(self, actor_full_name: str) -> Actor:
+        key = normalize_name(actor_full_name)
+        actor = self.__actors.get(key)
+        if actor is None:
+            actor = Actor(key)
+            self.__actors[key] = actor
+        return actor
+
+    def director(self, director_full_name: str) -> Director:
+        key = normalize_name(director_full_name)
+        director = self.__directors.get(key)
+        if director is None:
+            director = Director(key)
+            self.__directors[key] = director
+        return director
+
+    def genre(self, genre_name: str) -> Genre:
+        key = normalize_name(genre_name)
+        genre = self.__genres.get(key)
+        if genre is None:
+            genre = Genre(key)
+            self.__genres[key] = genre
+        return genre
+
+    @property
+    def actors(self):
+        return self.__actors.values()
+
+    @property
+    def directors(self):
+        return self.__directors.values()
+
+    @property
+    def genres(self):
+        return self.__genres.values()
+
+    def __len__(self):
+        return len(self.__actors) + len(self.__directors) + len(self.__genres)
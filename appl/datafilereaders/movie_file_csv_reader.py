@@ -1,8 +1,17 @@
 import csv
 from appl.domainmodel.movie import Movie
-from appl.domainmodel.genre import Genre
-from appl.domainmodel.actor import Actor
-from appl.domainmodel.director import Director
+from appl.datafilereaders.entity_registry import EntityRegistry
+
+
+def parse_number(value, number_type):
+    if value is None or value.strip() in ("", "N/A"):
+        return None
+    return number_type(value)
+
+
+def row_movie_id(row) -> str:
+    # Same key as Movie.movie_id (title followed by release year), without building the movie.
+    return row['Title'].strip() + str(int(row['Year']))
 
 
 # noinspection DuplicatedCode
@@ -13,54 +22,70 @@ class MovieFileCSVReader:
     dataset_of_genres: set
     filename: str
 
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, registry: EntityRegistry = None):
+        # Readers sharing a registry also share their Actor, Director and Genre instances.
+        self.__registry = registry if registry is not None else EntityRegistry()
         self.__dataset_of_genres = set()
         self.__dataset_of_directors = set()
         self.__dataset_of_actors = set()
         self.__dataset_of_movies = list
         self.__file_name = file_name
 
-    # noinspection PyUnusedLocal
     def read_csv_file(self):
+        self.__dataset_of_movies = []
+        self.__dataset_of_actors = set()
+        self.__dataset_of_directors = set()
+        self.__dataset_of_genres = set()
+        for movie_object in self.iter_movies():
+            self.__dataset_of_movies.append(movie_object)
+            self.__dataset_of_directors.add(movie_object.get_director())
+            self.__dataset_of_actors.update(movie_object.actors)
+            self.__dataset_of_genres.update(movie_object.genres)
+
+    def iter_rows(self):
+        """Yields the raw csv rows one at a time without holding the file in memory"""
         # noinspection SpellCheckingInspection
         with open(self.__file_name, mode='r', encoding='utf-8-sig') as csvfile:
-            movie_file_reader = csv.DictReader(csvfile)
-            self.__dataset_of_movies = []
-            self.__dataset_of_actors = set()
-            self.__dataset_of_directors = set()
-            self.__dataset_of_genres = set()
-            index = 0
-            for row in movie_file_reader:
-                rank = row['Rank']
-                title = row['Title']
-                director = row['Director']
-                actor = row['Actors']
-                release_year = int(row['Year'])
-                genre = row['Genre']
-
-                genre_list = genre.split(",")
-                genre_list = [Genre(item.strip()) for item in genre_list]
-
-                for item in genre_list:
-                    if item not in self.__dataset_of_genres:  # or len(self.__dataset_of_genres) == 0:
-                        self.__dataset_of_genres.add(item)
-
-                actor_list = actor.split(",")
-                actor_list = [Actor(item.strip()) for item in actor_list]
-
-                for item in actor_list:
-                    if item not in self.__dataset_of_actors:  # or len(self.__dataset_of_actors) == 0:
-                        self.__dataset_of_actors.add(item)
-
-                movie_object = Movie(title, release_year)
-                if movie_object not in self.__dataset_of_movies:  # or len(self.__dataset_of_movies) == 0:
-                    self.__dataset_of_movies.append(movie_object)
-
-                director_object = Director(director)
-                if director_object not in self.__dataset_of_directors:  # or len(self.__dataset_of_directors) == 0:
-                    self.__dataset_of_directors.add(director_object)
-
-                index += 1
+            yield from csv.DictReader(csvfile)
+
+    def iter_movies(self):
+        """Yields fully built movies (director, actors and genres attached), skipping repeated title/year pairs"""
+        # Only the ids of movies already seen are kept, never the movies themselves.
+        seen_movie_ids = set()
+        for row in self.iter_rows():
+            movie_object = self.build_movie(row)
+            if movie_object.movie_id in seen_movie_ids:
+                continue
+            seen_movie_ids.add(movie_object.movie_id)
+            yield movie_object
+
+    def build_movie(self, row) -> Movie:
+        movie_object = Movie(row['Title'], int(row['Year']))
+        movie_object.rank = int(row['Rank'])
+        movie_object.description = row['Description']
+        movie_object.runtime_minutes = int(row['Runtime (Minutes)'])
+        # Revenue and metascore are N/A for some movies; those stay None on the movie.
+        movie_object.rating = parse_number(row.get('Rating'), float)
+        movie_object.votes = parse_number(row.get('Votes'), int)
+        movie_object.revenue_millions = parse_number(row.get('Revenue (Millions)'), float)
+        movie_object.metascore = parse_number(row.get('Metascore'), int)
+        movie_object.director = self.__registry.director(row['Director'])
+
+        for item in row['Genre'].split(","):
+            movie_object.add_genre(self.__registry.genre(item))
+
+        for item in row['Actors'].split(","):
+            movie_object.add_actor(self.__registry.actor(item))
+
+        return movie_object
+
+    @property
+    def file_name(self):
+        return self.__file_name
+
+    @property
+    def registry(self):
+        return self.__registry
 
     @property
     def dataset_of_movies(self):
@@ -0,0 +1,117 @@
+import csv
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from appl.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from appl.datafilereaders.entity_registry import EntityRegistry
+
+CHUNK_SIZE = 1 << 20
+
+
+def find_shard_boundaries(file_name: str, shard_count: int) -> list:
+    """Splits the data rows of a csv file into (start, end) byte ranges that begin and end on a record boundary"""
+    file_size = os.path.getsize(file_name)
+    with open(file_name, mode='rb') as csvfile:
+        csvfile.readline()
+        data_start = csvfile.tell()
+        targets = [data_start + (file_size - data_start) * index // shard_count for index in range(1, shard_count)]
+        boundaries = [data_start]
+        # A newline only ends a record when an even number of quotes precedes it, i.e. it is not inside a quoted
+        # field. Escaped quotes ("") flip the state twice, so counting quotes per chunk is enough to track it.
+        in_quotes = False
+        chunk_start = data_start
+        chunk = csvfile.read(CHUNK_SIZE)
+        position = 0
+        while targets and chunk:
+            target = targets[0] - chunk_start
+            if position < target:
+                stop = min(target, len(chunk))
+                in_quotes ^= chunk.count(b'"', position, stop) % 2 == 1
+                position = stop
+            else:
+                newline = chunk.find(b'\n', position)
+                stop = len(chunk) if newline == -1 else newline + 1
+                in_quotes ^= chunk.count(b'"', position, stop) % 2 == 1
+                position = stop
+                if newline != -1 and not in_quotes:
+                    boundaries.append(chunk_start + position)
+                    while targets and targets[0] < boundaries[-1]:
+                        targets.pop(0)
+            if position == len(chunk):
+                chunk_start += len(chunk)
+                chunk = csvfile.read(CHUNK_SIZE)
+                position = 0
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def read_header(file_name: str) -> list:
+    # noinspection SpellCheckingInspection
+    with open(file_name, mode='r', encoding='utf-8-sig', newline='') as csvfile:
+        return next(csv.reader(csvfile))
+
+
+def parse_shard(file_name: str, start: int, end: int, fieldnames: list) -> list:
+    with open(file_name, mode='rb') as csvfile:
+        csvfile.seek(start)
+        data = csvfile.read(end - start)
+    return list(csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=fieldnames))
+
+
+class ParallelMovieFileCSVReader(MovieFileCSVReader):
+    """Parses record-aligned shards of the csv file in a process pool
+
+    Shards are merged back in file order, so the movies produced (and which duplicate wins) are exactly those of
+    the single-process reader. Building the domain objects still happens in this process, where they are interned.
+    """
+
+    def __init__(self, file_name: str, registry: EntityRegistry = None, workers: int = None,
+                 shards_per_worker: int = 4):
+        super().__init__(file_name, registry)
+        self.__workers = workers if workers is not None else os.cpu_count()
+        self.__shards_per_worker = shards_per_worker
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    def iter_rows(self):
+        if self.__workers <= 1:
+            yield from super().iter_rows()
+            return
+        shards = find_shard_boundaries(self.file_name, self.__workers * self.__shards_per_worker)
+        fieldnames = read_header(self.file_name)
+        with ProcessPoolExecutor(max_workers=self.__workers) as executor:
+            starts = [start for start, end in shards]
+            ends = [end for start, end in shards]
+            for rows in executor.map(parse_shard, repeat(self.file_name), starts, ends, repeat(fieldnames)):
+                yield from rows
+
+
+def measure_parallel_speedup(file_name: str, worker_counts=None) -> list:
+    """Times a full read of the file for each worker count and reports the speedup over one worker"""
+    if worker_counts is None:
+        worker_counts = sorted({1, 2, 4, os.cpu_count()})
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        reader = ParallelMovieFileCSVReader(file_name, workers=workers)
+        started = time.perf_counter()
+        reader.read_csv_file()
+        seconds = time.perf_counter() - started
+        if baseline is None:
+            baseline = seconds
+        results.append({"workers": workers, "seconds": seconds, "speedup": baseline / seconds,
+                        "movies": len(reader.dataset_of_movies)})
+    return results
+
+
+if __name__ == '__main__':
+    data_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join('appl', 'datafiles', 'Data1000Movies.csv')
+    for result in measure_parallel_speedup(data_file):
+        print(f"{result['workers']:>3} workers: {result['seconds']:.3f}s  "
+              f"speedup x{result['speedup']:.2f}  ({result['movies']} movies)")
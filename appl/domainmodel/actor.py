@@ -1,16 +1,23 @@
+from appl.domainmodel.collation import fold
+
+
 # noinspection DuplicatedCode,SpellCheckingInspection
 class Actor:
     __actor_full_name: str
     __actor_id: int
 
+    # No per-instance __dict__; a million actors cost their slots and strings only.
+    __slots__ = ('__actor_full_name', '__actor_id', '__firstname', '__middlenames', '__lastname', '__colleagues',
+                 '__sort_key')
+
     def __init__(self, actor_full_name: str):
+        self.__sort_key = None
+        # Names of the actors worked with, created by the first add_actor_colleague.
+        self.__colleagues = None
         if actor_full_name == "" or type(actor_full_name) is not str or actor_full_name == "\n":
             self.__actor_full_name = None
         else:
             self.__actor_full_name = actor_full_name.strip()
-            self.colleague_dict = {f"{self.__repr__()}": []}
-            #   check for multiple names
-            self.names_count = self.__actor_full_name.count(" ") + 1
             #   assign first and last names
             if self.names_count < 3:
                 if " " in self.__actor_full_name:
@@ -26,25 +33,50 @@ class Actor:
                 self.middlenames = self.__actor_full_name[
                                    actor_full_name.find(" ") + 1: self.__actor_full_name.rfind("")]
                 self.lastname = self.__actor_full_name[self.__actor_full_name.rfind(" ") + 1:]
-            self.__firstname = self.firstname
-            self.__lastname = self.lastname
             self.__actor_id = self.__hash__()
+            self.update_keys()
 
+    def update_keys(self):
+        """Recomputes the sort key: first name, last name, then middle names, compared accent- and case-folded"""
+        # Middle names are taken from the full name; the middlenames attribute also holds the last name. The parts
+        # are folded into one string joined by "\0", which sorts below any character of a name, so it compares
+        # like a tuple of the parts while costing a single string.
+        middlenames = " ".join(self.__actor_full_name.split()[1:-1])
+        self.__sort_key = (fold("\0".join((self.__firstname, self.__lastname, middlenames))), self.__actor_full_name)
+
+    @property
+    def sort_key(self) -> tuple:
+        # None for an actor without a name.
+        return self.__sort_key
+
+    @property
+    def names_count(self):
+        # Counted from the full name when asked for rather than stored on every actor.
+        if self.__actor_full_name is None:
+            return None
+        return self.__actor_full_name.count(" ") + 1
+
+    @property
+    def colleague_dict(self) -> dict:
+        # Built around the colleague list on demand; the key is this actor's repr, as it always was.
+        if self.__colleagues is None:
+            self.__colleagues = []
+        return {f"{self.__repr__()}": self.__colleagues}
 
     def check_if_this_actor_worked_with(self, colleague):
-        if colleague.actor_full_name in self.colleague_dict[self.__repr__()]:
+        if self.__colleagues is not None and colleague.actor_full_name in self.__colleagues:
             return True
-        elif self.actor_full_name in colleague.colleague_dict[colleague.__repr__()]:
+        elif colleague.__colleagues is not None and self.actor_full_name in colleague.__colleagues:
             return True
         else:
             return False
 
     def add_actor_colleague(self, colleague):
-        if colleague.actor_full_name not in self.colleague_dict.values():
-            self.colleague_dict[self.__repr__()].append(colleague.actor_full_name)
+        if colleague.actor_full_name not in self.colleague_dict[self.__repr__()]:
+            self.__colleagues.append(colleague.actor_full_name)
 
-        if self.actor_full_name not in colleague.colleague_dict.values():
-            colleague.colleague_dict[colleague.__repr__()].append(self.actor_full_name)
+        if self.actor_full_name not in colleague.colleague_dict[colleague.__repr__()]:
+            colleague.__colleagues.append(self.actor_full_name)
 
     @property
     def actor_full_name(self) -> str:
@@ -54,33 +86,20 @@ class Actor:
         return f"<Actor {self.__actor_full_name}>"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return self.__actor_full_name == other.__actor_full_name
 
     def __lt__(self, other):
-        # The following code is duplicated in the Actor class
-        # Consider moving the following into a separate function or method accessible to both classes
-        # Duplicate code start:
-        name_list = [self, other]
-        if hasattr(self, "firstname") and hasattr(other, "firstname"):
-            if self.firstname != other.firstname:
-                name_list.sort(key=lambda x: x.firstname)
-            elif self.lastname != other.lastname:
-                name_list.sort(key=lambda x: x.lastname)
-            else:
-                if self.middlenames.lower() == other.middlenames.lower():
-                    name_list.sort(key=lambda x: x.middlenames)
-        if self == name_list[0]:
-            return True
-        else:
-            return False
-            # Duplicate code end
+        if self.__sort_key is None or other.__sort_key is None:
+            # A nameless actor sorts before every named one.
+            return self.__sort_key is None and other.__sort_key is not None
+        return self.__sort_key < other.__sort_key
 
     def __hash__(self):
-        if hasattr(self, "firstname"):
-            hash_string = f"{self.firstname[0]}{self.lastname}-{self.firstname}{self.lastname}-{self.__actor_full_name}"
-            return hash(hash_string)
-        else:
-            return None
+        # Equal actors have equal full names, and a string caches its own hash.
+        return hash(self.__actor_full_name)
+
     @property
     def firstname(self):
         return self.__firstname
@@ -92,10 +111,22 @@ class Actor:
     @lastname.setter
     def lastname(self, value):
         self.__lastname = value
+        if self.__sort_key is not None:
+            self.update_keys()
 
     @firstname.setter
     def firstname(self, value):
         self.__firstname = value
+        if self.__sort_key is not None:
+            self.update_keys()
+
+    @property
+    def middlenames(self):
+        return self.__middlenames
+
+    @middlenames.setter
+    def middlenames(self, value):
+        self.__middlenames = value
 
 
 # noinspection DuplicatedCode
@@ -124,8 +155,9 @@ class TestActorMethods:
         assert actor4.actor_full_name is None
         assert actor1.firstname == "Taika"
         assert actor13.lastname == "Tarantino"
-        assert actor14.__lt__(actor12) == "Possible duplicate"
-        assert actor2.__lt__(actor4) is None
+        # Names equal but for case are ordered by the full name itself.
+        assert actor14.__lt__(actor12) is False
+        assert actor2.__lt__(actor4) is False and actor2.__lt__(actor1) is True and actor1.__lt__(actor2) is False
         assert actor7.actor_full_name == "Edgar Allan Poe"
         assert actor7.firstname == "Edgar"
         assert actor7.names_count == 3
@@ -134,7 +166,7 @@ class TestActorMethods:
         assert actor4.__eq__(actor4) is True
         assert actor4.__eq__(actor1) is False
         assert actor1.__lt__(actor6) is True  # [actor1.actor_full_name, actor6.actor_full_name]
-        assert actor9.__lt__(actor10) == "Possible duplicate"
+        assert actor9.__lt__(actor10) is True
         assert actor10.__lt__(actor11) is True  # == [actor10.actor_full_name, actor11.actor_full_name]
         assert actor11.__lt__(actor12) is False  # == [actor12.actor_full_name, actor11.actor_full_name]
         assert actor5.__lt__(actor1) is True  # == [actor5.actor_full_name, actor1.actor_full_name]
@@ -0,0 +1,27 @@
+import unicodedata
+
+
+def fold(text) -> str:
+    """Case- and accent-insensitive form of text, e.g. "Adèle" -> "adele"; None folds to ""
+
+    Sorting by the folded form puts "La vie d'Adèle" among the other L titles instead of after every
+    unaccented one, which is where plain code point order leaves it.
+    """
+    if text is None:
+        return ""
+    if text.isascii():
+        return text.casefold()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return "".join(character for character in decomposed if not unicodedata.combining(character)).casefold()
+
+
+class TestCollation:
+
+    def test_fold(self):
+        assert fold("La vie d'Adèle") == "la vie d'adele"
+        assert fold("Björn Søgaard") == "bjorn søgaard"
+        assert fold(None) == ""
+
+    def test_accented_titles_sort_with_their_letter(self):
+        titles = ["Zootopia", "Éclair", "Amélie", "apollo 13", "Ed Wood"]
+        assert sorted(titles, key=fold) == ["Amélie", "apollo 13", "Éclair", "Ed Wood", "Zootopia"]
@@ -1,18 +1,20 @@
-
+from appl.domainmodel.collation import fold
 
 
 class Director:
     __director_full_name: str
     __director_url: str
 
+    __slots__ = ('__director_full_name', '__director_url', '__director_id', '__firstname', '__middlenames',
+                 '__lastname', '__sort_key')
+
     def __init__(self, director_full_name: str):
+        self.__sort_key = None
         self.director_url = ""
         if director_full_name == "" or type(director_full_name) is not str or director_full_name == "\n":
             self.__director_full_name = None
         else:
             self.__director_full_name = director_full_name.strip()
-            # check for multiple names
-            self.names_count = self.__director_full_name.count(" ") + 1
             # assign first and last names
             if self.names_count < 3:
                 if " " in self.__director_full_name:
@@ -30,18 +32,54 @@ class Director:
                                    director_full_name.find(" ") + 1: self.__director_full_name.rfind("")]
                 self.lastname = self.__director_full_name[self.__director_full_name.rfind(" ") + 1:]
             self.director_url = director_full_name.replace(" ", "_")
+            self.update_keys()
         self.__director_id = self.__hash__()
-        self.__firstname = self.firstname
-        self.__lastname = self.lastname
 
+    def update_keys(self):
+        """Recomputes the sort key: first, last, then middle names, compared accent- and case-folded"""
+        # Laid out as in Actor.update_keys.
+        middlenames = " ".join(self.__director_full_name.split()[1:-1])
+        self.__sort_key = (fold("\0".join((self.__firstname, self.__lastname, middlenames))),
+                           self.__director_full_name)
+
+    @property
+    def sort_key(self) -> tuple:
+        return self.__sort_key
 
     @property
     def firstname(self):
         return self.__firstname
 
+    @firstname.setter
+    def firstname(self, value):
+        self.__firstname = value
+        if self.__sort_key is not None:
+            self.update_keys()
+
     @property
     def lastname(self):
         return self.__lastname
+
+    @lastname.setter
+    def lastname(self, value):
+        self.__lastname = value
+        if self.__sort_key is not None:
+            self.update_keys()
+
+    @property
+    def middlenames(self):
+        return self.__middlenames
+
+    @middlenames.setter
+    def middlenames(self, value):
+        self.__middlenames = value
+
+    @property
+    def names_count(self):
+        if self.__director_full_name is None:
+            return None
+        return self.__director_full_name.count(" ") + 1
+
     @property
     def director_id(self):
         return self.__director_id
@@ -62,34 +100,18 @@ class Director:
         return f"<Director {self.__director_full_name}>"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return self.__director_full_name == other.__director_full_name
 
-    # noinspection DuplicatedCode
     def __lt__(self, other):
-        # The following code is duplicated in the Actor class
-        # Consider moving the following into a separate function or method accessible to both classes
-        # Duplicate code start:
-        name_list = [self, other]
-        if hasattr(self, "firstname") and hasattr(other, "firstname"):
-            if self.firstname != other.firstname:
-                name_list.sort(key=lambda x: x.firstname)
-            elif self.lastname != other.lastname:
-                name_list.sort(key=lambda x: x.lastname)
-            else:
-                if self.middlenames.lower() == other.middlenames.lower():
-                    name_list.sort(key=lambda x: x.middlenames)
-            if self == name_list[0]:
-                return True
-            else:
-                return False
-            # Duplicate code end
+        if self.__sort_key is None or other.__sort_key is None:
+            # A nameless director sorts before every named one.
+            return self.__sort_key is None and other.__sort_key is not None
+        return self.__sort_key < other.__sort_key
 
     def __hash__(self):
-        if hasattr(self, "firstname"):
-            hash_string = f"{self.firstname[0]}.{self.lastname[0]}-{self.firstname}{self.lastname}"
-            return hash(hash_string)
-        else:
-            return None
+        return hash(self.__director_full_name)
 
 
 # noinspection DuplicatedCode
@@ -119,7 +141,7 @@ class TestDirectorMethods:
         assert director4.director_full_name is None
         assert director1.firstname == "Taika"
         assert director13.lastname == "Tarantino"
-        assert director2.__lt__(director4) is None
+        assert director2.__lt__(director4) is False and director2.__lt__(director1) is True
         assert director7.director_full_name == "Edgar Allan Poe"
         assert director7.firstname == "Edgar"
         assert director7.names_count == 3
@@ -1,47 +1,61 @@
+from appl.domainmodel.collation import fold
+
+
 class Genre:
     __genre_name: str
 
+    __slots__ = ('__genre_name', '__subgenres', '__sort_key')
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str or genre_name == "\n":
             self.__genre_name = None
         else:
             sanitized_genre_name = genre_name.strip()
-            self.genre_list = sanitized_genre_name.split(",")
-            self.__genre_name = self.genre_list[0]
-            if len(self.genre_list) > 1:
-                self.subgenres = self.genre_list[1:]
+            genre_list = sanitized_genre_name.split(",")
+            self.__genre_name = genre_list[0]
+            if len(genre_list) > 1:
+                self.__subgenres = genre_list[1:]
+        self.update_keys()
+
+    def update_keys(self):
+        """Recomputes the sort key; genres without a name sort after all the others"""
+        if self.__genre_name is None:
+            self.__sort_key = (1,)
+        else:
+            self.__sort_key = (0, fold(self.__genre_name), self.__genre_name, getattr(self, "subgenres", []))
+
+    @property
+    def sort_key(self) -> tuple:
+        return self.__sort_key
 
     @property
     def genre_name(self) -> str:
         return self.__genre_name
 
+    @property
+    def subgenres(self) -> list:
+        # Unset unless the name listed subgenres, so hasattr(genre, "subgenres") still tells the two apart.
+        return self.__subgenres
+
+    @property
+    def genre_list(self) -> list:
+        if self.__genre_name is None:
+            return []
+        return [self.__genre_name] + getattr(self, "subgenres", [])
+
     def __repr__(self):
         return f"<Genre {self.__genre_name}>"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return self.__genre_name == other.__genre_name
 
-    # noinspection PyUnboundLocalVariable
     def __lt__(self, other):
-        genre_list = [self, other]
-        if hasattr(self, "genre_name") and self.genre_name is not None \
-                and hasattr(other, "genre_name") and other.genre_name is not None:
-            if self.__genre_name != other.__genre_name:
-                genre_list.sort(key=lambda x: x.__genre_name)
-            elif self.subgenres != other.subgenres:
-                genre_list.sort(key=lambda x: x.subgenres)
-        if self == genre_list[0]:
-            return True
-        else:
-            return False
+        return self.__sort_key < other.__sort_key
 
     def __hash__(self):
-        if hasattr(self, "genre_name"):
-            has_subgenres = hasattr(self, "subgenres")
-            hash_string = f"{self.genre_name} - {has_subgenres}"
-            return hash(hash_string)
-        else:
-            return None
+        return hash(self.__genre_name)
 
 
 # noinspection PyUnusedLocal,PyUnusedLocal
@@ -1,5 +1,7 @@
 from appl.domainmodel.actor import Actor
+from appl.domainmodel.collation import fold
 from appl.domainmodel.director import Director
+from appl.domainmodel.ordered_set import OrderedSet
 
 """
 Check all arguments and return types
@@ -20,8 +22,17 @@ class Movie:
     __genres: list
     __description: str
     __rank: int
+    __rating: float
+    __votes: int
+    __revenue_millions: float
+    __metascore: int
+
+    __slots__ = ('__title', '__director', '__actors', '__runtime_minutes', '__genres', '__description',
+                 '__release_year', '__id', '__rank', '__rating', '__votes', '__revenue_millions', '__metascore',
+                 '__sort_key')
 
     def __init__(self, title: str, release_year: int):
+        self.__sort_key = None
         self.__director = None
         self.__actors = None
         self.__runtime_minutes = None
@@ -29,6 +40,11 @@ class Movie:
         self.__description = None
         self.__release_year = None
         self.__id = None
+        self.__rank = None
+        self.__rating = None
+        self.__votes = None
+        self.__revenue_millions = None
+        self.__metascore = None
 
         if title == "" or type(title) is not str or title == "\n":
             self.__title = None
@@ -40,8 +56,32 @@ class Movie:
                 self.release_year = release_year
             else:
                 self.release_year = None
-        self.__release_year = self.release_year
-        self.__id = self.__title + str(self.release_year)
+        self.update_keys()
+
+    def update_keys(self):
+        """Recomputes the id and sort key, which are kept rather than rebuilt on every hash or comparison"""
+        self.__id = self.__title + str(self.__release_year)
+        self.__sort_key = (fold(self.__title), self.__title, self.__release_year or 0)
+
+    @property
+    def movie_id(self) -> str:
+        return self.__id
+
+    @property
+    def sort_key(self) -> tuple:
+        # Accent- and case-folded title, then the title itself and the release year to break ties.
+        return self.__sort_key
+
+    @property
+    def release_year(self):
+        return self.__release_year
+
+    @release_year.setter
+    def release_year(self, new_release_year):
+        self.__release_year = new_release_year
+        if self.__sort_key is not None:
+            self.update_keys()
+
     @property
     def director(self):
         return self.__director.__repr__()
@@ -67,6 +107,42 @@ class Movie:
         if isinstance(new_rank, int):
             self.__rank = new_rank
 
+    @property
+    def rating(self):
+        return self.__rating
+
+    @rating.setter
+    def rating(self, new_rating):
+        if isinstance(new_rating, (int, float)):
+            self.__rating = float(new_rating)
+
+    @property
+    def votes(self):
+        return self.__votes
+
+    @votes.setter
+    def votes(self, new_votes):
+        if isinstance(new_votes, int):
+            self.__votes = new_votes
+
+    @property
+    def revenue_millions(self):
+        return self.__revenue_millions
+
+    @revenue_millions.setter
+    def revenue_millions(self, new_revenue_millions):
+        if isinstance(new_revenue_millions, (int, float)):
+            self.__revenue_millions = float(new_revenue_millions)
+
+    @property
+    def metascore(self):
+        return self.__metascore
+
+    @metascore.setter
+    def metascore(self, new_metascore):
+        if isinstance(new_metascore, int):
+            self.__metascore = new_metascore
+
     @property
     def description(self):
         if self.__description is None:
@@ -86,7 +162,7 @@ class Movie:
 
     @actors.setter
     def actors(self, new_actors):
-        self.__actors.append(new_actors)
+        self.add_actor(new_actors)
 
     @property
     def genres(self):
@@ -94,7 +170,7 @@ class Movie:
 
     @genres.setter
     def genres(self, new_genres):
-        self.__genres = new_genres
+        self.__genres = None if new_genres is None else OrderedSet(new_genres)
 
     @property
     def runtime_minutes(self):
@@ -130,61 +206,43 @@ class Movie:
         return f"<Movie {self.__title}, {self.release_year}>"
 
     def __eq__(self, other):
-        return self.__repr__() == other.__repr__()
+        if not isinstance(other, Movie):
+            return False
+        return self.__title == other.__title and self.__release_year == other.__release_year
 
     def __lt__(self, other):
-        if hasattr(self, "title") and hasattr(other, "title") \
-                and hasattr(self, "release_year") and hasattr(other, "release_year"):
-            movie_list = [self, other]
-            if self.title != other.title:
-                movie_list.sort(key=lambda x: x.title)
-                if self == movie_list[0]:
-                    return True
-                else:
-                    return False
-            else:
-                if self.release_year != other.release_year:
-                    movie_list.sort(key=lambda x: x.release_year)
-                    if self == movie_list[0]:
-                        return True
-                    else:
-                        return False
+        return self.__sort_key < other.__sort_key
 
     def __hash__(self):
-        hash_string = self.__title + str(self.release_year)
-        return hash(hash_string)
+        # The id is the title and year in one string, and a string caches its own hash.
+        return hash(self.__id)
 
     def add_actor(self, new_actor):
+        # The cast and genres stay None until the first one is added, then are OrderedSets, which keep billing order
+        # and make these membership checks constant time.
         if self.__actors is None:
-            self.__actors = list()
-            self.__actors.append(new_actor)
-        else:
-            if self.__actors is not None and new_actor not in self.__actors:
-                self.__actors.append(new_actor)
+            self.__actors = OrderedSet()
+        self.__actors.add(new_actor)
 
     def remove_actor(self, actor_to_remove):
-        if self.__actors is not None and actor_to_remove in self.__actors:
-            self.__actors.remove(actor_to_remove)
-        # else:
-        #     print(f"Actor {actor_to_remove} is not present in this movie")
+        if self.__actors is not None:
+            self.__actors.discard(actor_to_remove)
 
     def add_genre(self, genre_to_add):
         if self.__genres is None:
-            self.__genres = list()
-            self.__genres.append(genre_to_add)
-        else:
-            if self.__genres is not None and genre_to_add not in self.__genres:
-                self.__genres.append(genre_to_add)
+            self.__genres = OrderedSet()
+        self.__genres.add(genre_to_add)
 
     def remove_genre(self, genres_to_remove):
-        if self.__genres is not None and genres_to_remove in self.__genres:
-            self.__genres.remove(genres_to_remove)
-        # else:
-        #     print(f"Genre {genres_to_remove} is not present in this movie")
+        if self.__genres is not None:
+            self.__genres.discard(genres_to_remove)
 
     def get_title(self):
         return self.__title
 
+    def get_director(self):
+        return self.__director
+
 
 # noinspection SpellCheckingInspection
 class TestMovieMethods:
@@ -209,3 +267,12 @@ class TestMovieMethods:
         assert movie.runtime_minutes is None
         movie.runtime_minutes = 107
         assert movie.runtime_minutes == 107
+
+    def test_sort_order_ignores_accents_and_case(self):
+        movies = [Movie("Zootopia", 2016), Movie("La vie d'Adèle", 2013), Movie("Éclair", 2001),
+                  Movie("la La Land", 2016), Movie("Zootopia", 1999)]
+        assert [repr(movie) for movie in sorted(movies)] == ["<Movie Éclair, 2001>", "<Movie la La Land, 2016>",
+                                                             "<Movie La vie d'Adèle, 2013>", "<Movie Zootopia, 1999>",
+                                                             "<Movie Zootopia, 2016>"]
+        assert sorted(movies) == sorted(movies, key=lambda movie: movie.sort_key)
+        assert len({Movie("Moana", 2016), Movie("Moana", 2016), Movie("Moana", 2017)}) == 2
@@ -0,0 +1,98 @@
+SMALL_SET_SIZE = 8
+
+
+class OrderedSet:
+    """Insertion-ordered set with constant-time add, remove and membership tests
+
+    A movie's cast stays in billing order and its genres in the order they were listed. Up to SMALL_SET_SIZE items
+    are held in a tuple, which is smaller than a list and scanned in bounded time; a larger set moves to a dict,
+    whose keys keep insertion order and are looked up by hash. Items are the interned entities themselves (see
+    EntityRegistry), so a member costs one reference and the cached hash of its name.
+    """
+
+    __slots__ = ('__items',)
+
+    def __init__(self, items=()):
+        self.__items = ()
+        for item in items:
+            self.add(item)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self.__items)!r})"
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __contains__(self, item):
+        return item in self.__items
+
+    def __getitem__(self, index):
+        # Positions are kept by the tuple; a large set has to walk its dict to reach one.
+        if isinstance(self.__items, dict):
+            return list(self.__items)[index]
+        return self.__items[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (OrderedSet, list, tuple)):
+            return list(self.__items) == list(other)
+        return NotImplemented
+
+    # Mutable, so unhashable like list and set.
+    __hash__ = None
+
+    def add(self, item) -> bool:
+        """Appends item unless an equal item is already present; returns whether it was added"""
+        items = self.__items
+        if item in items:
+            return False
+        if isinstance(items, dict):
+            items[item] = None
+        elif len(items) < SMALL_SET_SIZE:
+            self.__items = items + (item,)
+        else:
+            self.__items = dict.fromkeys(items + (item,))
+        return True
+
+    def remove(self, item):
+        if item not in self.__items:
+            raise KeyError(item)
+        self.__drop(item)
+
+    def discard(self, item):
+        if item in self.__items:
+            self.__drop(item)
+
+    def __drop(self, item):
+        items = self.__items
+        if isinstance(items, dict):
+            del items[item]
+        else:
+            position = items.index(item)
+            self.__items = items[:position] + items[position + 1:]
+
+
+class TestOrderedSet:
+
+    def test_keeps_insertion_order_and_ignores_duplicates(self):
+        ordered = OrderedSet(["c", "a", "b", "a"])
+        assert list(ordered) == ["c", "a", "b"]
+        assert ordered == ["c", "a", "b"] and ordered[0] == "c" and ordered[-1] == "b"
+        assert ordered.add("c") is False and ordered.add("d") is True
+        ordered.remove("a")
+        assert ordered == OrderedSet(["c", "b", "d"]) and "a" not in ordered
+
+    def test_large_sets_keep_order(self):
+        count = SMALL_SET_SIZE * 3
+        ordered = OrderedSet(range(count))
+        assert list(ordered) == list(range(count)) and ordered[SMALL_SET_SIZE + 1] == SMALL_SET_SIZE + 1
+        ordered.discard(0)
+        ordered.discard(0)
+        assert len(ordered) == count - 1 and 0 not in ordered and count - 1 in ordered
+        try:
+            ordered.remove(0)
+            assert False, "removing a missing item should raise"
+        except KeyError:
+            pass
@@ -9,7 +9,9 @@ class Review:
     __review_text: str
     __rating: int
     __timestamp: str
-    __movie_title = str
+    __movie_title: str
+
+    __slots__ = ('__review_id', '__movie', '__review_text', '__rating', '__timestamp', '__movie_title')
 
     def __init__(self, movie, review_text: str, rating: int):
         self.__timestamp = datetime.now()
@@ -1,26 +1,28 @@
 from datetime import datetime
 
 from appl.domainmodel.movie import Movie
+from appl.domainmodel.viewing_log import ViewingLog
 from werkzeug.security import generate_password_hash
 
 
 class User:
     __username: str
     __password: str
-    __watched_movies: list
     __reviews: list
-    __time_spent_watching_movies_minutes: int
-    __complete_viewing_history: dict
+    __viewing_log: ViewingLog
     __user_id: int
 
     __user_first_name: str
     __user_last_name: str
     __user_age: int
     __user_email: str
-    __user_consent = bool
+    __user_consent: bool
+
+    __slots__ = ('__username', '__password', '__reviews', '__viewing_log', '__user_id', '__timestamp',
+                 '__user_first_name', '__user_last_name', '__user_age', '__user_email', '__user_consent')
 
     def __init__(self, username: str, password: str, id: str, first_name: str, last_name: str, age: int,
-                 email: str, consent: bool):
+                 email: str, consent: bool, password_is_hashed: bool = False):
         if username is None or not isinstance(username, str) or username == "" or username == "\n":
             self.__username = None
         else:
@@ -28,11 +30,11 @@ class User:
             self.__username = username.lower()
         if password is None or not isinstance(password, str) or password == "\n" or password == "":
             self.__password = None
+        elif password_is_hashed:
+            # Already a werkzeug hash (e.g. from a bulk import), so it is stored as given rather than hashed twice.
+            self.__password = password
         else:
             self.__password = generate_password_hash(password, method='pbkdf2:sha256', salt_length=16)
-        self.__complete_viewing_history = {"Complete history": [], "Total viewing time": 0, "Unique movies viewed": [],
-                                           "Reviews": []}
-
         if id is None:
             self.__timestamp = datetime.now()
             self.__user_id = hash(f"{self.__username}")
@@ -43,9 +45,9 @@ class User:
         self.__user_age = age
         self.__user_email = email
         self.__user_consent = consent
-        self.__watched_movies = []
         self.__reviews = []
-        self.__time_spent_watching_movies_minutes = 0
+        # Created by the first watch_movie, so a user who has watched nothing carries no log.
+        self.__viewing_log = None
 
     # @property
     # def username(self):
@@ -149,14 +151,32 @@ class User:
         return self.__user_id
 
     @property
-    def watched_movies(self):
-        return self.__watched_movies
+    def viewing_log(self) -> ViewingLog:
+        # None until the first watch_movie. A user loaded from the database never ran __init__, so the slot may not
+        # be set either.
+        return getattr(self, '_User__viewing_log', None)
+
+    @property
+    def watched_movies(self) -> list:
+        log = self.viewing_log
+        return [] if log is None else log.unique_movies
 
     @watched_movies.setter
     def watched_movies(self, new_watched_movies):
+        # Replaces the log with the given movies, each taken once however often it is listed. A movie already in the
+        # log keeps its viewings and their times; any other is recorded as one viewing watched now, so it counts
+        # towards today in the log's minutes_by_day.
         if isinstance(new_watched_movies, list):
-            self.__watched_movies = new_watched_movies
-            self.__complete_viewing_history["Unique movies viewed"] = new_watched_movies
+            viewings = dict()
+            for movie, watched_at in self.viewing_log.views() if self.viewing_log is not None else ():
+                viewings.setdefault(movie.movie_id, []).append(watched_at)
+            log = ViewingLog()
+            for movie in new_watched_movies:
+                if not isinstance(movie, Movie) or movie in log:
+                    continue
+                for watched_at in viewings.get(movie.movie_id, [None]):
+                    log.record(movie, watched_at)
+            self.__viewing_log = log if len(log) else None
 
     @property
     def reviews(self):
@@ -168,22 +188,16 @@ class User:
             self.__reviews = new_review_list
 
     @property
-    def time_spent_watching_movies_minutes(self):
-        return self.__time_spent_watching_movies_minutes
-
-    @time_spent_watching_movies_minutes.setter
-    def time_spent_watching_movies_minutes(self, replacement_time):
-        if replacement_time >= 0:
-            self.__time_spent_watching_movies_minutes = replacement_time
+    def time_spent_watching_movies_minutes(self) -> int:
+        log = self.viewing_log
+        return 0 if log is None else log.total_minutes
 
     @property
-    def complete_viewing_history(self):
-        return self.__complete_viewing_history
-
-    @complete_viewing_history.setter
-    def complete_viewing_history(self, new_viewing_history):
-        if new_viewing_history is not None and isinstance(new_viewing_history, dict):
-            self.__complete_viewing_history = new_viewing_history
+    def complete_viewing_history(self) -> dict:
+        # Built from the viewing log in the layout this dict always had; read the log itself for anything large.
+        log = self.viewing_log or ViewingLog()
+        return {"Complete history": [movie for movie, _ in log.views()], "Total viewing time": log.total_minutes,
+                "Unique movies viewed": log.unique_movies, "Reviews": list(self.__reviews)}
 
     def __repr__(self):
         return f"<User {self.__username}>"
@@ -200,23 +214,47 @@ class User:
     def __hash__(self):
         return hash(self.username)
 
-    def watch_movie(self, movie: Movie):
-        if movie not in self.__watched_movies:
-            self.__watched_movies.append(movie)
-            self.__time_spent_watching_movies_minutes += movie.runtime_minutes
-            self.__complete_viewing_history["Complete history"].append(movie)
-            self.__complete_viewing_history["Total viewing time"] += self.__time_spent_watching_movies_minutes
-            self.__complete_viewing_history["Unique movies viewed"].append(movie)
-        else:
-            self.__time_spent_watching_movies_minutes += movie.runtime_minutes
-            self.__complete_viewing_history["Complete history"].append(movie)
-            self.__complete_viewing_history["Total viewing time"] += self.__time_spent_watching_movies_minutes
-            self.__complete_viewing_history["Unique movies viewed"].append(movie)
+    def watch_movie(self, movie: Movie, watched_at: datetime = None):
+        if not isinstance(movie, Movie):
+            return
+        if self.viewing_log is None:
+            self.__viewing_log = ViewingLog()
+        self.__viewing_log.record(movie, watched_at)
 
     def add_review(self, review_to_add):
         if review_to_add not in self.__reviews:
             self.__reviews.append(review_to_add)
-            self.__complete_viewing_history["Reviews"].append(review_to_add)
+
+
+class TestUserViewingLog:
+
+    @staticmethod
+    def user() -> 'User':
+        return User("moana", "hashed", None, "Moana", "Waialiki", 16, "moana@motunui.example", True,
+                    password_is_hashed=True)
+
+    def test_reading_creates_no_log(self):
+        user = self.user()
+        assert user.watched_movies == [] and user.time_spent_watching_movies_minutes == 0
+        assert user.complete_viewing_history["Total viewing time"] == 0
+        assert user.viewing_log is None
+        user.watch_movie(Movie("Ice Age", 2002))
+        assert user.watched_movies == [Movie("Ice Age", 2002)]
+
+    def test_replacing_watched_movies_keeps_earlier_viewings(self):
+        user = self.user()
+        ice_age, moana = Movie("Ice Age", 2002), Movie("Moana", 2016)
+        ice_age.runtime_minutes, moana.runtime_minutes = 81, 107
+        first_day, second_day = datetime(2020, 3, 1, 20), datetime(2020, 3, 2, 21)
+        user.watch_movie(ice_age, first_day)
+        user.watch_movie(ice_age, second_day)
+        user.watched_movies = [moana, ice_age, moana, ice_age]
+        assert user.watched_movies == [moana, ice_age] and user.time_spent_watching_movies_minutes == 107 + 81 * 2
+        assert len(user.viewing_log) == 3
+        assert user.viewing_log.minutes_by_day(first_day.date()) == 81
+        assert user.viewing_log.minutes_by_day(datetime.now().date()) == 107
+        user.watched_movies = []
+        assert user.viewing_log is None
 
 #
 # user0 = User("slowloris", "One Direction is da best musik")
@@ -0,0 +1,117 @@
+from array import array
+from datetime import date, datetime
+
+from appl.domainmodel.genre import Genre
+from appl.domainmodel.movie import Movie
+
+
+class ViewingLog:
+    """Append-only record of the movies a user watched and when, with running totals of the minutes watched
+
+    Each distinct movie gets a small integer code the first time it is watched; a viewing is then one code and one
+    epoch timestamp in two typed arrays, 12 bytes however often the movie is rewatched. The code dict doubles as
+    the set of movies watched. Total minutes and minutes per day and per genre are updated as each viewing is
+    recorded, so a profile page reads them without replaying the log.
+    """
+
+    __codes: dict
+    __movies: list
+    __viewed: array
+    __viewed_at: array
+    __total_minutes: int
+    __minutes_by_day: dict
+    __minutes_by_genre: dict
+
+    __slots__ = ('__codes', '__movies', '__viewed', '__viewed_at', '__total_minutes', '__minutes_by_day',
+                 '__minutes_by_genre')
+
+    def __init__(self):
+        # movie id -> code, and code -> movie
+        self.__codes = dict()
+        self.__movies = []
+        self.__viewed = array('I')
+        self.__viewed_at = array('q')
+        self.__total_minutes = 0
+        self.__minutes_by_day = dict()
+        self.__minutes_by_genre = dict()
+
+    def __repr__(self):
+        return f"<ViewingLog {len(self.__viewed)} viewings of {len(self.__movies)} movies>"
+
+    def __len__(self):
+        return len(self.__viewed)
+
+    def __contains__(self, movie):
+        return isinstance(movie, Movie) and movie.movie_id in self.__codes
+
+    def record(self, movie: Movie, watched_at: datetime = None):
+        if not isinstance(movie, Movie):
+            return
+        watched_at = datetime.now() if watched_at is None else watched_at
+        code = self.__codes.get(movie.movie_id)
+        if code is None:
+            code = self.__codes[movie.movie_id] = len(self.__movies)
+            self.__movies.append(movie)
+        self.__viewed.append(code)
+        self.__viewed_at.append(int(watched_at.timestamp()))
+        minutes = movie.runtime_minutes or 0
+        self.__total_minutes += minutes
+        day = watched_at.date()
+        self.__minutes_by_day[day] = self.__minutes_by_day.get(day, 0) + minutes
+        for genre in movie.genres or ():
+            name = genre.genre_name if isinstance(genre, Genre) else genre
+            self.__minutes_by_genre[name] = self.__minutes_by_genre.get(name, 0) + minutes
+
+    @property
+    def unique_movies(self) -> list:
+        """The movies watched, each once, in the order they were first watched"""
+        return list(self.__movies)
+
+    @property
+    def total_minutes(self) -> int:
+        return self.__total_minutes
+
+    def views(self):
+        """Yields (movie, watched at) for every viewing, oldest first"""
+        movies = self.__movies
+        for code, timestamp in zip(self.__viewed, self.__viewed_at):
+            yield movies[code], datetime.fromtimestamp(timestamp)
+
+    def minutes_by_day(self, day: date = None):
+        if day is None:
+            return dict(self.__minutes_by_day)
+        return self.__minutes_by_day.get(day, 0)
+
+    def minutes_by_genre(self, genre=None):
+        if genre is None:
+            return dict(self.__minutes_by_genre)
+        return self.__minutes_by_genre.get(genre.genre_name if isinstance(genre, Genre) else genre, 0)
+
+
+class TestViewingLog:
+
+    def test_record_and_rollups(self):
+        comedy, drama = Genre("Comedy"), Genre("Drama")
+        moana, ice_age = Movie("Moana", 2016), Movie("Ice Age", 2002)
+        moana.runtime_minutes, ice_age.runtime_minutes = 107, 81
+        moana.add_genre(comedy)
+        ice_age.add_genre(comedy)
+        ice_age.add_genre(drama)
+        log = ViewingLog()
+        first_day, second_day = datetime(2020, 3, 1, 20, 30), datetime(2020, 3, 2, 21)
+        log.record(moana, first_day)
+        log.record(ice_age, first_day)
+        log.record(moana, second_day)
+        log.record("not a movie", second_day)
+        assert len(log) == 3 and log.unique_movies == [moana, ice_age]
+        assert Movie("Moana", 2016) in log and Movie("Moana", 2017) not in log
+        assert list(log.views()) == [(moana, first_day), (ice_age, first_day), (moana, second_day)]
+        assert log.total_minutes == 107 * 2 + 81
+        assert log.minutes_by_day() == {first_day.date(): 188, second_day.date(): 107}
+        assert log.minutes_by_genre(comedy) == 295 and log.minutes_by_genre("Drama") == 81
+        assert log.minutes_by_genre("Horror") == 0
+
+    def test_movie_without_runtime_or_genres(self):
+        log = ViewingLog()
+        log.record(Movie("Untimed", 2000))
+        assert log.total_minutes == 0 and log.minutes_by_genre() == {} and len(log) == 1
@@ -1,136 +1,209 @@
+import time
+from collections import deque
+from collections.abc import Iterable
+
 from appl.domainmodel.movie import Movie
-from datetime import *
 
+# The most recent changes a watchlist remembers; each one past this overwrites the oldest.
+CHANGE_HISTORY_SIZE = 64
+# Watchlists replaced through the watchlist setter that are kept in past_watchlists.
+PAST_WATCHLISTS_SIZE = 4
+# Operations in the change history records.
+ADDED = 'add'
+REMOVED = 'remove'
+RESET = 'reset'
 
-class Watchlist:
-    __watchlist: list
-    __size: int
-    __watchlist_id: int
-    __change_history: dict
-    __past_watchlists: dict
 
-    def __init__(self):
-        self.__watchlist = []
-        self.__size = len(self.__watchlist)
-        self.__watchlist_id = id(self)
-        self.__change_history = {"Additions": [], "Deletions": [], "Resets": []}
-        self.__past_watchlists = {}
+class Watchlist:
+    """Movies a user means to watch, in the order they were added
 
-    @property
-    def watchlist(self):
-        return self.__watchlist
+    The movies are kept in a plain list, so a positional lookup is a list index, and their ids in a set, so adding
+    and membership tests are O(1). Removing a movie is O(n): list.remove finds it and shifts the movies after it.
+    """
 
-    @watchlist.setter
-    def watchlist(self, new_watchlist):
-        if isinstance(new_watchlist, Watchlist):
-            if self.__watchlist is not None or len(self.__watchlist) == 0:
-                change_time = datetime.now().strftime("%d/%m%/Y at %H:%M:%S")
+    __movies: list
+    __movie_ids: set
+    __watchlist_id: int
+    __changes: list
+    __next_change: int
+    __past_watchlists: deque
 
-                self.__change_history["Resets"].append(change_time, self.__watchlist_id)
-                self.__past_watchlists[change_time] = (self.__watchlist, self.__watchlist_id, self.__size)
+    __slots__ = ('__movies', '__movie_ids', '__watchlist_id', '__changes', '__next_change',
+                 '__past_watchlists')
 
-            self.__watchlist = new_watchlist
+    def __init__(self, watchlist_id: int = None):
+        self.__movies = []
+        self.__movie_ids = set()
+        self.__watchlist_id = id(self) if watchlist_id is None else watchlist_id
+        self.__changes = []
+        self.__next_change = 0
+        self.__past_watchlists = None
 
     @property
-    def size(self):
-        return self.__size
+    def watchlist(self) -> list:
+        return list(self.__movies)
 
-    @size.setter
-    def size(self, new_size):
-        self.__size = new_size
+    @watchlist.setter
+    def watchlist(self, new_watchlist):
+        # Takes another Watchlist or any iterable of movies; anything else, None included, is ignored. The
+        # replaced movies are kept in past_watchlists.
+        if not isinstance(new_watchlist, Iterable) or isinstance(new_watchlist, str):
+            return
+        movies = list(new_watchlist)
+        if self.__movies:
+            if self.__past_watchlists is None:
+                self.__past_watchlists = deque(maxlen=PAST_WATCHLISTS_SIZE)
+            self.__past_watchlists.append((int(time.time()), tuple(self)))
+        self.__movies = []
+        self.__movie_ids = set()
+        self.__record(RESET, None)
+        for movie in movies:
+            self.add_movie(movie)
 
     @property
     def watchlist_id(self):
-        return self.watchlist_id
+        return self.__watchlist_id
 
     @property
-    def change_history(self):
-        return self.__change_history
+    def change_history(self) -> list:
+        """(operation, movie id, epoch seconds) records, oldest first, of the last CHANGE_HISTORY_SIZE changes"""
+        changes, start = self.__changes, self.__next_change
+        return changes[start:] + changes[:start]
 
     @property
-    def past_watchlists(self):
-        return self.__past_watchlists
+    def past_watchlists(self) -> list:
+        """(epoch seconds, movies) for the last PAST_WATCHLISTS_SIZE watchlists replaced through the setter"""
+        return list(self.__past_watchlists or ())
 
-    @property
     def __repr__(self):
         return f"<Watchlist {self.__watchlist_id}>"
 
     def __eq__(self, other):
-        if self.__size == other.__size:
-            return True
-        else:
+        if not isinstance(other, Watchlist):
             return False
+        return self.size() == other.size()
 
     def __lt__(self, other):
-        if self.__size < other.__size:
-            return True
-        else:
-            return False
+        return self.size() < other.size()
 
     def __hash__(self):
-        hash_string = ""
-        if self.__size > 0:
-            hash_string += [str(item) for item in sorted(self.__watchlist)]
-        else:
-            hash_string = str(self.__watchlist_id)
-        return hash(hash_string + str(self.__size))
+        # Consistent with __eq__, which compares sizes.
+        return hash(self.size())
+
+    def __len__(self):
+        return len(self.__movies)
 
     def __iter__(self):
-        self.index = 0
-        return self
+        return iter(self.__movies)
 
-    def __next__(self):
-        if self.index < self.__size - 1:
-            self.index += 1
-            return self.__watchlist[self.index]
-        else:
-            raise StopIteration
+    def __contains__(self, movie):
+        return isinstance(movie, Movie) and movie.movie_id in self.__movie_ids
 
     def add_movie(self, movie_to_add: Movie):
-        add_time = datetime.now().strftime("%d/%m%/Y at %H:%M:%S")
-        if self.__watchlist is None or movie_to_add not in self.__watchlist or len(self.__watchlist) == 0:
-            if isinstance(movie_to_add, Movie):
-                # noinspection PyUnresolvedReferences
-                self.__watchlist.append(movie_to_add)
-                self.__size += 1
-                self.__change_history["Additions"].append((movie_to_add.title, add_time))
-                # print(f"Movie {movie_to_add.title} is added to your watchlist!")
-            else:
-                pass
-        else:
-            pass
+        if not isinstance(movie_to_add, Movie) or movie_to_add.movie_id in self.__movie_ids:
+            return
+        self.__movie_ids.add(movie_to_add.movie_id)
+        self.__movies.append(movie_to_add)
+        self.__record(ADDED, movie_to_add.movie_id)
 
     def remove_movie(self, movie_to_remove: Movie):
-        if self.__watchlist is None or movie_to_remove not in self.__watchlist or len(self.__watchlist) == 0:
-            pass
-        else:
-            self.__watchlist.remove(movie_to_remove)
-            self.__size -= 1
-            while True:
-                user_confirm_removal = input(f"Are you sure you want to remove {movie_to_remove.title} "
-                                             f"from your watchlist? \nEnter Y to confirm and N to decline: ")
-                if user_confirm_removal.lower() == "y":
-                    self.__watchlist.remove(movie_to_remove)
-                    self.__size -= 1
-                    # print(f"{movie_to_remove.title} is removed from your watchlist")
-                    break
-                elif user_confirm_removal.lower() == "n":
-                    break
+        if not isinstance(movie_to_remove, Movie):
+            return
+        if movie_to_remove.movie_id not in self.__movie_ids:
+            return
+        self.__movie_ids.remove(movie_to_remove.movie_id)
+        self.__movies.remove(movie_to_remove)
+        self.__record(REMOVED, movie_to_remove.movie_id)
 
     def first_movie_in_watchlist(self):
-        if self.__watchlist is None or len(self.__watchlist) == 0:
-            pass
-        else:
-            return self.__watchlist[0]
+        return self.select_movie_to_watch(0)
 
     def select_movie_to_watch(self, movie_index):
         try:
-            return self.__watchlist[movie_index]
+            return self.__movies[movie_index]
         except IndexError:
             return None
 
     def size(self):
-        return len(self.__watchlist)
+        return len(self.__movies)
+
+    def __record(self, operation: str, movie_id):
+        # A list used as a ring buffer: it grows to CHANGE_HISTORY_SIZE and then overwrites its oldest record.
+        # A deque(maxlen=...) would do the same but allocates a 64-slot block for even the smallest watchlist.
+        change = (operation, movie_id, int(time.time()))
+        if len(self.__changes) < CHANGE_HISTORY_SIZE:
+            self.__changes.append(change)
+        else:
+            self.__changes[self.__next_change] = change
+            self.__next_change = (self.__next_change + 1) % CHANGE_HISTORY_SIZE
+
+
+class TestWatchlist:
+
+    def test_add_remove_and_positions(self):
+        watchlist = Watchlist()
+        movies = [Movie(f"Movie {number}", 2000 + number) for number in range(6)]
+        for movie in movies + [Movie("Movie 0", 2000), "not a movie"]:
+            watchlist.add_movie(movie)
+        assert watchlist.size() == len(watchlist) == 6 and movies[3] in watchlist
+        watchlist.remove_movie(movies[0])
+        watchlist.remove_movie(movies[3])
+        watchlist.remove_movie(movies[3])
+        assert movies[3] not in watchlist and watchlist.size() == 4
+        assert list(watchlist) == [movies[1], movies[2], movies[4], movies[5]] == watchlist.watchlist
+        assert watchlist.first_movie_in_watchlist() == movies[1]
+        assert watchlist.select_movie_to_watch(2) == movies[4] and watchlist.select_movie_to_watch(-1) == movies[5]
+        assert watchlist.select_movie_to_watch(20) is None
+        watchlist.add_movie(movies[0])
+        assert watchlist.select_movie_to_watch(4) == movies[0]
+
+    def test_removing_most_movies(self):
+        watchlist = Watchlist()
+        movies = [Movie(f"Movie {number}", 2000) for number in range(100)]
+        for movie in movies:
+            watchlist.add_movie(movie)
+        for movie in movies[:90]:
+            watchlist.remove_movie(movie)
+        assert list(watchlist) == movies[90:] and watchlist.select_movie_to_watch(0) == movies[90]
+        for movie in reversed(movies[90:]):
+            watchlist.remove_movie(movie)
+        assert watchlist.size() == 0 and watchlist.first_movie_in_watchlist() is None
+
+    def test_change_history_is_bounded(self):
+        watchlist = Watchlist()
+        movies = [Movie(f"Movie {number}", 2000) for number in range(CHANGE_HISTORY_SIZE + 10)]
+        for movie in movies:
+            watchlist.add_movie(movie)
+        watchlist.remove_movie(movies[0])
+        history = watchlist.change_history
+        assert len(history) == CHANGE_HISTORY_SIZE
+        assert history[-1][:2] == (REMOVED, movies[0].movie_id)
+        assert history[0][:2] == (ADDED, movies[11].movie_id) and isinstance(history[0][2], int)
+
+    def test_replacing_the_watchlist(self):
+        watchlist, other = Watchlist(), Watchlist()
+        watchlist.add_movie(Movie("Moana", 2016))
+        other.add_movie(Movie("Ice Age", 2002))
+        watchlist.watchlist = other
+        assert watchlist.watchlist == [Movie("Ice Age", 2002)]
+        assert watchlist.past_watchlists[0][1] == (Movie("Moana", 2016),)
+        assert (RESET, None) in [change[:2] for change in watchlist.change_history]
+        assert watchlist == other and hash(watchlist) == hash(other)
+        for ignored in (None, 42):
+            watchlist.watchlist = ignored
+            assert watchlist.watchlist == [Movie("Ice Age", 2002)]
+
+    def test_lookups_between_removals(self):
+        watchlist = Watchlist()
+        movies = [Movie(f"Movie {number}", 2000) for number in range(10)]
+        for movie in movies:
+            watchlist.add_movie(movie)
+        for removed in (movies[2], movies[7], movies[0]):
+            watchlist.remove_movie(removed)
+            remaining = [movie for movie in movies if movie in watchlist]
+            assert [watchlist.select_movie_to_watch(index) for index in range(len(remaining))] == remaining
+        watchlist.add_movie(movies[2])
+        assert watchlist.select_movie_to_watch(-1) == movies[2] and len(watchlist) == 8
 
 
 # watchlist = Watchlist()
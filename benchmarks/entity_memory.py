@@ -0,0 +1,129 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.synthetic_catalog import GENRES, WORDS, person_names
+
+DEFAULT_MOVIES = 1000000
+ENTITIES = ('genre', 'director', 'actor', 'movie', 'review', 'user', 'watchlist')
+# A werkzeug hash computed once; hashing a password per user would dominate the run.
+PASSWORD_HASH = 'pbkdf2:sha256:260000$0123456789abcdef$' + '0' * 64
+
+
+def measure(build, count: int) -> tuple:
+    """Returns (the entities build() made, bytes traced per entity)
+
+    Everything allocated while building counts against the entity: its own strings, lists and dicts as well as the
+    object itself. The list holding the entities does not.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return entities, (after - before - sys.getsizeof(entities)) / max(count, 1)
+
+
+def run_benchmark(movie_count: int = DEFAULT_MOVIES, seed: int = 235) -> dict:
+    # Imported here so the memory of the application modules is never traced.
+    from appl.domainmodel.actor import Actor
+    from appl.domainmodel.director import Director
+    from appl.domainmodel.genre import Genre
+    from appl.domainmodel.movie import Movie
+    from appl.domainmodel.review import Review
+    from appl.domainmodel.user import User
+    from appl.domainmodel.watchlist import Watchlist
+
+    rng = random.Random(seed)
+    # Inputs are made before anything is traced, the way a reader would hand over strings it already holds.
+    actor_names = person_names(max(movie_count // 2, 50), rng)
+    director_names = person_names(max(movie_count // 5, 20), rng)
+    titles = [f"{' '.join(rng.choices(WORDS, k=rng.randint(1, 4))).title()} {rank}"
+              for rank in range(1, movie_count + 1)]
+    description = " ".join(WORDS)
+    user_count = max(movie_count // 10, 1)
+    usernames = [f"user{number}" for number in range(user_count)]
+
+    def build_movies():
+        movies = []
+        for rank, title in enumerate(titles, start=1):
+            movie = Movie(title, 1950 + rank % 70)
+            movie.director = directors[rank % len(directors)]
+            movie.rank = rank
+            movie.runtime_minutes = 66 + rank % 125
+            movie.rating = rank % 90 / 10
+            movie.votes = rank * 7 % 100000
+            movie.revenue_millions = rank % 500 / 3
+            movie.metascore = rank % 100
+            movie.description = description
+            for offset in range(4):
+                movie.add_actor(actors[(rank * 4 + offset) % len(actors)])
+            for offset in range(1 + rank % 3):
+                movie.add_genre(genres[(rank + offset) % len(genres)])
+            movies.append(movie)
+        return movies
+
+    def build_watchlists():
+        watchlists = []
+        for number in range(user_count):
+            watchlist = Watchlist()
+            for offset in range(10):
+                watchlist.add_movie(movies[(number * 10 + offset) % len(movies)])
+            watchlists.append(watchlist)
+        return watchlists
+
+    results = []
+
+    def record(entity: str, count: int, bytes_per_entity: float, seconds: float):
+        results.append({"entity": entity, "count": count, "bytes_per_entity": round(bytes_per_entity, 1),
+                        "total_mb": round(bytes_per_entity * count / (1024 * 1024), 1), "seconds": round(seconds, 2)})
+        print(f"{entity:<10} {count:>9}  {bytes_per_entity:8.1f} B/entity  {seconds:6.1f}s", file=sys.stderr)
+
+    started = time.perf_counter()
+    genres, per_entity = measure(lambda: [Genre(name) for name in GENRES], len(GENRES))
+    record('genre', len(genres), per_entity, time.perf_counter() - started)
+    started = time.perf_counter()
+    directors, per_entity = measure(lambda: [Director(name) for name in director_names], len(director_names))
+    record('director', len(directors), per_entity, time.perf_counter() - started)
+    started = time.perf_counter()
+    actors, per_entity = measure(lambda: [Actor(name) for name in actor_names], len(actor_names))
+    record('actor', len(actors), per_entity, time.perf_counter() - started)
+    started = time.perf_counter()
+    movies, per_entity = measure(build_movies, movie_count)
+    record('movie', len(movies), per_entity, time.perf_counter() - started)
+    started = time.perf_counter()
+    reviews, per_entity = measure(lambda: [Review(movie, "Worth watching twice.", movie.rank % 10 + 1)
+                                           for movie in movies], movie_count)
+    record('review', len(reviews), per_entity, time.perf_counter() - started)
+    started = time.perf_counter()
+    users, per_entity = measure(lambda: [User(username, PASSWORD_HASH, number, "First", "Last", 30,
+                                              f"{username}@example.com", True, password_is_hashed=True)
+                                         for number, username in enumerate(usernames)], user_count)
+    record('user', len(users), per_entity, time.perf_counter() - started)
+    started = time.perf_counter()
+    watchlists, per_entity = measure(build_watchlists, user_count)
+    record('watchlist', len(watchlists), per_entity, time.perf_counter() - started)
+
+    total_bytes = sum(result["bytes_per_entity"] * result["count"] for result in results)
+    return {"generated_at": datetime.now().isoformat(timespec='seconds'), "python": platform.python_version(),
+            "platform": platform.platform(), "movies": movie_count, "seed": seed, "results": results,
+            "total_mb": round(total_bytes / (1024 * 1024), 1), "bytes_per_movie": round(total_bytes / movie_count, 1)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the bytes each domain entity takes in a large catalog")
+    parser.add_argument('--movies', type=int, default=DEFAULT_MOVIES)
+    parser.add_argument('--seed', type=int, default=235)
+    parser.add_argument('--output', default=None, help="JSON results file (printed to stdout when omitted)")
+    arguments = parser.parse_args()
+    report = run_benchmark(arguments.movies, arguments.seed)
+    if arguments.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(arguments.output, mode='w') as output_file:
+            json.dump(report, output_file, indent=2)
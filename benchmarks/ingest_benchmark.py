@@ -0,0 +1,110 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from benchmarks.synthetic_catalog import write_catalog
+
+DEFAULT_ROW_COUNTS = (1000, 10000, 100000, 1000000)
+STAGES = ('csv_reader', 'parallel_csv_reader', 'memory_repository', 'populate')
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(stage: str, file_name: str, work_dir: str) -> dict:
+    """Runs one loader over the file; called in a fresh process so the peak RSS belongs to this stage alone"""
+    # Imported here rather than at the top so the parent process never loads the application, and before the
+    # clock starts so import time is not counted.
+    from sqlalchemy import create_engine
+    from appl.adaptors import database_repository
+    from appl.adaptors.orm import metadata
+    from appl.adaptors.memory_repository import MemoryRepository, read_and_load_movie_file
+    from appl.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+    from appl.datafilereaders.parallel_movie_file_csv_reader import ParallelMovieFileCSVReader
+
+    baseline_rss = peak_rss_mb()
+    started = time.perf_counter()
+    if stage == 'csv_reader':
+        reader = MovieFileCSVReader(file_name)
+        reader.read_csv_file()
+        movies = len(reader.dataset_of_movies)
+    elif stage == 'parallel_csv_reader':
+        reader = ParallelMovieFileCSVReader(file_name)
+        reader.read_csv_file()
+        movies = len(reader.dataset_of_movies)
+    elif stage == 'memory_repository':
+        repo = MemoryRepository()
+        read_and_load_movie_file(file_name, repo)
+        movies = repo.get_number_of_movies()
+    elif stage == 'populate':
+        database_file = os.path.join(work_dir, 'benchmark.sqlite')
+        if os.path.exists(database_file):
+            os.remove(database_file)
+        engine = create_engine(f"sqlite:///{database_file}")
+        metadata.create_all(engine)
+        movies = database_repository.populate(engine, os.path.dirname(file_name), os.path.basename(file_name),
+                                              fast_load=True)['movies']
+    else:
+        raise ValueError(f"Unknown stage {stage!r}")
+    seconds = time.perf_counter() - started
+    return {"stage": stage, "movies": movies, "seconds": seconds, "movies_per_second": movies / seconds,
+            "baseline_rss_mb": baseline_rss, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_benchmarks(row_counts, stages=STAGES, seed: int = 235, work_dir: str = None) -> dict:
+    own_work_dir = work_dir is None
+    if own_work_dir:
+        temporary_directory = tempfile.TemporaryDirectory(prefix='cs235-benchmark-')
+        work_dir = temporary_directory.name
+    else:
+        os.makedirs(work_dir, exist_ok=True)
+    results = []
+    # A spawned (not forked) process starts with a clean heap, so earlier stages never inflate a later peak.
+    context = multiprocessing.get_context('spawn')
+    try:
+        for row_count in row_counts:
+            file_name = os.path.join(work_dir, f"catalog_{row_count}.csv")
+            started = time.perf_counter()
+            write_catalog(file_name, row_count, seed)
+            print(f"generated {row_count} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            for stage in stages:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_stage, stage, file_name, work_dir).result()
+                result["rows"] = row_count
+                result["file_bytes"] = os.path.getsize(file_name)
+                results.append(result)
+                print(f"{row_count:>8} rows  {stage:<20} {result['seconds']:8.2f}s  "
+                      f"peak {result['peak_rss_mb']:8.1f} MB", file=sys.stderr)
+            os.remove(file_name)
+    finally:
+        if own_work_dir:
+            temporary_directory.cleanup()
+    return {"generated_at": datetime.now().isoformat(timespec='seconds'), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "seed": seed, "results": results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the movie loaders on synthetic catalogs")
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROW_COUNTS))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--seed', type=int, default=235)
+    parser.add_argument('--work-dir', default=None, help="where catalogs and databases are written")
+    parser.add_argument('--output', default=None, help="JSON results file (printed to stdout when omitted)")
+    arguments = parser.parse_args()
+    report = run_benchmarks(arguments.rows, arguments.stages, arguments.seed, arguments.work_dir)
+    if arguments.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(arguments.output, mode='w') as output_file:
+            json.dump(report, output_file, indent=2)
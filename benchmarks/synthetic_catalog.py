@@ -0,0 +1,102 @@
+import argparse
+import csv
+import random
+from itertools import accumulate
+
+HEADER = ['Rank', 'Title', 'Genre', 'Description', 'Director', 'Actors', 'Year', 'Runtime (Minutes)', 'Rating',
+          'Votes', 'Revenue (Millions)', 'Metascore']
+GENRES = ['Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Drama', 'Family', 'Fantasy',
+          'History', 'Horror', 'Music', 'Musical', 'Mystery', 'Romance', 'Sci-Fi', 'Sport', 'Thriller', 'War',
+          'Western']
+# Drama, Action and Comedy dominate the real catalog; the rest trail off.
+GENRE_WEIGHTS = [30, 30, 5, 8, 28, 15, 50, 5, 10, 3, 12, 2, 1, 10, 14, 12, 2, 20, 1, 1]
+FIRST_NAMES = ['Anna', 'Ben', 'Chris', 'Diane', 'Emma', 'Felix', 'Grace', 'Hugo', 'Iris', 'Jack', 'Kate', 'Liam',
+               'Maya', 'Noah', 'Olga', 'Paul', 'Quinn', 'Rosa', 'Sam', 'Tara', 'Uma', 'Victor', 'Wendy', 'Xavier',
+               'Yara', 'Zoe', 'Adèle', 'Björn', 'Chloé', 'Dagný']
+LAST_NAMES = ['Adams', 'Brown', 'Clarke', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jones', 'Kim',
+              'Lopez', 'Moreau', 'Nguyen', "O'Brien", 'Patel', 'Quiroga', 'Rossi', 'Smith', 'Taylor', 'Ueda',
+              'Vargas', 'Walsh', 'Xu', 'Young', 'Zhang', 'Müller', 'Søgaard']
+# Invented surnames keep the name pool large enough for million-row catalogs.
+SYLLABLES = ['ka', 'lo', 'mi', 'ran', 'te', 'vo', 'shi', 'ber', 'dan', 'el', 'for', 'gu', 'han', 'is', 'jor', 'kel',
+             'lin', 'mar', 'nor', 'os', 'pel', 'qui', 'ros', 'sen', 'tor', 'ul', 'ven', 'wil', 'yas', 'zan']
+WORDS = ['a', 'young', 'detective', 'must', 'find', 'the', 'truth', 'behind', 'ancient', 'city', 'family', 'war',
+         'secret', 'love', 'journey', 'across', 'galaxy', 'small', 'town', 'crew', 'stolen', 'heart', 'dark', 'past',
+         'returns', 'after', 'years', 'while', 'racing', 'against', 'time', 'their', 'world', 'falls', 'apart']
+ZIPF_EXPONENT = 1.1
+
+
+def surname(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return rng.choice(LAST_NAMES)
+    return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 3))).capitalize()
+
+
+def person_names(count: int, rng: random.Random) -> list:
+    names = set()
+    while len(names) < count:
+        if rng.random() < 0.3:
+            names.add(f"{rng.choice(FIRST_NAMES)} {rng.choice('ABCDEFGHIJKLMNOPRSTW')}. {surname(rng)}")
+        else:
+            names.add(f"{rng.choice(FIRST_NAMES)} {surname(rng)}")
+    names = sorted(names)
+    rng.shuffle(names)
+    return names
+
+
+def zipf_cumulative_weights(count: int) -> list:
+    # The k-th most popular person is cast with probability proportional to 1 / k^s, as in real filmographies.
+    return list(accumulate(1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)))
+
+
+def description(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(1, 4)):
+        words = rng.choices(WORDS, k=rng.randint(8, 24))
+        clause = rng.randint(3, len(words) - 3)
+        sentences.append((" ".join(words[:clause]) + ", " + " ".join(words[clause:])).capitalize() + ".")
+    text = " ".join(sentences)
+    if rng.random() < 0.1:
+        text += ' They call it "the ' + rng.choice(WORDS) + '".'
+    if rng.random() < 0.02:
+        # Quoted newlines are rare but legal, and the sharded reader has to cope with them.
+        text += "\nPart two follows."
+    return text
+
+
+def generate_rows(row_count: int, seed: int = 235):
+    rng = random.Random(seed)
+    actors = person_names(max(row_count // 2, 50), rng)
+    directors = person_names(max(row_count // 5, 20), rng)
+    actor_weights = zipf_cumulative_weights(len(actors))
+    director_weights = zipf_cumulative_weights(len(directors))
+    genre_weights = list(accumulate(GENRE_WEIGHTS))
+    for rank in range(1, row_count + 1):
+        cast = []
+        while len(cast) < 4:
+            actor = rng.choices(actors, cum_weights=actor_weights)[0]
+            if actor not in cast:
+                cast.append(actor)
+        genres = sorted(set(rng.choices(GENRES, cum_weights=genre_weights, k=rng.randint(1, 3))))
+        revenue = f"{rng.lognormvariate(3, 1.5):.2f}" if rng.random() < 0.87 else "N/A"
+        metascore = str(rng.randint(11, 100)) if rng.random() < 0.94 else "N/A"
+        yield [rank, f"{' '.join(rng.choices(WORDS, k=rng.randint(1, 4))).title()} {rank}", ",".join(genres),
+               description(rng), rng.choices(directors, cum_weights=director_weights)[0], ", ".join(cast),
+               rng.randint(1950, 2020), rng.randint(66, 191), f"{rng.uniform(1.9, 9.0):.1f}",
+               int(rng.paretovariate(1.2) * 1000), revenue, metascore]
+
+
+def write_catalog(file_name: str, row_count: int, seed: int = 235):
+    """Writes a reproducible movie csv in the same layout as Data1000Movies.csv"""
+    with open(file_name, mode='w', encoding='utf-8', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(row_count, seed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic movie catalog csv")
+    parser.add_argument('file_name')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=235)
+    arguments = parser.parse_args()
+    write_catalog(arguments.file_name, arguments.rows, arguments.seed)
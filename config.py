@@ -14,4 +14,12 @@ class Config:
     FLASK_ENV = environ.get('FLASK_ENV')
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
 
-    SECRET_KEY = environ.get('SECRET_KEY')
\ No newline at end of file
+    SECRET_KEY = environ.get('SECRET_KEY')
+
+    # 'database', or 'memory' for the thread-safe in-memory repository
+    REPOSITORY = environ.get('REPOSITORY', 'database')
+
+    # Database population
+    POPULATE_BATCH_SIZE = int(environ.get('POPULATE_BATCH_SIZE', 1000))
+    SQLITE_FAST_LOAD = environ.get('SQLITE_FAST_LOAD') == 'True'
+    STALE_DATABASE_POLICY = environ.get('STALE_DATABASE_POLICY', 'repopulate')
\ No newline at end of file